@@ -1,34 +1,260 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+import json
 from flask_cors import CORS
+import multiprocessing
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
-# Import AI modules
-from models.recommender import RecommenderModel
-from models.price_predictor import PricePredictor
-from models.sentiment_analyzer import SentimentAnalyzer
+# Import AI modules (the model modules are imported by the loaders below)
+from utils.concurrency import ConcurrencyLimiter, WorkerPool
 from utils.data_processor import DataProcessor
+from utils.job_queue import JobQueue
+from utils.lazy_model import LazyModel
+from utils.metrics import REGISTRY, SIZE_BUCKETS, current_endpoint, stage
+from utils.profiler import SlowRequestProfiler
+from utils.response_cache import ResponseCache
 
 load_dotenv()
 
+class TimedRequest(Request):
+    """Records JSON body parsing as the request's 'parse' stage"""
+
+    def get_json(self, *args, **kwargs):
+        with stage('parse'):
+            return super().get_json(*args, **kwargs)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Records jsonify() as the request's 'serialize' stage"""
+
+    def response(self, *args, **kwargs):
+        with stage('serialize'):
+            return super().response(*args, **kwargs)
+
 app = Flask(__name__)
+app.request_class = TimedRequest
+app.json = TimedJSONProvider(app)
 CORS(app)
 
+# Model loaders; each model (and scikit-learn) is loaded on first use
+def _load_recommender():
+    from models.recommender import RecommenderModel
+    return RecommenderModel()
+
+def _load_price_predictor():
+    from models.price_predictor import PricePredictor
+    return PricePredictor()
+
+def _load_sentiment_analyzer():
+    from models.sentiment_analyzer import SentimentAnalyzer
+    return SentimentAnalyzer()
+
+def _load_sentiment_store():
+    from models.sentiment_store import SentimentStore
+    return SentimentStore(sentiment_analyzer.get())
+
 # Initialize models
-recommender = RecommenderModel()
-price_predictor = PricePredictor()
-sentiment_analyzer = SentimentAnalyzer()
+recommender = LazyModel('recommender', _load_recommender)
+price_predictor = LazyModel('pricePredictor', _load_price_predictor)
+sentiment_analyzer = LazyModel('sentimentAnalyzer', _load_sentiment_analyzer)
+sentiment_store = LazyModel('sentimentStore', _load_sentiment_store)
 data_processor = DataProcessor()
 
+MODELS = (recommender, price_predictor, sentiment_analyzer, sentiment_store)
+
+# Per-endpoint-group request limits and the process pool for CPU-heavy work
+limiter = ConcurrencyLimiter()
+cpu_pool = WorkerPool()
+
+# Background training jobs
+training_jobs = JobQueue()
+
+# Cached recommendation and similar-product results
+response_cache = ResponseCache.from_env()
+
+# Request metrics (served on /metrics) and the opt-in slow-request profiler
+REQUESTS = REGISTRY.counter(
+    'ai_requests_total', 'Requests handled', ('endpoint', 'method', 'status')
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'ai_request_duration_seconds', 'Request latency', ('endpoint',)
+)
+REQUEST_BYTES = REGISTRY.histogram(
+    'ai_request_size_bytes', 'Request body size', ('endpoint',), buckets=SIZE_BUCKETS
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    'ai_response_size_bytes', 'Response body size', ('endpoint',), buckets=SIZE_BUCKETS
+)
+profiler = SlowRequestProfiler.from_env()
+
+# Review lists at least this long are analyzed in the worker pool
+SENTIMENT_OFFLOAD_MIN_REVIEWS = int(os.getenv('SENTIMENT_OFFLOAD_MIN_REVIEWS', 5000))
+
+# Models to load in the background at startup: "all" or a comma-separated
+# list of model names (e.g. "recommender,pricePredictor"); empty loads
+# every model on its first request
+AI_WARMUP = os.getenv('AI_WARMUP', '').strip()
+_warmup = {'requested': [], 'done': threading.Event()}
+
+def warm_up(names):
+    """Load the named models so the first requests do not pay for it"""
+    for model in MODELS:
+        if names == 'all' or model.name in names:
+            try:
+                model.get()
+            except Exception:
+                app.logger.exception('Warm-up of %s failed', model.name)
+    _warmup['done'].set()
+
+def start_warmup(spec):
+    names = 'all' if spec == 'all' else [name.strip() for name in spec.split(',') if name.strip()]
+    _warmup['requested'] = [model.name for model in MODELS if names == 'all' or model.name in names]
+    threading.Thread(target=warm_up, args=(names,), name='model-warmup', daemon=True).start()
+
+# Worker pool processes re-import this module; only the server warms up
+if AI_WARMUP and multiprocessing.parent_process() is None:
+    start_warmup(AI_WARMUP)
+else:
+    _warmup['done'].set()
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.request_endpoint = request.endpoint or 'unmatched'
+    current_endpoint.set(g.request_endpoint)
+    g.profile = profiler.start() if profiler is not None else None
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = g.get('request_endpoint')
+    if endpoint is None:
+        return response
+    duration = time.perf_counter() - g.request_start
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_SECONDS.observe(duration, endpoint=endpoint)
+    if request.content_length is not None:
+        REQUEST_BYTES.observe(request.content_length, endpoint=endpoint)
+    if response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    # Runs even when a handler raised, so no sampled thread is left behind
+    if g.get('profile') is not None:
+        profiler.stop(g.profile, g.request_endpoint, time.perf_counter() - g.request_start)
+    current_endpoint.set(None)
+
+@app.before_request
+def refresh_models():
+    """Pick up model versions published by other worker processes"""
+    try:
+        for model in (recommender, price_predictor):
+            if model.loaded:
+                model.reload_if_changed()
+        if recommender.loaded:
+            recommender.catalog.reload_if_changed()
+    except Exception:
+        # Keep serving the loaded models; the next check retries
+        app.logger.exception('Model reload failed')
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'PricePulse AI Service',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'models': {
+            'recommender': recommender.version if recommender.loaded else None,
+            'pricePredictor': price_predictor.version if price_predictor.loaded else None,
+            'sentimentStore': sentiment_store.version if sentiment_store.loaded else None
+        },
+        'concurrency': limiter.stats(),
+        'cache': response_cache.stats()
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness check: which models are loaded
+
+    Returns 503 until the models requested by AI_WARMUP are loaded (or if
+    loading one failed); without AI_WARMUP the service is ready at once
+    and models load on first use.
+    """
+    models = {model.name: model.status() for model in MODELS}
+    is_ready = _warmup['done'].is_set() and all(
+        models[name]['loaded'] for name in _warmup['requested']
+    )
+    return jsonify({
+        'ready': is_ready,
+        'warmup': _warmup['requested'],
+        'models': models
+    }), 200 if is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(REGISTRY.render(), mimetype='text/plain', content_type=REGISTRY.CONTENT_TYPE)
+
+def _model_gauges():
+    values = []
+    for model in MODELS:
+        values.append(({'model': model.name}, model.loaded))
+    return values
+
+def _model_version_gauges():
+    values = []
+    for model in (recommender, price_predictor):
+        if model.loaded and model.version is not None:
+            values.append(({'model': model.name, 'version': model.version}, 1))
+    if recommender.loaded:
+        values.append(({'model': 'catalog', 'version': recommender.catalog.version}, 1))
+    return values
+
+def _state_gauges(key):
+    if not recommender.loaded:
+        return []
+    state = {
+        'catalog_size': recommender.catalog.size,
+        'pending_deltas': len(recommender.deltas)
+    }
+    return [({}, state[key])]
+
+def _cache_stats(*keys):
+    stats = response_cache.stats()
+    return [({'kind': key}, stats.get(key)) for key in keys]
+
+def _concurrency_stats(key):
+    return [({'group': group}, stats[key]) for group, stats in limiter.stats().items()]
+
+REGISTRY.gauge_callback('ai_model_loaded', 'Whether a model is loaded in this process', _model_gauges)
+REGISTRY.gauge_callback(
+    'ai_model_load_seconds', 'Time taken to load a model',
+    lambda: [({'model': model.name}, model.load_seconds) for model in MODELS]
+)
+REGISTRY.gauge_callback('ai_model_version_info', 'Model version being served', _model_version_gauges)
+REGISTRY.gauge_callback('ai_catalog_size', 'Products in the resident catalog', lambda: _state_gauges('catalog_size'))
+REGISTRY.gauge_callback(
+    'ai_recommender_pending_deltas', 'Ingested ratings not yet compacted', lambda: _state_gauges('pending_deltas')
+)
+REGISTRY.gauge_callback(
+    'ai_cache_lookups_total', 'Response cache lookups', lambda: _cache_stats('hits', 'misses'), type='counter'
+)
+REGISTRY.gauge_callback(
+    'ai_cache_evictions_total', 'Response cache entries dropped', lambda: _cache_stats('evictions', 'expirations'),
+    type='counter'
+)
+REGISTRY.gauge_callback('ai_cache_size', 'Response cache entries and bytes', lambda: _cache_stats('entries', 'bytes'))
+REGISTRY.gauge_callback('ai_inflight_requests', 'Requests in flight per limited group', lambda: _concurrency_stats('active'))
+REGISTRY.gauge_callback(
+    'ai_rejected_requests_total', 'Requests rejected by endpoint limits', lambda: _concurrency_stats('rejected'),
+    type='counter'
+)
+
 @app.route('/api/recommendations', methods=['POST'])
 def get_recommendations():
     """
@@ -37,8 +263,14 @@ def get_recommendations():
         "userId": "user_id",
         "productIds": ["prod1", "prod2", ...],
         "userHistory": [{"productId": "...", "rating": 5}, ...],
-        "limit": 10
+        "limit": 10,
+        "diversity": 0,
+        "seed": null,
+        "category": null
     }
+    Scores are deterministic unless a non-zero diversity is requested.
+    With an empty userHistory (cold start) productIds may be omitted; the
+    most popular products (optionally of one category) are returned.
     """
     try:
         data = request.json
@@ -46,29 +278,74 @@ def get_recommendations():
         product_ids = data.get('productIds', [])
         user_history = data.get('userHistory', [])
         limit = data.get('limit', 10)
+        diversity = data.get('diversity', 0)
+        seed = data.get('seed')
+        category = data.get('category')
         
-        recommendations = recommender.get_recommendations(
-            user_id=user_id,
-            product_ids=product_ids,
-            user_history=user_history,
-            limit=limit
-        )
+        def compute():
+            return recommender.get_recommendations(
+                user_id=user_id,
+                product_ids=product_ids,
+                user_history=user_history,
+                limit=limit,
+                diversity=diversity,
+                seed=seed,
+                category=category
+            )
         
-        return jsonify({
+        if diversity and seed is None:
+            # Unseeded jitter is meant to differ per call
+            recommendations, cached = compute(), False
+        elif not response_cache.fits_key(product_ids, user_history):
+            # Hashing a long history into the key costs about as much as the result
+            recommendations, cached = compute(), False
+        else:
+            # userId does not affect the result, so it is left out of the key
+            params = [product_ids, user_history, limit, diversity, seed, category]
+            recommendations, cached = response_cache.get_or_compute(
+                'recommendations', params, recommender.cache_version(), compute
+            )
+        
+        response = jsonify({
             'success': True,
             'recommendations': recommendations
         })
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response
     except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/popular', methods=['GET'])
+def get_popular_products():
+    """
+    Most popular products by time-decayed interaction count
+    Query: ?limit=10&category=...
+    """
+    limit = request.args.get('limit', 10, type=int)
+    category = request.args.get('category')
+    
+    return jsonify({
+        'success': True,
+        'products': recommender.popularity.top(
+            limit,
+            category=category,
+            category_of=recommender.catalog.category_of
+        )
+    })
+
 @app.route('/api/similar-products', methods=['POST'])
 def get_similar_products():
     """
-    Get similar products based on product features
+    Get similar products from the resident catalog store
     Body: {
+        "productId": "prod_id",
+        "limit": 5
+    }
+    Legacy body (catalog sent with the request, bypasses the store): {
         "productId": "prod_id",
         "productFeatures": {"category": "...", "tags": [...], "price": 100},
         "allProducts": [{...}, {...}],
@@ -78,22 +355,178 @@ def get_similar_products():
     try:
         data = request.json
         product_id = data.get('productId')
-        product_features = data.get('productFeatures', {})
-        all_products = data.get('allProducts', [])
         limit = data.get('limit', 5)
         
-        similar = recommender.get_similar_products(
-            product_id=product_id,
-            product_features=product_features,
-            all_products=all_products,
-            limit=limit
+        if 'allProducts' in data:
+            # Not cached: a key over the whole product list costs more than ranking it
+            similar = recommender.get_similar_products_from_list(
+                product_id=product_id,
+                product_features=data.get('productFeatures', {}),
+                all_products=data.get('allProducts', []),
+                limit=limit
+            )
+            cached = False
+        else:
+            similar, cached = response_cache.get_or_compute(
+                'similar-products',
+                [product_id, limit],
+                recommender.catalog.cache_version(),
+                lambda: recommender.get_similar_products(
+                    product_id=product_id,
+                    limit=limit
+                )
+            )
+        
+        response = jsonify({
+            'success': True,
+            'similar_products': similar,
+            'catalog_version': recommender.catalog.version
+        })
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/catalog', methods=['GET'])
+def catalog_stats():
+    """Size and version tag of the resident catalog store"""
+    return jsonify({
+        'success': True,
+        'catalog': recommender.catalog.stats()
+    })
+
+@app.route('/api/catalog', methods=['POST'])
+@limiter.limit('batch')
+def load_catalog():
+    """
+    Bulk-load or upsert products into the catalog store
+    Body: {
+        "products": [{"_id": "...", "category": "...", "tags": [...], "basePrice": 100, "stock": 10}, ...],
+        "replace": false
+    }
+    """
+    try:
+        data = request.json
+        products = data.get('products', [])
+        replace = data.get('replace', False)
+        
+        with recommender.catalog.publishing():
+            result = recommender.catalog.upsert(products, replace=replace)
+        
+        return jsonify({
+            'success': True,
+            'catalog': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/catalog/remove', methods=['POST'])
+def remove_from_catalog():
+    """
+    Remove products from the catalog store
+    Body: {
+        "productIds": ["prod1", "prod2", ...]
+    }
+    """
+    try:
+        data = request.json
+        product_ids = data.get('productIds', [])
+        
+        with recommender.catalog.publishing():
+            result = recommender.catalog.remove(product_ids)
+        
+        return jsonify({
+            'success': True,
+            'catalog': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/catalog/index', methods=['POST'])
+@limiter.limit('train')
+def build_catalog_index():
+    """
+    Build the approximate nearest-neighbour index over the catalog store
+    Body (all optional): {
+        "nlist": 256,
+        "nprobe": 8,
+        "iterations": 10,
+        "sampleSize": 100000,
+        "minSize": 20000
+    }
+    """
+    try:
+        data = request.json or {}
+        params = {
+            'nlist': data.get('nlist', 256),
+            'nprobe': data.get('nprobe', 8),
+            'iterations': data.get('iterations', 10),
+            'sample_size': data.get('sampleSize', 100000),
+            'min_size': data.get('minSize', 20000)
+        }
+        
+        with recommender.catalog.publishing():
+            result = recommender.catalog.build_index(**params)
+        
+        return jsonify({
+            'success': True,
+            'index': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/catalog/index', methods=['DELETE'])
+def drop_catalog_index():
+    """Drop the nearest-neighbour index and go back to brute-force search"""
+    with recommender.catalog.publishing():
+        recommender.catalog.drop_index()
+    return jsonify({
+        'success': True,
+        'catalog': recommender.catalog.stats()
+    })
+
+@app.route('/api/catalog/index/recall', methods=['POST'])
+@limiter.limit('batch')
+def catalog_index_recall():
+    """
+    Recall and latency of the nearest-neighbour index against brute force
+    Body (all optional): {
+        "k": 10,
+        "nprobe": [1, 2, 4, 8, 16, 32],
+        "queries": 200
+    }
+    """
+    try:
+        data = request.json or {}
+        
+        report = recommender.catalog.index_recall_report(
+            k=data.get('k', 10),
+            nprobe_values=data.get('nprobe', [1, 2, 4, 8, 16, 32]),
+            num_queries=data.get('queries', 200)
         )
         
         return jsonify({
             'success': True,
-            'similar_products': similar
+            'report': report
         })
     except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -129,12 +562,45 @@ def predict_price():
             'prediction': prediction
         })
     except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/predict-price/batch', methods=['POST'])
+@limiter.limit('batch')
+def predict_price_batch():
+    """
+    Predict optimal prices for many products in one call
+    Body: {
+        "products": [
+            {"productId": "prod_id", "basePrice": 100, "features": {"category": "...", "stock": 10, "demand": 50}},
+            ...
+        ]
+    }
+    Predictions are returned in the same order as the input.
+    Items without a numeric basePrice get {product_id, error} instead.
+    """
+    try:
+        data = request.json
+        products = data.get('products', [])
+        
+        predictions = price_predictor.predict_optimal_prices(products)
+        
+        return jsonify({
+            'success': True,
+            'predictions': predictions
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 @app.route('/api/analyze-sentiment', methods=['POST'])
+@limiter.limit('batch')
 def analyze_sentiment():
     """
     Analyze sentiment of reviews
@@ -146,31 +612,117 @@ def analyze_sentiment():
         data = request.json
         reviews = data.get('reviews', [])
         
-        analysis = sentiment_analyzer.analyze_reviews(reviews)
+        if len(reviews) >= SENTIMENT_OFFLOAD_MIN_REVIEWS:
+            analysis = cpu_pool.run(sentiment_analyzer.analyze_reviews, reviews)
+        else:
+            analysis = sentiment_analyzer.analyze_reviews(reviews)
+        
+        return jsonify({
+            'success': True,
+            'sentiment': analysis
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/sentiment/<product_id>', methods=['GET'])
+def product_sentiment(product_id):
+    """
+    Sentiment summary of a product from its stored aggregate
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'productId': product_id,
+            'sentiment': sentiment_store.summary(product_id)
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/sentiment/<product_id>/reviews', methods=['POST'])
+def add_product_reviews(product_id):
+    """
+    Fold new reviews into a product's sentiment aggregate
+    Body: {
+        "reviews": [{"text": "Great product!", "rating": 5}, ...],
+        "replace": false
+    }
+    replace=true rebuilds the aggregate from the given reviews only.
+    """
+    try:
+        data = request.json
+        reviews = data.get('reviews', [])
+        replace = bool(data.get('replace', False))
+        
+        analysis = sentiment_store.add_reviews(product_id, reviews, replace=replace)
         
         return jsonify({
             'success': True,
+            'productId': product_id,
             'sentiment': analysis
         })
     except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/sentiment/<product_id>/reviews/remove', methods=['POST'])
+def remove_product_reviews(product_id):
+    """
+    Retract deleted reviews from a product's sentiment aggregate
+    Body: {
+        "reviews": [{"text": "Great product!", "rating": 5}, ...]
+    }
+    Reviews must have the text and rating they were added with.
+    """
+    try:
+        data = request.json
+        reviews = data.get('reviews', [])
+        
+        analysis = sentiment_store.remove_reviews(product_id, reviews)
+        
+        return jsonify({
+            'success': True,
+            'productId': product_id,
+            'sentiment': analysis
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 @app.route('/api/train-recommendations', methods=['POST'])
+@limiter.limit('train')
 def train_recommendations(): 
     """
     Train recommendation model with new data
     Body: {
-        "interactions": [{"userId": "...", "productId": "...", "rating": 5}, ...]
+        "interactions": [{"userId": "...", "productId": "...", "rating": 5}, ...],
+        "mode": "full"
     }
+    mode "full" retrains from the given interactions only; "incremental"
+    adds them to the current model as deltas.
     """
     try:
         data = request.json
         interactions = data.get('interactions', [])
+        mode = data.get('mode', 'full')
         
-        result = recommender.train(interactions)
+        if mode == 'incremental':
+            result = recommender.ingest(interactions)
+        else:
+            result = recommender.train(interactions, pool=cpu_pool)
         
         return jsonify({
             'success': True,
@@ -178,11 +730,188 @@ def train_recommendations():
             'metrics': result
         })
     except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/train-recommendations/compact', methods=['POST'])
+@limiter.limit('train')
+def compact_recommendations():
+    """
+    Merge incremental deltas into the base model
+    Body (optional): {
+        "recompute": false
+    }
+    """
+    try:
+        data = request.json or {}
+        
+        result = recommender.compact(recompute=data.get('recompute', False), pool=cpu_pool)
+        
+        return jsonify({
+            'success': True,
+            'metrics': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/ingest/interactions', methods=['POST'])
+@limiter.limit('train')
+def ingest_interactions():
+    """
+    Stream training interactions as newline-delimited JSON (plain or chunked upload)
+    Body: one {"userId": "...", "productId": "...", "rating": 5} per line
+    Query: ?mode=incremental|full&batchSize=5000
+    Records are parsed lazily; incremental mode feeds them to the model in
+    batches, full mode retrains from the whole stream.
+    """
+    try:
+        mode = request.args.get('mode', 'incremental')
+        batch_size = request.args.get('batchSize', 5000, type=int)
+        records = DataProcessor.iter_ndjson(request.stream)
+        
+        if mode == 'full':
+            result = recommender.train(records, pool=cpu_pool)
+        else:
+            result = {'num_interactions': 0, 'num_batches': 0}
+            for batch in DataProcessor.batched(records, batch_size):
+                batch_result = recommender.ingest(batch)
+                result['num_interactions'] += batch_result.get('num_interactions', 0)
+                result['num_batches'] += 1
+                result['pending_deltas'] = batch_result.get('pending_deltas')
+        
+        return jsonify({
+            'success': True,
+            'metrics': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/ingest/price-training', methods=['POST'])
+@limiter.limit('train')
+def ingest_price_training():
+    """
+    Train the price predictor from a newline-delimited JSON stream
+    Body: one {"basePrice": 100, "features": {...}, "actualPrice": 95} per line
+    Query: ?batchSize=5000&maxSamples=500000
+    """
+    try:
+        batch_size = request.args.get('batchSize', 5000, type=int)
+        max_samples = request.args.get('maxSamples', 500000, type=int)
+        records = DataProcessor.iter_ndjson(request.stream)
+        
+        result = price_predictor.train_stream(
+            records,
+            batch_size=batch_size,
+            max_samples=max_samples,
+            pool=cpu_pool
+        )
+        
+        return jsonify({
+            'success': True,
+            'metrics': result
+        })
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/train-recommendations', methods=['POST'])
+def submit_recommendation_training():
+    """
+    Queue a recommendation training job
+    Body: same as /api/train-recommendations
+    Returns 202 with the job record; resubmitting the same body returns the
+    existing job instead of training again.
+    """
+    try:
+        payload = request.get_data()
+        
+        def task(progress):
+            data = json.loads(payload)
+            interactions = data.get('interactions', [])
+            if data.get('mode', 'full') == 'incremental':
+                return recommender.ingest(interactions)
+            return recommender.train(interactions, pool=cpu_pool, progress=progress)
+        
+        job, created = training_jobs.submit('train-recommendations', payload, task)
+        return _job_response(job, created)
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/train-price', methods=['POST'])
+def submit_price_training():
+    """
+    Queue a price predictor training job
+    Body: {
+        "trainingData": [{"basePrice": 100, "features": {...}, "actualPrice": 95}, ...]
+    }
+    """
+    try:
+        payload = request.get_data()
+        
+        def task(progress):
+            data = json.loads(payload)
+            return price_predictor.train(data.get('trainingData', []), pool=cpu_pool, progress=progress)
+        
+        job, created = training_jobs.submit('train-price', payload, task)
+        return _job_response(job, created)
+    except Exception as e:
+        app.logger.exception('%s %s failed', request.method, request.path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Recent training jobs, newest first"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'success': True,
+        'jobs': training_jobs.list(limit)
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, progress and result of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+def _job_response(job, created):
+    response = jsonify({
+        'success': True,
+        'job': job,
+        'deduplicated': not created
+    })
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response, 202
+
 if __name__ == '__main__':
     port = int(os.getenv('AI_SERVICE_PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
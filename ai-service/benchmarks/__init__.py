@@ -0,0 +1,8 @@
+"""
+Benchmark suite for the AI service models and endpoints
+
+Run from the ai-service directory:
+
+    python -m benchmarks.run --scale 1k 100k --output baseline.json
+    python -m benchmarks.run --scale 1k 100k --compare baseline.json
+"""
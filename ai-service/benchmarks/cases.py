@@ -0,0 +1,537 @@
+"""
+Benchmark cases: the models' public methods and the HTTP endpoints
+
+Cases run in registration order within a scale. Read-only cases come
+first; cases that train or mutate the models come last so they do not
+change what the read cases measure. The HTTP write and training
+endpoints run last of all (group endpoint_write), against the models the
+app serves from disk.
+
+Removal cases put back what they removed after every call, so each call
+removes the same rows; the restore is part of the timing. The job
+submission cases time a new job from submission until it finished; the
+(deduplicated) case times resubmitting a finished job, which trains
+nothing.
+"""
+import io
+import itertools
+import json
+import math
+import time
+from functools import cached_property
+
+from benchmarks import synthetic
+from benchmarks.harness import case
+
+# Request sizes are capped: the service's callers never send more than this
+MAX_CANDIDATES = 10000
+MAX_LIST_PRODUCTS = 2000
+MAX_BATCH_PRICES = 10000
+MAX_REQUEST_REVIEWS = 4000
+HISTORY_LENGTH = 20
+WRITE_BATCH = 1000
+
+# Fitting the price model on more rows than this takes minutes
+PRICE_TRAIN_MAX = 50000
+
+class Fixtures:
+    """
+    Synthetic data and trained models for one scale
+
+    Models are trained into the current working directory on first use,
+    so the Flask app (reset to load lazily) serves the same models.
+    """
+
+    def __init__(self, size, seed=42):
+        self.size = size
+        self.seed = seed
+
+    @cached_property
+    def catalog(self):
+        return synthetic.catalog(self.size, self.seed)
+
+    @cached_property
+    def interactions(self):
+        return synthetic.interactions(self.size, self.seed)
+
+    @cached_property
+    def reviews(self):
+        return synthetic.reviews(self.size, self.seed)
+
+    @cached_property
+    def price_rows(self):
+        return synthetic.price_training(min(self.size, PRICE_TRAIN_MAX), self.seed)
+
+    @cached_property
+    def recommender(self):
+        from models.recommender import RecommenderModel
+
+        recommender = RecommenderModel()
+        recommender.train(self.interactions)
+        recommender.catalog.upsert(self.catalog, replace=True)
+        recommender.catalog.save_model()
+        return recommender
+
+    @cached_property
+    def price_predictor(self):
+        from models.price_predictor import PricePredictor
+
+        predictor = PricePredictor()
+        predictor.train(self.price_rows)
+        return predictor
+
+    @cached_property
+    def sentiment_analyzer(self):
+        from models.sentiment_analyzer import SentimentAnalyzer
+        return SentimentAnalyzer()
+
+    @cached_property
+    def client(self):
+        # Train first, then let the app load the saved models from disk
+        self.recommender
+        self.price_predictor
+        import app
+
+        for model in app.MODELS:
+            model.reset()
+        return app.app.test_client()
+
+    def history(self):
+        """A user's recent ratings over popular trained products"""
+        items = self.recommender.item_ids[:HISTORY_LENGTH]
+        return [{'productId': item, 'rating': 5 - i % 5} for i, item in enumerate(items)]
+
+    def candidates(self, size):
+        return [product['_id'] for product in self.catalog[:min(size, MAX_CANDIDATES)]]
+
+def _request(client, method, path, data=None, content_type=None, status=200):
+    """Operation sending a pre-encoded request, checked once up front"""
+    def operation():
+        return client.open(path, method=method, data=data, content_type=content_type)
+
+    response = operation()
+    if response.status_code != status:
+        raise RuntimeError(f'{method} {path} returned {response.status_code}: '
+                           f'{response.get_data(as_text=True)[:200]}')
+    return operation
+
+def _post(client, path, body, status=200):
+    """Operation posting a JSON body"""
+    return _request(client, 'POST', path, json.dumps(body).encode('utf-8'), 'application/json', status)
+
+def _post_ndjson(client, path, records):
+    """Operation posting records as newline-delimited JSON"""
+    data = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+    return _request(client, 'POST', path, data, 'application/x-ndjson')
+
+def _get(client, path):
+    return _request(client, 'GET', path)
+
+def _undo(operation, restore):
+    """Run operation, then restore, so every call sees the same state (both are timed)"""
+    def paired():
+        result = operation()
+        restore()
+        return result
+    return paired
+
+def _wait_for_job(client, job_id, timeout=600):
+    """Block until a queued job finished, so it does not run during later cases"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        if job['status'] not in ('queued', 'running'):
+            if job['status'] != 'succeeded':
+                raise RuntimeError(f'Job {job_id} {job["status"]}: {job["error"]}')
+            return job
+        time.sleep(0.005)
+    raise RuntimeError(f'Job {job_id} did not finish in {timeout}s')
+
+def _submit_and_wait(client, path, body):
+    """
+    Operation submitting a new job and waiting until it finished
+
+    Every call adds a distinct benchmarkRun field (ignored by the app), so
+    the job ID changes and the job is queued and run instead of being
+    deduplicated.
+    """
+    prefix = json.dumps(body).encode('utf-8')[:-1] + b', "benchmarkRun": '
+    runs = itertools.count()
+
+    def operation():
+        data = prefix + str(next(runs)).encode('ascii') + b'}'
+        response = client.post(path, data=data, content_type='application/json')
+        result = response.get_json()
+        if response.status_code != 202 or result['deduplicated']:
+            raise RuntimeError(f'POST {path} did not queue a new job: {response.status_code}')
+        return _wait_for_job(client, result['job']['id'])
+
+    return operation
+
+# -- DataProcessor -----------------------------------------------------------
+
+@case('data_processor.calculate_similarity_matrix', 'data_processor', max_size=5000)
+def similarity_matrix(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    products = fixtures.catalog[:size]
+    return (lambda: DataProcessor.calculate_similarity_matrix(products)), size * (size - 1) // 2
+
+@case('data_processor.calculate_similarity_matrix.top_k', 'data_processor', max_size=5000)
+def similarity_matrix_top_k(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    products = fixtures.catalog[:size]
+    return (lambda: DataProcessor.calculate_similarity_matrix(products, top_k=10)), size * (size - 1) // 2
+
+@case('data_processor.prepare_training_data', 'data_processor')
+def prepare_training_data(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    interactions = fixtures.interactions[:size]
+    return (lambda: DataProcessor.prepare_training_data(interactions)), size
+
+@case('data_processor.top_k_indices', 'data_processor')
+def top_k_indices(fixtures, size):
+    import numpy as np
+    from utils.data_processor import DataProcessor
+
+    scores = np.random.default_rng(fixtures.seed).random(size)
+    return (lambda: DataProcessor.top_k_indices(scores, 10)), size
+
+@case('data_processor.iter_ndjson', 'data_processor')
+def iter_ndjson(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    payload = ''.join(json.dumps(record) + '\n' for record in fixtures.interactions[:size]).encode('utf-8')
+    return (lambda: sum(1 for _ in DataProcessor.iter_ndjson(io.BytesIO(payload)))), size
+
+@case('data_processor.extract_features', 'data_processor', max_size=100000)
+def extract_features(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    products = fixtures.catalog[:size]
+    return (lambda: [DataProcessor.extract_features(product) for product in products]), size
+
+@case('data_processor.extract_features_batch', 'data_processor')
+def extract_features_batch(fixtures, size):
+    from utils.data_processor import DataProcessor
+
+    products = fixtures.catalog[:size]
+    return (lambda: DataProcessor.extract_features_batch(products)), size
+
+@case('product_batch.from_products', 'data_processor')
+def product_batch(fixtures, size):
+    from utils.product_batch import ProductBatch
+
+    products = fixtures.catalog[:size]
+    return (lambda: ProductBatch.from_products(products)), size
+
+# -- RecommenderModel --------------------------------------------------------
+
+@case('recommender.get_recommendations', 'recommender')
+def get_recommendations(fixtures, size):
+    recommender = fixtures.recommender
+    candidates = fixtures.candidates(size)
+    history = fixtures.history()
+    return (lambda: recommender.get_recommendations('bench-user', candidates, history, limit=10)), len(candidates)
+
+@case('recommender.get_recommendations.cold_start', 'recommender')
+def get_recommendations_cold_start(fixtures, size):
+    recommender = fixtures.recommender
+    candidates = fixtures.candidates(size)
+    return (lambda: recommender.get_recommendations('bench-user', candidates, [], limit=10)), len(candidates)
+
+@case('recommender.get_similar_products', 'recommender')
+def get_similar_products(fixtures, size):
+    recommender = fixtures.recommender
+    return (lambda: recommender.get_similar_products('p1', limit=10)), len(recommender.catalog)
+
+@case('recommender.get_similar_products_from_list', 'recommender', max_size=MAX_LIST_PRODUCTS)
+def get_similar_products_from_list(fixtures, size):
+    recommender = fixtures.recommender
+    products = fixtures.catalog[:size]
+    return (lambda: recommender.get_similar_products_from_list('p1', products[1], products, limit=10)), size
+
+@case('recommender.catalog.similar', 'recommender')
+def catalog_similar(fixtures, size):
+    catalog = fixtures.recommender.catalog
+    return (lambda: catalog.similar('p1', limit=10)), len(catalog)
+
+# -- PricePredictor ----------------------------------------------------------
+
+@case('price_predictor.predict_optimal_price', 'price_predictor')
+def predict_optimal_price(fixtures, size):
+    predictor = fixtures.price_predictor
+    row = fixtures.price_rows[0]
+    return (lambda: predictor.predict_optimal_price('p1', row['basePrice'], row['features'], [])), 1
+
+@case('price_predictor.predict_optimal_prices', 'price_predictor', max_size=100000)
+def predict_optimal_prices(fixtures, size):
+    predictor = fixtures.price_predictor
+    products = synthetic.price_requests(size, fixtures.seed + 1)
+    return (lambda: predictor.predict_optimal_prices(products)), size
+
+# -- SentimentAnalyzer -------------------------------------------------------
+
+@case('sentiment_analyzer.analyze_reviews', 'sentiment')
+def analyze_reviews(fixtures, size):
+    analyzer = fixtures.sentiment_analyzer
+    reviews = fixtures.reviews[:size]
+    return (lambda: analyzer.analyze_reviews(reviews)), size
+
+@case('sentiment_analyzer.analyze_review', 'sentiment')
+def analyze_review(fixtures, size):
+    analyzer = fixtures.sentiment_analyzer
+    review = fixtures.reviews[0]
+    return (lambda: analyzer.analyze_review(review)), 1
+
+@case('theme_matcher.match', 'sentiment')
+def theme_matcher_match(fixtures, size):
+    matcher = fixtures.sentiment_analyzer.theme_matcher
+    texts = [review['text'].lower() for review in fixtures.reviews[:size]]
+    return (lambda: [matcher.match(text) for text in texts]), size
+
+@case('theme_matcher.match.large_dictionary', 'sentiment')
+def theme_matcher_match_large(fixtures, size):
+    from models.theme_matcher import ThemeMatcher
+
+    matcher = ThemeMatcher(synthetic.theme_dictionary(240, fixtures.seed))
+    texts = [review['text'].lower() for review in fixtures.reviews[:size]]
+    return (lambda: [matcher.match(text) for text in texts]), size
+
+# -- HTTP endpoints (Flask test client) --------------------------------------
+
+@case('GET /health', 'endpoint')
+def endpoint_health(fixtures, size):
+    return _get(fixtures.client, '/health'), 1
+
+@case('GET /ready', 'endpoint')
+def endpoint_ready(fixtures, size):
+    return _get(fixtures.client, '/ready'), 1
+
+@case('GET /metrics', 'endpoint')
+def endpoint_metrics(fixtures, size):
+    return _get(fixtures.client, '/metrics'), 1
+
+@case('POST /api/recommendations', 'endpoint')
+def endpoint_recommendations(fixtures, size):
+    candidates = fixtures.candidates(size)
+    body = {'userId': 'bench-user', 'productIds': candidates, 'userHistory': fixtures.history(), 'limit': 10}
+    return _post(fixtures.client, '/api/recommendations', body), len(candidates)
+
+@case('GET /api/popular', 'endpoint')
+def endpoint_popular(fixtures, size):
+    return _get(fixtures.client, '/api/popular?limit=20'), 1
+
+@case('POST /api/similar-products', 'endpoint')
+def endpoint_similar_products(fixtures, size):
+    return _post(fixtures.client, '/api/similar-products', {'productId': 'p1', 'limit': 10}), size
+
+@case('POST /api/similar-products (allProducts)', 'endpoint', max_size=MAX_LIST_PRODUCTS)
+def endpoint_similar_products_list(fixtures, size):
+    products = fixtures.catalog[:size]
+    body = {'productId': 'p1', 'productFeatures': products[1], 'allProducts': products, 'limit': 10}
+    return _post(fixtures.client, '/api/similar-products', body), size
+
+@case('GET /api/catalog', 'endpoint')
+def endpoint_catalog(fixtures, size):
+    return _get(fixtures.client, '/api/catalog'), 1
+
+@case('POST /api/predict-price', 'endpoint')
+def endpoint_predict_price(fixtures, size):
+    row = fixtures.price_rows[0]
+    body = {'productId': 'p1', 'basePrice': row['basePrice'], 'features': row['features'], 'historicalData': []}
+    return _post(fixtures.client, '/api/predict-price', body), 1
+
+@case('POST /api/predict-price/batch', 'endpoint', max_size=MAX_BATCH_PRICES)
+def endpoint_predict_price_batch(fixtures, size):
+    body = {'products': synthetic.price_requests(size, fixtures.seed + 1)}
+    return _post(fixtures.client, '/api/predict-price/batch', body), size
+
+@case('POST /api/analyze-sentiment', 'endpoint', max_size=MAX_REQUEST_REVIEWS)
+def endpoint_analyze_sentiment(fixtures, size):
+    body = {'reviews': fixtures.reviews[:size]}
+    return _post(fixtures.client, '/api/analyze-sentiment', body), size
+
+@case('GET /api/sentiment/<productId>', 'endpoint')
+def endpoint_product_sentiment(fixtures, size):
+    client = fixtures.client
+    # Stored under its own product, so the write cases below start from scratch
+    body = {'reviews': fixtures.reviews[:min(size, WRITE_BATCH)], 'replace': True}
+    _post(client, '/api/sentiment/bench-read-product/reviews', body)
+    return _get(client, '/api/sentiment/bench-read-product'), 1
+
+# -- Training and writes (run last) ------------------------------------------
+
+@case('recommender.train', 'training')
+def recommender_train(fixtures, size):
+    from models.recommender import RecommenderModel
+
+    fixtures.recommender
+    interactions = fixtures.interactions[:size]
+    model = RecommenderModel()
+    return (lambda: model.train(interactions)), size
+
+@case('recommender.ingest', 'training', max_size=WRITE_BATCH)
+def recommender_ingest(fixtures, size):
+    recommender = fixtures.recommender
+    batch = synthetic.interactions(max(size, WRITE_BATCH), fixtures.seed + 2)[:size]
+    return (lambda: recommender.ingest(batch)), size
+
+@case('recommender.compact', 'training')
+def recommender_compact(fixtures, size):
+    recommender = fixtures.recommender
+    return (lambda: recommender.compact()), len(recommender.user_ids)
+
+@case('recommender.catalog.upsert', 'training', max_size=WRITE_BATCH)
+def catalog_upsert(fixtures, size):
+    catalog = fixtures.recommender.catalog
+    products = fixtures.catalog[:size]
+    return (lambda: catalog.upsert(products)), size
+
+@case('price_predictor.train', 'training', max_size=PRICE_TRAIN_MAX)
+def price_predictor_train(fixtures, size):
+    predictor = fixtures.price_predictor
+    rows = fixtures.price_rows[:size]
+    return (lambda: predictor.train(rows)), size
+
+@case('sentiment_store.add_reviews', 'training', max_size=WRITE_BATCH)
+def sentiment_store_add_reviews(fixtures, size):
+    from models.sentiment_store import SentimentStore
+
+    store = SentimentStore(fixtures.sentiment_analyzer)
+    reviews = fixtures.reviews[:size]
+    return (lambda: store.add_reviews('bench-product', reviews, replace=True)), size
+
+@case('sentiment_store.remove_reviews', 'training', max_size=WRITE_BATCH)
+def sentiment_store_remove_reviews(fixtures, size):
+    from models.sentiment_store import SentimentStore
+
+    store = SentimentStore(fixtures.sentiment_analyzer)
+    reviews = fixtures.reviews[:size]
+    store.add_reviews('bench-product', reviews, replace=True)
+    operation = _undo(
+        lambda: store.remove_reviews('bench-product', reviews),
+        lambda: store.add_reviews('bench-product', reviews)
+    )
+    return operation, size
+
+@case('recommender.catalog.remove', 'training', max_size=WRITE_BATCH)
+def catalog_remove(fixtures, size):
+    catalog = fixtures.recommender.catalog
+    products = fixtures.catalog[:size]
+    product_ids = [product['_id'] for product in products]
+    return _undo(lambda: catalog.remove(product_ids), lambda: catalog.upsert(products)), size
+
+@case('recommender.catalog.build_index', 'training')
+def catalog_build_index(fixtures, size):
+    catalog = fixtures.recommender.catalog
+    params = {'nlist': max(1, int(math.sqrt(len(catalog)))), 'min_size': 1}
+    return (lambda: catalog.build_index(**params)), len(catalog)
+
+@case('price_predictor.train_stream', 'training', max_size=PRICE_TRAIN_MAX)
+def price_predictor_train_stream(fixtures, size):
+    predictor = fixtures.price_predictor
+    rows = fixtures.price_rows[:size]
+    return (lambda: predictor.train_stream(iter(rows))), size
+
+# -- HTTP writes and training (Flask test client) ----------------------------
+
+@case('POST /api/catalog', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_catalog_upsert(fixtures, size):
+    body = {'products': fixtures.catalog[:size]}
+    return _post(fixtures.client, '/api/catalog', body), size
+
+@case('POST /api/catalog/remove', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_catalog_remove(fixtures, size):
+    client = fixtures.client
+    products = fixtures.catalog[:size]
+    remove = _post(client, '/api/catalog/remove', {'productIds': [product['_id'] for product in products]})
+    restore = _post(client, '/api/catalog', {'products': products})
+    return _undo(remove, restore), size
+
+@case('POST /api/catalog/index', 'endpoint_write')
+def endpoint_catalog_index(fixtures, size):
+    body = {'nlist': max(1, int(math.sqrt(size))), 'minSize': 1}
+    return _post(fixtures.client, '/api/catalog/index', body), size
+
+@case('POST /api/catalog/index/recall', 'endpoint_write')
+def endpoint_catalog_index_recall(fixtures, size):
+    # Measured against the index built by the previous case
+    body = {'k': 10, 'nprobe': [1, 4, 16], 'queries': 100}
+    return _post(fixtures.client, '/api/catalog/index/recall', body), 100
+
+@case('DELETE /api/catalog/index', 'endpoint_write')
+def endpoint_catalog_index_drop(fixtures, size):
+    return _request(fixtures.client, 'DELETE', '/api/catalog/index'), size
+
+@case('POST /api/sentiment/<productId>/reviews', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_add_product_reviews(fixtures, size):
+    body = {'reviews': fixtures.reviews[:size], 'replace': True}
+    return _post(fixtures.client, '/api/sentiment/bench-product/reviews', body), size
+
+@case('POST /api/sentiment/<productId>/reviews/remove', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_remove_product_reviews(fixtures, size):
+    client = fixtures.client
+    body = {'reviews': fixtures.reviews[:size]}
+    _post(client, '/api/sentiment/bench-product/reviews', {**body, 'replace': True})
+    remove = _post(client, '/api/sentiment/bench-product/reviews/remove', body)
+    restore = _post(client, '/api/sentiment/bench-product/reviews', body)
+    return _undo(remove, restore), size
+
+@case('POST /api/train-recommendations (incremental)', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_train_incremental(fixtures, size):
+    interactions = synthetic.interactions(max(size, WRITE_BATCH), fixtures.seed + 3)[:size]
+    body = {'interactions': interactions, 'mode': 'incremental'}
+    return _post(fixtures.client, '/api/train-recommendations', body), size
+
+@case('POST /api/train-recommendations/compact', 'endpoint_write')
+def endpoint_compact(fixtures, size):
+    return _post(fixtures.client, '/api/train-recommendations/compact', {}), size
+
+@case('POST /api/ingest/interactions', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_ingest_interactions(fixtures, size):
+    records = synthetic.interactions(max(size, WRITE_BATCH), fixtures.seed + 4)[:size]
+    return _post_ndjson(fixtures.client, '/api/ingest/interactions?mode=incremental', records), size
+
+@case('POST /api/ingest/price-training', 'endpoint_write', max_size=PRICE_TRAIN_MAX)
+def endpoint_ingest_price_training(fixtures, size):
+    return _post_ndjson(fixtures.client, '/api/ingest/price-training', fixtures.price_rows[:size]), size
+
+@case('POST /api/train-recommendations', 'endpoint_write')
+def endpoint_train_full(fixtures, size):
+    # Retrains the served model from the same interactions it was trained on
+    body = {'interactions': fixtures.interactions[:size], 'mode': 'full'}
+    return _post(fixtures.client, '/api/train-recommendations', body), size
+
+@case('POST /api/jobs/train-recommendations', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_submit_recommendation_job(fixtures, size):
+    body = {'interactions': synthetic.interactions(max(size, WRITE_BATCH), fixtures.seed + 5)[:size],
+            'mode': 'incremental'}
+    return _submit_and_wait(fixtures.client, '/api/jobs/train-recommendations', body), size
+
+@case('POST /api/jobs/train-recommendations (deduplicated)', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_resubmit_recommendation_job(fixtures, size):
+    # Measures the deduplication path only: the job already ran, nothing is trained
+    client = fixtures.client
+    body = {'interactions': synthetic.interactions(max(size, WRITE_BATCH), fixtures.seed + 5)[:size],
+            'mode': 'incremental'}
+    submit = _post(client, '/api/jobs/train-recommendations', body, status=202)
+    _wait_for_job(client, submit().get_json()['job']['id'])
+    return submit, 1
+
+@case('POST /api/jobs/train-price', 'endpoint_write', max_size=WRITE_BATCH)
+def endpoint_submit_price_job(fixtures, size):
+    body = {'trainingData': fixtures.price_rows[:size]}
+    return _submit_and_wait(fixtures.client, '/api/jobs/train-price', body), size
+
+@case('GET /api/jobs', 'endpoint_write')
+def endpoint_jobs(fixtures, size):
+    return _get(fixtures.client, '/api/jobs?limit=50'), 1
+
+@case('GET /api/jobs/<jobId>', 'endpoint_write')
+def endpoint_job_status(fixtures, size):
+    client = fixtures.client
+    job_id = client.get('/api/jobs?limit=1').get_json()['jobs'][0]['id']
+    return _get(client, f'/api/jobs/{job_id}'), 1
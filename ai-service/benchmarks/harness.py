@@ -0,0 +1,132 @@
+"""
+Timing, memory and baseline comparison for benchmark cases
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+CASES = []
+
+class Case:
+    """
+    One benchmarked operation
+
+    `setup(fixtures, size)` runs untimed and returns (operation, items):
+    a zero-argument callable and the number of records it processes per
+    call (for throughput). `max_size` caps the input size of cases whose
+    cost grows faster than linearly.
+    """
+
+    def __init__(self, name, group, setup, max_size=None):
+        self.name = name
+        self.group = group
+        self.setup = setup
+        self.max_size = max_size
+
+    def size_for(self, scale_size):
+        return min(scale_size, self.max_size) if self.max_size else scale_size
+
+def case(name, group, max_size=None):
+    """Decorator registering a setup function as a benchmark case"""
+    def register(setup):
+        CASES.append(Case(name, group, setup, max_size))
+        return setup
+    return register
+
+def measure(operation, items, budget=2.0, min_repeats=3, max_repeats=50, memory=True):
+    """
+    Time repeated calls of an operation
+
+    One warm-up call runs first. If it alone took more than half the
+    budget it becomes the only sample, so large-scale training cases run
+    once or twice instead of min_repeats times.
+
+    Returns:
+        Dict with repeats, p50/p99/mean latency (ms), throughput
+        (items per second at the median latency) and the peak traced
+        allocation of one extra call (MiB, Python and NumPy allocations)
+    """
+    start = time.perf_counter()
+    operation()
+    warmup = time.perf_counter() - start
+
+    timings = []
+    if warmup > budget / 2:
+        timings.append(warmup)
+    else:
+        deadline = time.perf_counter() + budget
+        while len(timings) < max_repeats and (len(timings) < min_repeats or time.perf_counter() < deadline):
+            start = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings)
+    p50 = float(np.percentile(timings, 50))
+    result = {
+        'repeats': len(timings),
+        'p50_ms': round(p50 * 1000, 4),
+        'p99_ms': round(float(np.percentile(timings, 99)) * 1000, 4),
+        'mean_ms': round(float(timings.mean()) * 1000, 4),
+        'throughput': round(items / p50, 2) if p50 > 0 else None,
+        'peak_mib': None
+    }
+
+    if memory:
+        tracemalloc.start()
+        try:
+            operation()
+            result['peak_mib'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def compare(baseline, results, threshold=0.15, memory_threshold=0.25,
+            min_delta_ms=0.05, min_delta_mib=1.0):
+    """
+    Compare results against a baseline run
+
+    A case regresses when its median latency grew by more than `threshold`
+    (and by at least min_delta_ms, to ignore noise on sub-millisecond
+    cases) or its peak allocation grew by more than `memory_threshold`
+    (and by at least min_delta_mib).
+
+    Returns:
+        List of rows {name, scale, baseline/current p50 and peak, ratio,
+        status}; status is 'regression', 'improvement', 'ok', 'new',
+        'missing' or 'resized' (input size changed, not comparable)
+    """
+    previous = {(r['name'], r['scale']): r for r in baseline['results']}
+    current = {(r['name'], r['scale']): r for r in results}
+    rows = []
+
+    for key, result in current.items():
+        old = previous.get(key)
+        row = {
+            'name': key[0],
+            'scale': key[1],
+            'baseline_p50_ms': old['p50_ms'] if old else None,
+            'p50_ms': result['p50_ms'],
+            'baseline_peak_mib': old['peak_mib'] if old else None,
+            'peak_mib': result['peak_mib'],
+            'ratio': None,
+            'status': 'new'
+        }
+        if old is not None and old['size'] != result['size']:
+            row['status'] = 'resized'
+        elif old is not None:
+            ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else None
+            row['ratio'] = round(ratio, 3) if ratio is not None else None
+            slower = (ratio is not None and ratio > 1 + threshold
+                      and result['p50_ms'] - old['p50_ms'] >= min_delta_ms)
+            faster = (ratio is not None and ratio < 1 - threshold
+                      and old['p50_ms'] - result['p50_ms'] >= min_delta_ms)
+            heavier = (old['peak_mib'] is not None and result['peak_mib'] is not None
+                       and result['peak_mib'] > old['peak_mib'] * (1 + memory_threshold)
+                       and result['peak_mib'] - old['peak_mib'] >= min_delta_mib)
+            row['status'] = 'regression' if slower or heavier else 'improvement' if faster else 'ok'
+        rows.append(row)
+
+    for key in sorted(previous.keys() - current.keys()):
+        rows.append({'name': key[0], 'scale': key[1], 'status': 'missing'})
+    return rows
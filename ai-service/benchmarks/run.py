@@ -0,0 +1,178 @@
+"""
+Run the AI service benchmarks and optionally compare against a baseline
+
+Every case runs on seeded synthetic data at each requested scale (1k,
+100k, 1m records) in a temporary directory; models are trained there
+first and the Flask app serves them from it. Results (throughput, p50/p99
+latency, peak traced allocation) are printed and can be saved as a JSON
+baseline; --compare flags cases whose latency or memory regressed and
+exits with status 1 if any did.
+
+Usage:
+    python -m benchmarks.run --scale 1k 100k --output baseline.json
+    python -m benchmarks.run --scale 1k 100k --compare baseline.json
+    python -m benchmarks.run --group recommender endpoint --filter similar
+
+Run from the ai-service directory. Baselines are only comparable on the
+same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure the computation itself: no response cache, no worker processes
+os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'off')
+os.environ.setdefault('CPU_POOL_WORKERS', '0')
+
+from benchmarks import cases, synthetic
+from benchmarks.harness import CASES, compare, measure
+
+def environment(args):
+    """Machine and library versions recorded with a baseline"""
+    import numpy
+    import scipy
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'createdAt': time.time(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'scipy': scipy.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'scales': args.scale
+    }
+
+def selected_cases(args):
+    return [
+        c for c in CASES
+        if (not args.group or c.group in args.group)
+        and (not args.filter or any(f in c.name for f in args.filter))
+    ]
+
+def run(args):
+    selected = selected_cases(args)
+    if not selected:
+        sys.exit('No benchmark cases selected')
+
+    root = tempfile.mkdtemp(prefix='ai-benchmarks-')
+    results = []
+    for scale in args.scale:
+        # Every scale trains its own models into its own directory
+        scale_dir = os.path.join(root, scale)
+        os.makedirs(scale_dir)
+        os.chdir(scale_dir)
+        fixtures = cases.Fixtures(synthetic.SCALES[scale], seed=args.seed)
+
+        for benchmark in selected:
+            size = benchmark.size_for(fixtures.size)
+            operation, items = benchmark.setup(fixtures, size)
+            result = measure(operation, items, budget=args.budget, memory=not args.no_memory)
+            result.update(name=benchmark.name, group=benchmark.group, scale=scale, size=size, items=items)
+            results.append(result)
+            print(f"  {scale:>5} {benchmark.name:<50} p50 {result['p50_ms']:>11.3f} ms", file=sys.stderr)
+
+    return results, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def print_results(results):
+    print(f"{'case':<50} {'scale':>5} {'size':>8} {'runs':>5} {'p50 ms':>11} {'p99 ms':>11} "
+          f"{'items/s':>13} {'peak MiB':>9}")
+    for r in results:
+        throughput = f"{r['throughput']:.1f}" if r['throughput'] is not None else '-'
+        peak = f"{r['peak_mib']:.2f}" if r['peak_mib'] is not None else '-'
+        print(f"{r['name']:<50} {r['scale']:>5} {r['size']:>8} {r['repeats']:>5} {r['p50_ms']:>11.3f} "
+              f"{r['p99_ms']:>11.3f} {throughput:>13} {peak:>9}")
+
+def print_comparison(rows):
+    print(f"{'case':<50} {'scale':>5} {'base p50':>11} {'p50 ms':>11} {'ratio':>7} "
+          f"{'base MiB':>9} {'MiB':>9}  status")
+    for row in rows:
+        if row['status'] == 'missing':
+            print(f"{row['name']:<50} {row['scale']:>5} {'':>11} {'':>11} {'':>7} {'':>9} {'':>9}  missing")
+            continue
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else '-'
+
+        print(f"{row['name']:<50} {row['scale']:>5} {fmt(row['baseline_p50_ms'], '11.3f'):>11} "
+              f"{fmt(row['p50_ms'], '11.3f'):>11} {fmt(row['ratio'], '7.2f'):>7} "
+              f"{fmt(row['baseline_peak_mib'], '9.2f'):>9} {fmt(row['peak_mib'], '9.2f'):>9}  {row['status']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', nargs='+', default=['1k'], choices=list(synthetic.SCALES))
+    parser.add_argument('--group', nargs='+', help='Only these groups (data_processor, recommender, '
+                                                   'price_predictor, sentiment, endpoint, training, '
+                                                   'endpoint_write)')
+    parser.add_argument('--filter', nargs='+', help='Only cases whose name contains one of these')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget', type=float, default=2.0, help='Seconds of timed calls per case')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced-allocation run')
+    parser.add_argument('--output', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Relative p50 increase flagged as a regression')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='Relative peak allocation increase flagged as a regression')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of tables')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    output = os.path.abspath(args.output) if args.output else None
+    meta = environment(args)
+    results, max_rss_mib = run(args)
+    meta['max_rss_mib'] = round(max_rss_mib, 1)
+    report = {'meta': meta, 'results': results}
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    rows = None
+    if baseline is not None:
+        # Only cases this run selected can be missing
+        names = {c.name for c in selected_cases(args)}
+        selected_baseline = dict(baseline, results=[
+            r for r in baseline['results'] if r['name'] in names and r['scale'] in args.scale
+        ])
+        rows = compare(selected_baseline, results, threshold=args.threshold,
+                       memory_threshold=args.memory_threshold)
+        report['comparison'] = {'baseline': baseline['meta'], 'rows': rows}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(results)
+        print(f"\nmax RSS {meta['max_rss_mib']} MiB")
+        if rows is not None:
+            print()
+            print_comparison(rows)
+
+    if rows is not None and any(row['status'] == 'regression' for row in rows):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Seeded synthetic data shaped like the service's real inputs
+
+Every generator takes a size and a seed and returns the same records for
+the same arguments, so benchmark runs on different commits see identical
+data.
+"""
+import numpy as np
+
+from models.theme_matcher import DEFAULT_THEMES
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+CATEGORIES = [f'category-{i}' for i in range(40)] + [
+    'electronics', 'wearables', 'accessories', 'power', 'peripherals'
+]
+TAGS = [f'tag-{i}' for i in range(200)]
+
+POSITIVE = ['great', 'excellent', 'love', 'good', 'perfect', 'recommend', 'happy', 'worth']
+NEGATIVE = ['bad', 'poor', 'broken', 'disappointed', 'waste', 'refund', 'problem', 'returned']
+NEUTRAL = ['the', 'product', 'arrived', 'it', 'is', 'and', 'for', 'my', 'this', 'was', 'after', 'week']
+THEME_PHRASES = [phrase for phrases in DEFAULT_THEMES.values() for phrase in phrases]
+
+# Fixed "now" so timestamps, and therefore popularity, do not drift between runs
+EPOCH = 1767225600
+
+def catalog(size, seed=42):
+    """
+    Products as loaded into the catalog store
+
+    Categories and tags are Zipf-skewed like a real catalog; a few products
+    have no category, no tags or a zero price, which exercise the
+    special cases of the similarity functions.
+    """
+    rng = np.random.default_rng(seed)
+    category_idx = np.minimum(rng.zipf(1.5, size) - 1, len(CATEGORIES) - 1)
+    no_category = rng.random(size) < 0.01
+    prices = np.round(rng.lognormal(4.5, 1.0, size), 2)
+    prices[rng.random(size) < 0.01] = 0
+    tag_counts = rng.integers(0, 8, size)
+    tag_idx = np.minimum(rng.zipf(1.3, int(tag_counts.sum())) - 1, len(TAGS) - 1)
+    stock = rng.integers(0, 500, size)
+    ratings = np.round(rng.uniform(1, 5, size), 1)
+    rating_counts = rng.integers(0, 300, size)
+
+    products = []
+    offset = 0
+    for i in range(size):
+        count = int(tag_counts[i])
+        products.append({
+            '_id': f'p{i}',
+            'category': None if no_category[i] else CATEGORIES[category_idx[i]],
+            'tags': [TAGS[t] for t in tag_idx[offset:offset + count]],
+            'basePrice': float(prices[i]),
+            'price': float(prices[i]),
+            'stock': int(stock[i]),
+            'ratingAverage': float(ratings[i]),
+            'ratingCount': int(rating_counts[i])
+        })
+        offset += count
+    return products
+
+def interactions(size, seed=42):
+    """
+    User/product ratings with Zipf-distributed product popularity
+
+    About 10 interactions per user and 20 per product, so the matrices
+    keep a realistic density as the size grows.
+    """
+    rng = np.random.default_rng(seed)
+    num_users = max(size // 10, 10)
+    num_products = max(size // 20, 50)
+    users = rng.integers(0, num_users, size)
+    products = (rng.zipf(1.2, size) - 1) % num_products
+    ratings = rng.integers(1, 6, size)
+    timestamps = EPOCH - rng.integers(0, 90 * 86400, size)
+
+    return [
+        {'userId': f'u{user}', 'productId': f'p{product}', 'rating': int(rating), 'timestamp': int(timestamp)}
+        for user, product, rating, timestamp in zip(
+            users.tolist(), products.tolist(), ratings.tolist(), timestamps.tolist()
+        )
+    ]
+
+def reviews(size, seed=42):
+    """
+    Reviews whose wording agrees with the rating most of the time and
+    mentions the default themes
+    """
+    rng = np.random.default_rng(seed)
+    ratings = rng.integers(1, 6, size)
+    lengths = rng.integers(5, 40, size)
+    vocab = np.array(NEUTRAL * 4 + POSITIVE + NEGATIVE + THEME_PHRASES)
+    words = vocab[rng.integers(0, len(vocab), int(lengths.sum()))]
+    tone = rng.random(size)
+
+    result = []
+    offset = 0
+    for i in range(size):
+        length = int(lengths[i])
+        text = words[offset:offset + length].tolist()
+        offset += length
+        if tone[i] < 0.8:
+            text.append(POSITIVE[i % len(POSITIVE)] if ratings[i] >= 4 else NEGATIVE[i % len(NEGATIVE)])
+        result.append({'text': ' '.join(text).capitalize() + '.', 'rating': int(ratings[i])})
+    return result
+
+def theme_dictionary(size, seed=42):
+    """Theme dictionary of `size` one-phrase themes, half of which occur in the reviews"""
+    rng = np.random.default_rng(seed)
+    vocab = NEUTRAL + POSITIVE + NEGATIVE + THEME_PHRASES
+    words = [vocab[i] for i in rng.integers(0, len(vocab), size)]
+    return {f'theme-{i}': [word if i % 2 else f'{word}-{i}'] for i, word in enumerate(words)}
+
+def price_training(size, seed=42):
+    """Training rows for the price model"""
+    rng = np.random.default_rng(seed)
+    base_prices = np.round(rng.lognormal(4.5, 1.0, size), 2) + 1
+    stock = rng.integers(0, 300, size)
+    demand = rng.integers(0, 100, size)
+    competition = rng.integers(0, 10, size)
+    categories = rng.integers(0, len(CATEGORIES), size)
+    actual = base_prices * (1 + (demand - 50) / 500 - (stock - 150) / 3000 + rng.normal(0, 0.03, size))
+
+    return [
+        {
+            'basePrice': float(base_price),
+            'features': {
+                'stock': int(s), 'demand': int(d), 'competition': int(c), 'category': CATEGORIES[k]
+            },
+            'actualPrice': float(price)
+        }
+        for base_price, s, d, c, k, price in zip(
+            base_prices.tolist(), stock.tolist(), demand.tolist(),
+            competition.tolist(), categories.tolist(), actual.tolist()
+        )
+    ]
+
+def price_requests(size, seed=43):
+    """Products to price, as sent to /api/predict-price/batch"""
+    return [
+        {'productId': f'p{i}', 'basePrice': row['basePrice'], 'features': row['features']}
+        for i, row in enumerate(price_training(size, seed))
+    ]
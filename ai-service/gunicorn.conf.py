@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for production serving
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Threaded workers (gthread) let one process serve many concurrent reads
+while a training or bulk request is in flight; NumPy/SciPy release the GIL
+in their kernels, and the heaviest work (item similarity, model fitting,
+very large sentiment batches) runs in the per-process CPU pool
+(CPU_POOL_WORKERS). Per-endpoint limits (ENDPOINT_CONCURRENCY) keep
+training and bulk calls from occupying every thread.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('AI_SERVICE_PORT', '5000')}"
+
+# Workers memory-map the model artifacts, so the large arrays are shared
+# through the page cache (see scripts/memory_report.py)
+workers = int(os.getenv('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Training and ingest requests can run for minutes
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 600))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,267 @@
+import numpy as np
+import os
+import time
+
+from utils.data_processor import DataProcessor
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index
+
+    Normalized vectors are clustered with spherical k-means into `nlist`
+    cells. A query is scored against the centroids first and only the rows
+    of the `nprobe` closest cells are scored exactly, so query cost scales
+    with nprobe / nlist of the catalog instead of all of it.
+
+    Recall/latency knobs:
+        nlist: Number of cells. More cells means smaller cells to scan.
+        nprobe: Cells scanned per query. Higher recall, higher latency.
+        min_size: Catalogs smaller than this are searched by brute force.
+    """
+
+    ASSIGN_CHUNK = 65536
+
+    def __init__(self, nlist=256, nprobe=8, iterations=10, sample_size=100000,
+                 min_size=20000, seed=42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.min_size = min_size
+        self.seed = seed
+
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.lists = []
+        self.overflow = set()
+        self._overflow_limit = 0
+        self.catalog_version = None
+
+    @property
+    def is_built(self):
+        return self.centroids is not None
+
+    def build(self, vectors, catalog_version=None):
+        """
+        Cluster normalized vectors and build the inverted lists
+
+        Args:
+            vectors: (n, d) array of L2-normalized rows
+            catalog_version: Catalog version the index was built from
+
+        Returns:
+            Build statistics
+        """
+        start = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        n = len(vectors)
+        nlist = max(1, min(self.nlist, n))
+
+        # Train centroids on a sample, then assign every row
+        if n > self.sample_size:
+            sample = vectors[rng.choice(n, self.sample_size, replace=False)]
+        else:
+            sample = vectors
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = self._nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+
+            # Re-seed empty cells with random sample rows
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = self._normalize(sums)
+
+        self.centroids = centroids
+        self.assignments = self._nearest_centroids(vectors, centroids).astype(np.int32)
+        self._rebuild_lists(n)
+        self.catalog_version = catalog_version
+
+        return {
+            'nlist': nlist,
+            'nprobe': self.nprobe,
+            'size': n,
+            'largest_cell': int(max(len(rows) for rows in self.lists)),
+            'build_seconds': round(time.perf_counter() - start, 3)
+        }
+
+    def search(self, vectors, query, k, nprobe=None, exclude=None):
+        """
+        Approximate top-k rows by cosine similarity
+
+        Args:
+            vectors: (n, d) normalized catalog rows (the array the index covers)
+            query: Normalized query vector
+            k: Number of rows to return
+            nprobe: Override the number of cells scanned
+            exclude: Row to leave out of the results (the query product)
+
+        Returns:
+            Row indices, best first
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        n = len(vectors)
+
+        probe = DataProcessor.top_k_indices(self.centroids @ query, nprobe)
+        candidates = np.concatenate([self.lists[cell] for cell in probe])
+
+        if self.overflow:
+            # Drop rows that moved cells or left the catalog since the lists were built
+            candidates = np.concatenate([candidates, np.fromiter(self.overflow, dtype=np.int64)])
+            candidates = candidates[candidates < n]
+            candidates = np.unique(candidates[np.isin(self.assignments[candidates], probe)])
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+
+        scores = vectors[candidates] @ query
+        return candidates[DataProcessor.top_k_indices(scores, k)]
+
+    def assign(self, row, vector):
+        """Place a new or updated row in its nearest cell"""
+        if row >= len(self.assignments):
+            grown = np.full(max(2 * len(self.assignments), row + 1), -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+
+        self.assignments[row] = int(np.argmax(self.centroids @ vector))
+        self._mark_changed(row)
+
+    def move(self, source, target):
+        """Follow a catalog row that was moved into another slot"""
+        self.assignments[target] = self.assignments[source]
+        self.assignments[source] = -1
+        self._mark_changed(target)
+
+    def drop(self, row):
+        """Forget a row that left the catalog"""
+        self.assignments[row] = -1
+        self._mark_changed(row)
+
+    def copy(self):
+        """Independent copy to apply row changes to (centroids are shared)"""
+        index = IVFIndex(self.nlist, self.nprobe, self.iterations, self.sample_size, self.min_size, self.seed)
+        index.centroids = self.centroids
+        index.assignments = self.assignments.copy()
+        # The per-cell arrays are replaced, never changed in place
+        index.lists = list(self.lists)
+        index.overflow = set(self.overflow)
+        index._overflow_limit = self._overflow_limit
+        index.catalog_version = self.catalog_version
+        return index
+
+    def save(self, index_file):
+        """Persist centroids, assignments and knobs"""
+        np.savez(
+            index_file,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            params=np.array([self.nlist, self.nprobe, self.iterations,
+                             self.sample_size, self.min_size, self.seed]),
+            catalog_version=np.array([self.catalog_version])
+        )
+
+    @classmethod
+    def load(cls, index_file, size):
+        """
+        Load a persisted index
+
+        Args:
+            index_file: Path written by save()
+            size: Number of rows in the catalog the index is used with
+
+        Returns:
+            IVFIndex, or None if the file does not exist
+        """
+        if not os.path.exists(index_file):
+            return None
+
+        state = np.load(index_file, allow_pickle=True)
+        index = cls(*(int(value) for value in state['params']))
+        index.centroids = state['centroids']
+        index.assignments = state['assignments']
+        catalog_version = state['catalog_version'][0]
+        index.catalog_version = None if catalog_version is None else int(catalog_version)
+        index._rebuild_lists(size)
+        return index
+
+    def recall_report(self, vectors, k=10, nprobe_values=(1, 2, 4, 8, 16, 32),
+                      num_queries=200):
+        """
+        Compare index results against exact brute-force search
+
+        Args:
+            vectors: (n, d) normalized catalog rows
+            k: Neighbours per query
+            nprobe_values: nprobe settings to evaluate
+            num_queries: Number of catalog rows used as queries
+
+        Returns:
+            One entry per nprobe with recall@k and mean latencies in ms
+        """
+        rng = np.random.default_rng(self.seed)
+        queries = rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+
+        # Score of the k-th exact neighbour; ties with it count as hits too
+        thresholds = {}
+        start = time.perf_counter()
+        for row in queries:
+            scores = vectors @ vectors[row]
+            scores[row] = -np.inf
+            exact = DataProcessor.top_k_indices(scores, k)
+            thresholds[row] = (scores[exact[-1]], len(exact)) if len(exact) else (np.inf, 0)
+        brute_force_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        report = []
+        for nprobe in nprobe_values:
+            hits = 0
+            expected = 0
+            start = time.perf_counter()
+            for row in queries:
+                found = self.search(vectors, vectors[row], k, nprobe=nprobe, exclude=row)
+                threshold, count = thresholds[row]
+                hits += min(count, int(np.count_nonzero(vectors[found] @ vectors[row] >= threshold)))
+                expected += count
+            index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            report.append({
+                'nprobe': nprobe,
+                'recall': round(hits / expected, 4) if expected else 1.0,
+                'index_ms': round(index_ms, 3),
+                'brute_force_ms': round(brute_force_ms, 3),
+                'speedup': round(brute_force_ms / index_ms, 2) if index_ms else None
+            })
+
+        return report
+
+    def _rebuild_lists(self, size):
+        """Group rows by cell into one sorted array per cell"""
+        assignments = self.assignments[:size]
+        order = np.argsort(assignments, kind='stable')
+        valid = order[assignments[order] >= 0]
+        bounds = np.searchsorted(assignments[valid], np.arange(len(self.centroids) + 1))
+        self.lists = [valid[bounds[cell]:bounds[cell + 1]] for cell in range(len(self.centroids))]
+        self.overflow = set()
+        self._overflow_limit = max(1000, len(valid) // 10)
+
+    def _mark_changed(self, row):
+        """Track rows not yet reflected in the lists; fold them in when many pile up"""
+        self.overflow.add(row)
+        if len(self.overflow) > self._overflow_limit:
+            self._rebuild_lists(len(self.assignments))
+
+    def _nearest_centroids(self, vectors, centroids):
+        """Index of the most similar centroid for every row, in bounded chunks"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), self.ASSIGN_CHUNK):
+            chunk = vectors[start:start + self.ASSIGN_CHUNK]
+            labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms != 0)
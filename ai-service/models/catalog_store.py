@@ -0,0 +1,570 @@
+import fcntl
+import numpy as np
+import joblib
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from models.ann_index import IVFIndex
+from utils.artifact_store import ArtifactStore
+from utils.data_processor import DataProcessor
+from utils.metrics import stage
+
+class CatalogSnapshot:
+    """
+    One state of the catalog, never changed once readers can see it
+
+    Holds one row per product in a preallocated feature matrix together
+    with an L2-normalized copy; rows past `size` are spare capacity.
+    Writers change a `copy()` and swap it in whole, so a query reads IDs,
+    rows and index of one and the same state.
+    """
+
+    def __init__(self, ids, categories, features, normalized, index=None, version=0, tag=None):
+        self.ids = ids
+        self.categories = categories
+        self.id_to_row = {product_id: row for row, product_id in enumerate(ids)}
+        self.features = features
+        self.normalized = normalized
+        self.index = index
+        self.version = version
+        # '<artifact version>:<change log offset>' of the published state
+        # this snapshot equals; None once it was changed locally
+        self.tag = tag
+
+    @classmethod
+    def empty(cls, num_features, capacity, version=0):
+        return cls([], [], np.zeros((capacity, num_features)), np.zeros((capacity, num_features)), version=version)
+
+    @property
+    def size(self):
+        return len(self.ids)
+
+    def copy(self):
+        """Private copy to apply changes to (untagged)"""
+        snapshot = CatalogSnapshot.__new__(CatalogSnapshot)
+        snapshot.ids = list(self.ids)
+        snapshot.categories = list(self.categories)
+        snapshot.id_to_row = dict(self.id_to_row)
+        snapshot.features = self.features.copy()
+        snapshot.normalized = self.normalized.copy()
+        snapshot.index = None if self.index is None else self.index.copy()
+        snapshot.version = self.version
+        snapshot.tag = None
+        return snapshot
+
+    def replace(self, **changes):
+        """Snapshot sharing every row with this one except for `changes`"""
+        snapshot = CatalogSnapshot.__new__(CatalogSnapshot)
+        snapshot.__dict__.update(self.__dict__, **changes)
+        return snapshot
+
+    def append_row(self, product_id):
+        """Reserve a new row for a product, growing the matrices if needed"""
+        if self.size == len(self.features):
+            capacity = max(2 * len(self.features), CatalogStore.INITIAL_CAPACITY)
+            self.features = self._grow(self.features, capacity)
+            self.normalized = self._grow(self.normalized, capacity)
+
+        row = self.size
+        self.ids.append(product_id)
+        self.categories.append(None)
+        self.id_to_row[product_id] = row
+        return row
+
+    def write_row(self, row, category, vector, unit_vector):
+        """Store a product's encoded and normalized rows"""
+        self.categories[row] = category
+        self.features[row] = vector
+        self.normalized[row] = unit_vector
+        if self.index is not None:
+            self.index.assign(row, self.normalized[row])
+
+    def remove_row(self, product_id):
+        """
+        Remove a product; False if it is not in the catalog
+
+        The last row is moved into the freed slot, so removal is O(1) and
+        the matrix stays dense.
+        """
+        row = self.id_to_row.pop(product_id, None)
+        if row is None:
+            return False
+
+        last = self.size - 1
+        if self.index is not None:
+            if row != last:
+                self.index.move(last, row)
+            else:
+                self.index.drop(row)
+
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.categories[row] = self.categories[last]
+            self.features[row] = self.features[last]
+            self.normalized[row] = self.normalized[last]
+            self.id_to_row[moved_id] = row
+
+        self.ids.pop()
+        self.categories.pop()
+        return True
+
+    def _grow(self, matrix, capacity):
+        grown = np.zeros((capacity, matrix.shape[1]))
+        grown[:self.size] = matrix[:self.size]
+        return grown
+
+class CatalogStore:
+    """
+    Resident product catalog for content-based similarity lookups
+
+    Keeps the encoded catalog in memory (see CatalogSnapshot), so a
+    similarity query is a single matrix-vector product against data that
+    is already encoded. Every change builds a new snapshot and swaps it in
+    through one reference; queries never see a half-applied change.
+
+    An optional IVF index (see `build_index`) replaces the brute-force scan
+    for large catalogs; it follows upserts and removals incrementally.
+
+    The catalog is published as artifact versions (trained_models/catalog/).
+    Changes made inside `publishing()` are applied to the latest published
+    catalog under a lock shared by all processes and appended to the
+    version's change log as one record per upsert or removal (the encoded
+    rows, not the whole catalog). Other processes pick them up with
+    `reload_if_changed()` by applying only the records they have not seen.
+    Once COMPACTION_THRESHOLD rows were logged, or when the index changes,
+    the whole catalog is published as a new version instead.
+    """
+
+    INITIAL_CAPACITY = 1024
+    COMPACTION_THRESHOLD = 100000
+    LOCK_FILE = '.lock'
+    LOG_FILE = 'changes.log'
+
+    def __init__(self, encoder, num_features, model_path='trained_models'):
+        """
+        Args:
+            encoder: Callable turning a list of product dicts into an
+                (n, num_features) feature matrix
+            num_features: Number of features produced by the encoder
+            model_path: Directory used to persist the catalog
+        """
+        self.encoder = encoder
+        self.num_features = num_features
+        self.model_path = model_path
+        self.artifacts = ArtifactStore(os.path.join(self.model_path, 'catalog'), log=self.LOG_FILE)
+        # Artifact version the catalog was loaded from or last published
+        # as, how far its change log was applied and how many rows it holds
+        self.published = None
+        self._log_end = 0
+        self._log_rows = 0
+        # Records of the changes made inside publishing(), None outside it
+        self._changes = None
+        self._instance = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._serving = CatalogSnapshot.empty(self.num_features, self.INITIAL_CAPACITY)
+
+        os.makedirs(self.artifacts.root, exist_ok=True)
+        self.load_model()
+
+    def __len__(self):
+        return self._serving.size
+
+    @property
+    def size(self):
+        return self._serving.size
+
+    @property
+    def version(self):
+        return self._serving.version
+
+    @property
+    def ids(self):
+        return self._serving.ids
+
+    @property
+    def categories(self):
+        return self._serving.categories
+
+    @property
+    def features(self):
+        return self._serving.features
+
+    @property
+    def normalized(self):
+        return self._serving.normalized
+
+    @property
+    def index(self):
+        return self._serving.index
+
+    def upsert(self, products, replace=False):
+        """
+        Insert or update products in the catalog
+
+        Args:
+            products: List of product dicts (must contain '_id')
+            replace: Drop the current catalog before loading
+
+        Returns:
+            Summary with number of inserted/updated rows and catalog version
+        """
+        # Encode the whole batch up front, outside the lock
+        products = [product for product in products if product.get('_id') is not None]
+        vectors = np.asarray(self.encoder(products), dtype=float).reshape(len(products), self.num_features)
+        record = ('upsert', replace, [product['_id'] for product in products],
+                  [product.get('category') for product in products], vectors)
+
+        with self._lock:
+            snapshot = self._start_change(self._serving, replace, len(products))
+            inserted, updated = self._apply_upsert(snapshot, *record[2:])
+            snapshot.version += 1
+            self._serving = snapshot
+            self._record(record)
+
+        return {
+            'inserted': inserted,
+            'updated': updated,
+            'size': snapshot.size,
+            'version': snapshot.version
+        }
+
+    def remove(self, product_ids):
+        """
+        Remove products from the catalog
+
+        Returns:
+            Summary with number of removed rows and catalog version
+        """
+        product_ids = list(product_ids)
+
+        with self._lock:
+            snapshot = self._serving.copy()
+            removed = sum(snapshot.remove_row(product_id) for product_id in product_ids)
+            snapshot.version += 1
+            self._serving = snapshot
+            self._record(('remove', product_ids))
+
+        return {
+            'removed': removed,
+            'size': snapshot.size,
+            'version': snapshot.version
+        }
+
+    def similar(self, product_id, limit=5):
+        """
+        Find the most similar products to a product already in the catalog
+
+        Args:
+            product_id: Target product ID
+            limit: Number of similar products to return
+
+        Returns:
+            List of similar product IDs, best first
+        """
+        snapshot = self._serving
+        row = snapshot.id_to_row.get(product_id)
+        size = snapshot.size
+        if row is None or size <= 1:
+            return []
+
+        limit = min(limit, size - 1)
+        normalized = snapshot.normalized[:size]
+        index = snapshot.index
+        if index is not None and size >= index.min_size:
+            # Probing the index scores and selects in one step
+            with stage('search'):
+                top_indices = index.search(normalized, normalized[row], limit, exclude=row)
+        else:
+            with stage('score'):
+                scores = normalized @ normalized[row]
+                scores[row] = -np.inf
+            with stage('topk'):
+                top_indices = DataProcessor.top_k_indices(scores, limit)
+
+        return [snapshot.ids[idx] for idx in top_indices]
+
+    def build_index(self, **params):
+        """
+        Build (or rebuild) the approximate nearest-neighbour index
+
+        Args:
+            params: IVFIndex knobs (nlist, nprobe, iterations, sample_size, min_size)
+
+        Returns:
+            Build statistics
+        """
+        with self._lock:
+            snapshot = self._serving
+            index = IVFIndex(**params)
+            result = index.build(snapshot.normalized[:snapshot.size], catalog_version=snapshot.version)
+            self._serving = snapshot.replace(index=index, tag=None)
+            # The index is published with a whole new version
+            self._record(None)
+        return result
+
+    def drop_index(self):
+        """Go back to brute-force search (persisted by the next save_model())"""
+        with self._lock:
+            self._serving = self._serving.replace(index=None, tag=None)
+            self._record(None)
+
+    def index_recall_report(self, **params):
+        """Recall and latency of the current index against brute force"""
+        snapshot = self._serving
+        if snapshot.index is None:
+            return []
+        return snapshot.index.recall_report(snapshot.normalized[:snapshot.size], **params)
+
+    def category_of(self, product_id):
+        """Category of a product in the catalog, or None if unknown"""
+        snapshot = self._serving
+        row = snapshot.id_to_row.get(product_id)
+        return None if row is None else snapshot.categories[row]
+
+    def scores(self, unit_vector):
+        """Cosine similarity of a normalized vector against every catalog row"""
+        snapshot = self._serving
+        return snapshot.normalized[:snapshot.size] @ unit_vector
+
+    def cache_version(self):
+        """
+        Tag of the catalog contents and index, for response cache keys
+
+        The published artifact version and change log offset while the
+        catalog equals that published state, so every process serving it
+        shares cache entries (also through Redis). Unpublished changes get
+        a tag unique to this process instead: the `version` counter alone
+        can match another process's different catalog.
+        """
+        snapshot = self._serving
+        if snapshot.tag is not None:
+            return f'catalog-{snapshot.tag}'
+
+        tag = f'local-{self._instance}-{snapshot.version}'
+        index = snapshot.index
+        if index is None:
+            return tag
+        return (f'{tag}/ivf-{index.nlist}-{index.nprobe}-{index.iterations}-'
+                f'{index.sample_size}-{index.min_size}-{index.seed}-{index.catalog_version}')
+
+    def stats(self):
+        """Catalog size and version tag"""
+        snapshot = self._serving
+        stats = {
+            'size': snapshot.size,
+            'version': snapshot.version,
+            'num_features': self.num_features,
+            'index': None
+        }
+        if snapshot.index is not None:
+            stats['index'] = {
+                'nlist': len(snapshot.index.centroids),
+                'nprobe': snapshot.index.nprobe,
+                'min_size': snapshot.index.min_size,
+                'built_at_version': snapshot.index.catalog_version
+            }
+        return stats
+
+    @contextmanager
+    def publishing(self):
+        """
+        Apply changes on top of the latest published catalog and publish them
+
+        Holds an exclusive file lock shared by every process using the
+        catalog, so changes made by different workers are applied one after
+        another instead of overwriting each other. Changes that completed
+        are published even if the block raises afterwards.
+        """
+        with open(os.path.join(self.artifacts.root, self.LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                self._changes = []
+                try:
+                    yield
+                finally:
+                    changes, self._changes = self._changes, None
+                    self._publish_changes(changes)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reload_if_changed(self):
+        """
+        Apply catalog changes published by another process
+
+        Cheap to call on every request: the artifact store only stat()s the
+        manifest and change log once per check interval. Only log records
+        appended since the last check are applied; a new version is loaded
+        in full.
+
+        Returns:
+            True if the catalog was reloaded or changed
+        """
+        if not self.artifacts.changed():
+            return False
+        return self._catch_up()
+
+    def save_model(self):
+        """
+        Publish the catalog (and its index) as a new artifact version
+
+        The version directory is complete before the manifest points at it,
+        so other processes never load a half-written catalog. The new
+        version starts with an empty change log.
+        """
+        snapshot = self._serving
+        size = snapshot.size
+        state = {
+            'ids': snapshot.ids[:size],
+            'categories': snapshot.categories[:size],
+            'features': snapshot.features[:size],
+            'version': snapshot.version
+        }
+
+        def write(catalog_dir):
+            joblib.dump(state, os.path.join(catalog_dir, 'catalog_store.pkl'))
+            if snapshot.index is not None:
+                snapshot.index.save(os.path.join(catalog_dir, 'catalog_ann_index.npz'))
+
+        meta = {'size': size, 'version': snapshot.version}
+        published = self.artifacts.publish(write, meta)['version']
+        with self._lock:
+            self.published = published
+            self._log_end = 0
+            self._log_rows = 0
+            if self._serving is snapshot:
+                self._serving = snapshot.replace(tag=f'{published}:0')
+
+    def load_model(self):
+        """Load the current catalog version and apply its change log"""
+        # Record the on-disk state first, so a publish racing this load is
+        # still picked up by the next reload_if_changed()
+        self.artifacts.mark_seen()
+        manifest = self.artifacts.manifest()
+        if manifest is not None:
+            published = manifest['version']
+            catalog_dir = self.artifacts.version_path(published)
+        else:
+            # Unversioned files from older releases
+            published = None
+            catalog_dir = self.model_path
+
+        catalog_file = os.path.join(catalog_dir, 'catalog_store.pkl')
+        if not os.path.exists(catalog_file):
+            return
+
+        state = joblib.load(catalog_file)
+        features = state['features']
+        if features.shape[1] != self.num_features:
+            return
+
+        ids = list(state['ids'])
+        capacity = max(len(features), self.INITIAL_CAPACITY)
+        loaded = np.zeros((capacity, self.num_features))
+        normalized = np.zeros((capacity, self.num_features))
+        loaded[:len(ids)] = features
+        normalized[:len(ids)] = self._normalize(features)
+        index = IVFIndex.load(os.path.join(catalog_dir, 'catalog_ann_index.npz'), len(ids))
+        snapshot = CatalogSnapshot(
+            ids, list(state['categories']), loaded, normalized, index, state['version'],
+            tag=None if published is None else f'{published}:0'
+        )
+
+        with self._lock:
+            self._serving = snapshot
+            self.published = published
+            self._log_end = 0
+            self._log_rows = 0
+            if published is not None:
+                self._apply_log()
+
+    def _catch_up(self):
+        """Load a new version, or apply the change log records not applied yet"""
+        self.artifacts.mark_seen()
+        manifest = self.artifacts.manifest()
+        version = manifest['version'] if manifest is not None else None
+        if version != self.published:
+            self.load_model()
+            return True
+        if version is None:
+            return False
+        with self._lock:
+            return self._apply_log()
+
+    def _apply_log(self):
+        """Apply the records appended to the change log since the last call (lock held)"""
+        records, end = self.artifacts.read_log(self.published, self._log_end)
+        if not records:
+            return False
+
+        snapshot = self._serving
+        for record in records:
+            if record[0] == 'upsert':
+                _, replace, ids, categories, vectors = record
+                snapshot = self._start_change(snapshot, replace, len(ids), private=snapshot is not self._serving)
+                self._apply_upsert(snapshot, ids, categories, vectors)
+            else:
+                if snapshot is self._serving:
+                    snapshot = snapshot.copy()
+                ids = record[1]
+                for product_id in ids:
+                    snapshot.remove_row(product_id)
+            snapshot.version += 1
+            self._log_rows += len(ids)
+
+        self._log_end = end
+        snapshot.tag = f'{self.published}:{end}'
+        self._serving = snapshot
+        return True
+
+    def _start_change(self, snapshot, replace, num_rows, private=False):
+        """Snapshot to apply a change to: a new empty one, or a copy unless already private"""
+        if replace:
+            return CatalogSnapshot.empty(self.num_features, max(num_rows, self.INITIAL_CAPACITY), snapshot.version)
+        return snapshot if private else snapshot.copy()
+
+    def _apply_upsert(self, snapshot, ids, categories, vectors):
+        """Write encoded rows into a private snapshot; returns (inserted, updated)"""
+        inserted = 0
+        updated = 0
+        normalized = self._normalize(vectors)
+        for product_id, category, vector, unit_vector in zip(ids, categories, vectors, normalized):
+            row = snapshot.id_to_row.get(product_id)
+            if row is None:
+                row = snapshot.append_row(product_id)
+                inserted += 1
+            else:
+                updated += 1
+            snapshot.write_row(row, category, vector, unit_vector)
+        return inserted, updated
+
+    def _record(self, record):
+        """Keep a change for publishing(); None asks for a whole new version (lock held)"""
+        if self._changes is not None:
+            self._changes.append(record)
+
+    def _publish_changes(self, changes):
+        """Append changes to the change log, or publish a new version when due"""
+        if not changes:
+            return
+
+        rows = sum(len(record[2] if record[0] == 'upsert' else record[1]) for record in changes if record)
+        if (self.published is None or any(record is None for record in changes)
+                or self._log_rows + rows >= self.COMPACTION_THRESHOLD):
+            self.save_model()
+            return
+
+        with self._lock:
+            self._log_end = self.artifacts.append_log(self.published, changes, self._log_end)
+            self._log_rows += rows
+            self.artifacts.mark_seen()
+            self._serving = self._serving.replace(tag=f'{self.published}:{self._log_end}')
+
+    @staticmethod
+    def _normalize(matrix):
+        """L2-normalize rows; all-zero rows stay zero"""
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms != 0)
@@ -0,0 +1,183 @@
+import numpy as np
+import json
+import os
+
+class FlatForest:
+    """
+    Tree ensemble flattened into memory-mappable NumPy arrays
+
+    The nodes of every tree of a fitted RandomForestRegressor are
+    concatenated into flat arrays saved as .npy files. Loading them with
+    mmap_mode='r' lets every server process share one page-cache copy,
+    where unpickling the estimator gives each process its own copy of
+    every tree.
+
+    Prediction walks a block of trees for all rows at once, one depth level
+    per step. Leaves point to themselves, and (tree, row) pairs that
+    reached one are dropped from the walk, so steps only touch the paths
+    still descending. It reproduces the estimator's output exactly: inputs
+    are compared as float32 like sklearn does, missing values follow each
+    split's learned direction, and per-tree predictions are summed in
+    estimator order before averaging.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+    CHUNK_SIZE = 4096
+    # (tree, row) pairs walked together, and steps between dropping finished walks
+    BLOCK_PAIRS = 32768
+    COMPACT_EVERY = 4
+
+    def __init__(self, arrays, max_depth, num_features):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.missing_left = arrays['missing_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = max_depth
+        self.num_features = num_features
+
+    @classmethod
+    def from_estimator(cls, forest):
+        """
+        Flatten a fitted single-output RandomForestRegressor
+
+        Args:
+            forest: Fitted estimator exposing estimators_[i].tree_
+        """
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        total = int(sizes.sum())
+        index_dtype = np.int32 if total < np.iinfo(np.int32).max else np.int64
+
+        feature = np.empty(total, dtype=np.int32)
+        threshold = np.empty(total, dtype=np.float64)
+        left = np.empty(total, dtype=index_dtype)
+        right = np.empty(total, dtype=index_dtype)
+        missing_left = np.zeros(total, dtype=bool)
+        value = np.empty(total, dtype=np.float64)
+
+        for tree, root in zip(trees, roots):
+            nodes = slice(root, root + tree.node_count)
+            local = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves so every walk can run max_depth steps
+            feature[nodes] = np.where(leaf, 0, tree.feature)
+            threshold[nodes] = np.where(leaf, np.inf, tree.threshold)
+            left[nodes] = root + np.where(leaf, local, tree.children_left)
+            right[nodes] = root + np.where(leaf, local, tree.children_right)
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_left[nodes] = tree.missing_go_to_left.astype(bool)
+            value[nodes] = tree.value[:, 0, 0]
+
+        arrays = {
+            'feature': feature,
+            'threshold': threshold,
+            'left': left,
+            'right': right,
+            'missing_left': missing_left,
+            'value': value,
+            'roots': roots.astype(index_dtype)
+        }
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(arrays, max_depth, forest.n_features_in_)
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    def save(self, model_dir):
+        """Write the arrays as forest_<name>.npy plus forest_meta.json"""
+        for name in self.ARRAYS:
+            np.save(os.path.join(model_dir, f'forest_{name}.npy'), getattr(self, name))
+        with open(os.path.join(model_dir, 'forest_meta.json'), 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'num_features': self.num_features}, f)
+
+    @classmethod
+    def load(cls, model_dir, mmap_mode='r'):
+        """
+        Load a forest written by save()
+
+        Returns:
+            FlatForest, or None if model_dir holds no forest
+        """
+        meta_file = os.path.join(model_dir, 'forest_meta.json')
+        if not os.path.exists(meta_file):
+            return None
+
+        with open(meta_file) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(model_dir, f'forest_{name}.npy'), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        }
+        return cls(arrays, meta['max_depth'], meta['num_features'])
+
+    def predict(self, X):
+        """
+        Mean prediction of all trees
+
+        Args:
+            X: (n, num_features) array
+
+        Returns:
+            (n,) array of predictions
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.num_features:
+            raise ValueError(f'Expected {self.num_features} features, got shape {X.shape}')
+        if np.isinf(X).any():
+            raise ValueError('Input contains infinity')
+
+        predictions = np.empty(len(X))
+        for start in range(0, len(X), self.CHUNK_SIZE):
+            chunk = X[start:start + self.CHUNK_SIZE]
+            predictions[start:start + len(chunk)] = self._predict_chunk(chunk)
+        return predictions
+
+    def _predict_chunk(self, X):
+        n = len(X)
+        values = X.ravel()
+        has_missing = np.isnan(values).any()
+        feature, threshold = np.asarray(self.feature), np.asarray(self.threshold)
+        left, right = np.asarray(self.left), np.asarray(self.right)
+        roots = np.asarray(self.roots)
+        # A chunk is small enough for 32-bit offsets into X
+        row_offsets = np.arange(n, dtype=np.int32) * self.num_features
+        leaves = np.empty(self.num_trees * n, dtype=roots.dtype)
+
+        # A few trees at a time for large chunks, so their nodes stay in
+        # cache across steps; all of them for small ones
+        block_size = max(self.BLOCK_PAIRS // n, 1)
+        for first in range(0, self.num_trees, block_size):
+            block = roots[first:first + block_size]
+            # One entry per (tree, row) pair still walking: its index into
+            # `leaves`, its current node and the offset of its row in X
+            pairs = np.arange(first * n, (first + len(block)) * n)
+            nodes = np.repeat(block, n)
+            offsets = np.tile(row_offsets, len(block))
+
+            step = 0
+            while len(nodes):
+                x = values.take(offsets + feature.take(nodes))
+                go_left = x <= threshold.take(nodes)
+                if has_missing:
+                    missing = np.isnan(x)
+                    go_left[missing] = self.missing_left[nodes[missing]]
+                next_nodes = np.where(go_left, left.take(nodes), right.take(nodes))
+
+                # Leaves loop back to themselves: drop the pairs that reached
+                # one (every few steps, walking a leaf again is cheaper)
+                step += 1
+                if step % self.COMPACT_EVERY == 0:
+                    moved = next_nodes != nodes
+                    done = ~moved
+                    leaves[pairs[done]] = nodes[done]
+                    pairs, next_nodes, offsets = pairs[moved], next_nodes[moved], offsets[moved]
+                nodes = next_nodes
+
+        # Sequential sum in tree order (cumsum), like the estimator's accumulation
+        return np.cumsum(np.asarray(self.value).take(leaves).reshape(self.num_trees, n), axis=0)[-1] / self.num_trees
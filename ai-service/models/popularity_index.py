@@ -0,0 +1,159 @@
+import numpy as np
+import joblib
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+class PopularityIndex:
+    """
+    Time-decayed interaction counts per product for cold-start recommendations
+
+    Every interaction adds exp(rate * (t - anchor)) to its product, which
+    ranks products exactly like a count decayed to "now" with the given
+    half-life, without touching the other products on each update. The
+    ranking is kept as a sorted list that is rebuilt lazily after updates,
+    so serving the top K is a slice.
+    """
+
+    MAX_EXPONENT = 500
+
+    def __init__(self, half_life_days=30, model_path='trained_models'):
+        self.half_life_days = half_life_days
+        self.decay_rate = math.log(2) / (half_life_days * 86400)
+        self.model_path = model_path
+        self.anchor = None
+        self.scores = {}
+        self._order = None
+        self._category_orders = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, product_id, timestamp=None, weight=1.0):
+        """
+        Count one interaction
+
+        Args:
+            product_id: Product the interaction is about
+            timestamp: Epoch seconds/milliseconds or ISO-8601 string (default: now)
+            weight: Contribution of this interaction
+        """
+        t = self._to_epoch(timestamp)
+
+        with self._lock:
+            if self.anchor is None:
+                self.anchor = t
+
+            exponent = self.decay_rate * (t - self.anchor)
+            if exponent > self.MAX_EXPONENT:
+                # Move the anchor forward before exp() overflows
+                self._rebase(t)
+                exponent = 0.0
+
+            self.scores[product_id] = self.scores.get(product_id, 0.0) + weight * math.exp(exponent)
+            self._order = None
+            self._category_orders = {}
+
+    def top(self, limit, category=None, category_of=None):
+        """
+        Most popular products, best first
+
+        Args:
+            limit: Number of products to return
+            category: Only return products of this category
+            category_of: Callable mapping a product ID to its category
+                (required when category is given)
+
+        Returns:
+            List of product IDs
+        """
+        if category is None:
+            return self._ranking()[:limit]
+
+        with self._lock:
+            order = self._category_orders.get(category)
+        if order is None:
+            order = [
+                product_id for product_id in self._ranking()
+                if category_of(product_id) == category
+            ]
+            with self._lock:
+                self._category_orders[category] = order
+        return order[:limit]
+
+    def rank(self, product_ids, limit):
+        """
+        Most popular products among the given candidates
+
+        Products without interactions score 0; ties keep the input order.
+        """
+        scores = self.scores
+        candidate_scores = np.array([scores.get(product_id, 0.0) for product_id in product_ids])
+        top = np.argsort(-candidate_scores, kind='stable')[:limit]
+        return [product_ids[idx] for idx in top]
+
+    def decayed_counts(self, product_ids, now=None):
+        """Interaction counts decayed to `now` (default: current time)"""
+        if self.anchor is None:
+            return {product_id: 0.0 for product_id in product_ids}
+
+        factor = math.exp(-self.decay_rate * (self._to_epoch(now) - self.anchor))
+        return {
+            product_id: self.scores.get(product_id, 0.0) * factor
+            for product_id in product_ids
+        }
+
+    def save_model(self):
+        """Save popularity scores to disk"""
+        index_file = os.path.join(self.model_path, 'popularity_index.pkl')
+        with self._lock:
+            state = {
+                'half_life_days': self.half_life_days,
+                'anchor': self.anchor,
+                'scores': dict(self.scores)
+            }
+        # Write-then-rename so other processes never read a partial file
+        tmp_file = f'{index_file}.{os.getpid()}.tmp'
+        joblib.dump(state, tmp_file)
+        os.replace(tmp_file, index_file)
+
+    def load_model(self):
+        """Load popularity scores from disk"""
+        index_file = os.path.join(self.model_path, 'popularity_index.pkl')
+        if not os.path.exists(index_file):
+            return
+
+        state = joblib.load(index_file)
+        if state['half_life_days'] != self.half_life_days:
+            return
+        self.anchor = state['anchor']
+        self.scores = state['scores']
+        self._order = None
+        self._category_orders = {}
+
+    def _ranking(self):
+        """All products sorted by score, rebuilt only after updates"""
+        order = self._order
+        if order is None:
+            with self._lock:
+                order = sorted(self.scores, key=self.scores.get, reverse=True)
+                self._order = order
+        return order
+
+    def _rebase(self, t):
+        factor = math.exp(-self.decay_rate * (t - self.anchor))
+        self.scores = {product_id: score * factor for product_id, score in self.scores.items()}
+        self.anchor = t
+
+    @staticmethod
+    def _to_epoch(timestamp):
+        """Epoch seconds from seconds, milliseconds, ISO-8601 strings or None"""
+        if timestamp is None:
+            return time.time()
+        if isinstance(timestamp, (int, float)):
+            # Values this large are JavaScript-style milliseconds
+            return timestamp / 1000 if timestamp > 1e11 else float(timestamp)
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).timestamp()
@@ -1,18 +1,48 @@
 import numpy as np
-import pandas as pd
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 import joblib
+import logging
 import os
+import zlib
+from datetime import datetime
+
+from models.flat_forest import FlatForest
+from models.pricing_rules import PricingRuleEngine
+from utils.artifact_store import ArtifactStore
+from utils.data_processor import DataProcessor
+from utils.metrics import record_fallback, stage
+from utils.product_batch import ProductBatch
+
+logger = logging.getLogger(__name__)
 
 class PricePredictor:
+    NUM_FEATURES = 7
+    
+    # 1 serves the forest from memory-mapped arrays shared by all worker
+    # processes; by default each process unpickles a private copy, which
+    # is faster for large batches
+    SHARED_MODEL = os.getenv('PRICE_MODEL_MMAP', '0') != '0'
+    # Batches up to this many rows are predicted by the memory-mapped
+    # forest even with a private copy: below it, the flattened walk beats
+    # the estimator's per-call overhead (measured crossover)
+    FLAT_FOREST_MAX_ROWS = 1000
+    
     def __init__(self):
         self.model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
         self.is_trained = False
         self.model_path = 'trained_models'
         
+        # Predictions read (scaler, model, small-batch model) through one
+        # reference, so a retrain swaps them at once
+        self._serving = (self.scaler, self.model, self.model)
+        self.pricing_rules = PricingRuleEngine.from_config()
+        
         os.makedirs(self.model_path, exist_ok=True)
+        self.version = None
+        self.artifacts = ArtifactStore(os.path.join(self.model_path, 'price_predictor'))
         self.load_model()
     
     def predict_optimal_price(self, product_id, base_price, features, historical_data):
@@ -29,18 +59,22 @@ class PricePredictor:
             Dictionary with predicted price and confidence
         """
         # Extract features for prediction
-        feature_vector = self._create_feature_vector(base_price, features)
+        with stage('encode'):
+            feature_vector = self._create_feature_vector(base_price, features)
         
         if self.is_trained and len(feature_vector) > 0:
             try:
                 # Use trained model
-                scaled_features = self.scaler.transform([feature_vector])
-                predicted_price = self.model.predict(scaled_features)[0]
-            except Exception as e:
+                with stage('score'):
+                    predicted_price = self._predict_model([feature_vector])[0]
+            except Exception:
                 # Fallback to rule-based
+                logger.exception('Price model failed; falling back to rule-based pricing')
+                record_fallback('price_predictor', 'model_error')
                 predicted_price = self._rule_based_pricing(base_price, features)
         else:
             # Use rule-based pricing if model not trained
+            record_fallback('price_predictor', 'untrained')
             predicted_price = self._rule_based_pricing(base_price, features)
         
         # Calculate discount percentage
@@ -58,12 +92,102 @@ class PricePredictor:
             'strategy': 'ml_model' if self.is_trained else 'rule_based'
         }
     
-    def train(self, training_data):
+    def _predict_model(self, feature_matrix):
+        """Scale and predict a feature matrix, small batches on the flattened forest"""
+        scaler, model, small_batch_model = self._serving
+        if len(feature_matrix) <= self.FLAT_FOREST_MAX_ROWS:
+            model = small_batch_model
+        return model.predict(scaler.transform(feature_matrix))
+    
+    def predict_optimal_prices(self, products):
+        """
+        Predict optimal prices for many products in one call
+        
+        Builds a single feature matrix, scales and predicts it with one call
+        to the model, and applies the rule-based fallback, discount and
+        clamping on whole arrays. Produces the same values as calling
+        predict_optimal_price for every product.
+        
+        Args:
+            products: List of {productId, basePrice, features}
+        
+        Returns:
+            List of prediction dictionaries, in input order. A product whose
+            basePrice is missing or not a finite number gets
+            {product_id, error} instead.
+        """
+        if not products:
+            return []
+        
+        results = [
+            {'product_id': product.get('productId'), 'error': 'basePrice must be a finite number'}
+            for product in products
+        ]
+        valid_prices = [self._valid_base_price(product.get('basePrice')) for product in products]
+        rows = [row for row, price in enumerate(valid_prices) if price is not None]
+        if not rows:
+            return results
+        
+        products = [products[row] for row in rows]
+        base_prices = np.array([valid_prices[row] for row in rows], dtype=float)
+        features = [product.get('features') or {} for product in products]
+        
+        if self.is_trained:
+            try:
+                # Use trained model on the whole batch
+                with stage('encode'):
+                    feature_matrix = self._create_feature_matrix(base_prices, features)
+                with stage('score'):
+                    predicted_prices = self._predict_model(feature_matrix)
+            except Exception:
+                # Fallback to rule-based
+                logger.exception('Price model failed; falling back to rule-based pricing')
+                record_fallback('price_predictor', 'model_error')
+                predicted_prices = self._rule_based_pricing_batch(base_prices, features)
+        else:
+            # Use rule-based pricing if model not trained
+            record_fallback('price_predictor', 'untrained')
+            predicted_prices = self._rule_based_pricing_batch(base_prices, features)
+        
+        # Calculate discount percentage
+        positive = base_prices > 0
+        safe_base = np.where(positive, base_prices, 1)
+        discounts = np.where(positive, ((base_prices - predicted_prices) / safe_base) * 100, 0)
+        
+        # Ensure prices are within reasonable bounds
+        predicted_prices = np.maximum(base_prices * 0.5, np.minimum(predicted_prices, base_prices * 1.2))
+        
+        confidence = 0.85 if self.is_trained else 0.65
+        strategy = 'ml_model' if self.is_trained else 'rule_based'
+        for row, product, predicted_price, discount in zip(
+            rows, products, predicted_prices.tolist(), discounts.tolist()
+        ):
+            results[row] = {
+                'product_id': product.get('productId'),
+                'base_price': product.get('basePrice'),
+                'predicted_price': round(predicted_price, 2),
+                'discount_percentage': round(discount, 2),
+                'confidence': confidence,
+                'strategy': strategy
+            }
+        return results
+    
+    @staticmethod
+    def _valid_base_price(value):
+        """value as a float if it is a finite number, else None"""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        value = float(value)
+        return value if np.isfinite(value) else None
+    
+    def train(self, training_data, pool=None, progress=None):
         """
         Train price prediction model
         
         Args:
             training_data: List of {basePrice, features, actualPrice, sales}
+            pool: Optional WorkerPool to fit the model in
+            progress: Optional callable receiving (fraction, message)
         
         Returns:
             Training metrics
@@ -71,57 +195,170 @@ class PricePredictor:
         if not training_data or len(training_data) < 10:
             return {'error': 'Insufficient training data (min 10 samples required)'}
         
-        # Prepare training data
-        X = []
-        y = []
+        # Prepare training data (one feature matrix for all rows)
+        X = self._create_feature_matrix(
+            np.array([data['basePrice'] for data in training_data], dtype=float),
+            [data.get('features') or {} for data in training_data]
+        )
+        y = np.array([data['actualPrice'] for data in training_data])
+        
+        if progress:
+            progress(0.2, 'Fitting model')
+        return self._fit(X, y, pool)
+    
+    def train_stream(self, records, batch_size=5000, max_samples=500000, seed=42, pool=None):
+        """
+        Train price prediction model from a stream of records
+        
+        Records are encoded in batches of batch_size straight into numeric
+        arrays. At most max_samples rows are kept; beyond that a uniform
+        reservoir sample of the stream is used, so memory stays bounded
+        regardless of the stream length.
+        
+        Args:
+            records: Iterable of {basePrice, features, actualPrice}
+            batch_size: Records encoded per batch
+            max_samples: Upper bound on rows held for fitting
+            seed: Seed for reservoir sampling
+            pool: Optional WorkerPool to fit the model in
         
-        for data in training_data:
-            feature_vector = self._create_feature_vector(
-                data['basePrice'],
-                data.get('features', {})
+        Returns:
+            Training metrics
+        """
+        rng = np.random.default_rng(seed)
+        X = np.empty((0, self.NUM_FEATURES))
+        y = np.empty(0)
+        filled = 0
+        seen = 0
+        
+        for batch in DataProcessor.batched(records, batch_size):
+            batch_X = self._create_feature_matrix(
+                np.array([data['basePrice'] for data in batch], dtype=float),
+                [data.get('features') or {} for data in batch]
             )
-            X.append(feature_vector)
-            y.append(data['actualPrice'])
+            batch_y = np.array([data['actualPrice'] for data in batch], dtype=float)
+            
+            # Fill the buffer first (growing it geometrically up to max_samples)
+            take = min(max_samples - filled, len(batch))
+            if filled + take > len(X):
+                capacity = min(max(2 * len(X), filled + take), max_samples)
+                grown_X = np.empty((capacity, self.NUM_FEATURES))
+                grown_y = np.empty(capacity)
+                grown_X[:filled] = X[:filled]
+                grown_y[:filled] = y[:filled]
+                X, y = grown_X, grown_y
+            X[filled:filled + take] = batch_X[:take]
+            y[filled:filled + take] = batch_y[:take]
+            filled += take
+            
+            # Reservoir sampling for everything past max_samples
+            if take < len(batch):
+                positions = seen + np.arange(take, len(batch))
+                slots = rng.integers(0, positions + 1)
+                replace = slots < max_samples
+                X[slots[replace]] = batch_X[take:][replace]
+                y[slots[replace]] = batch_y[take:][replace]
+            
+            seen += len(batch)
+        
+        if filled < 10:
+            return {'error': 'Insufficient training data (min 10 samples required)'}
         
-        X = np.array(X)
-        y = np.array(y)
+        result = self._fit(X[:filled], y[:filled], pool)
+        result['num_records'] = seen
+        return result
+    
+    def _fit(self, X, y, pool=None):
+        """
+        Fit a fresh copy of the model and swap it in
         
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X)
+        Predictions keep using the previous model and scaler until the fit
+        is done. With a pool, fitting runs in a worker process.
+        """
+        estimator = clone(self.model)
+        if pool is not None:
+            model, scaler, train_score = pool.run(fit_price_model, estimator, X, y)
+        else:
+            model, scaler, train_score = fit_price_model(estimator, X, y)
         
-        # Train model
-        self.model.fit(X_scaled, y)
+        self.model, self.scaler = model, scaler
+        self._serving = (scaler, model, model)
         self.is_trained = True
         
-        # Calculate training score
-        train_score = self.model.score(X_scaled, y)
-        
-        # Save model
+        # Save model, then serve it from the published artifacts
         self.save_model()
+        self.load_model()
         
         return {
-            'num_samples': len(training_data),
+            'num_samples': len(X),
             'train_score': round(train_score, 4),
             'model_type': 'RandomForestRegressor'
         }
     
     def save_model(self):
-        """Save trained model to disk"""
-        if self.is_trained:
-            model_file = os.path.join(self.model_path, 'price_predictor.pkl')
-            scaler_file = os.path.join(self.model_path, 'price_scaler.pkl')
-            joblib.dump(self.model, model_file)
-            joblib.dump(self.scaler, scaler_file)
+        """
+        Save trained model to disk as a new artifact version
+        
+        Next to the pickled estimator, the forest is written as flat .npy
+        arrays (see FlatForest) that worker processes memory-map.
+        """
+        if self.is_trained and hasattr(self.model, 'estimators_'):
+            model, scaler = self.model, self.scaler
+            
+            def write(model_dir):
+                joblib.dump(model, os.path.join(model_dir, 'price_predictor.pkl'))
+                joblib.dump(scaler, os.path.join(model_dir, 'price_scaler.pkl'))
+                FlatForest.from_estimator(model).save(model_dir)
+            
+            self.version = self.artifacts.publish(write)['version']
     
     def load_model(self):
-        """Load trained model from disk"""
-        model_file = os.path.join(self.model_path, 'price_predictor.pkl')
-        scaler_file = os.path.join(self.model_path, 'price_scaler.pkl')
+        """Load the current model version from disk"""
+        self.artifacts.mark_seen()
+        manifest = self.artifacts.manifest()
+        if manifest is not None:
+            version = manifest['version']
+            model_dir = self.artifacts.version_path(version)
+        else:
+            # Unversioned files from older releases
+            version = None
+            model_dir = self.model_path
+        
+        model_file = os.path.join(model_dir, 'price_predictor.pkl')
+        scaler_file = os.path.join(model_dir, 'price_scaler.pkl')
+        if not os.path.exists(scaler_file):
+            return
         
-        if os.path.exists(model_file) and os.path.exists(scaler_file):
+        forest = FlatForest.load(model_dir)
+        if forest is not None and self.SHARED_MODEL:
+            self.scaler = joblib.load(scaler_file)
+            self._serving = (self.scaler, forest, forest)
+            # Only the hyperparameters are needed for retraining
+            self.model = clone(self.model)
+        elif os.path.exists(model_file):
             self.model = joblib.load(model_file)
             self.scaler = joblib.load(scaler_file)
-            self.is_trained = True
+            self._serving = (self.scaler, self.model, forest if forest is not None else self.model)
+        else:
+            return
+        
+        self.version = version
+        self.is_trained = True
+    
+    def reload_if_changed(self):
+        """
+        Swap in a model version published by another process
+        
+        The manifest is only stat()ed once per check interval; in-flight
+        predictions finish on the (scaler, model) pair they started with.
+        
+        Returns:
+            True if the model was reloaded
+        """
+        if not self.artifacts.changed():
+            return False
+        self.load_model()
+        return True
     
     def _create_feature_vector(self, base_price, features):
         """Create feature vector for prediction"""
@@ -140,7 +377,7 @@ class PricePredictor:
         
         # Category encoding
         category = features.get('category', 'Unknown')
-        category_score = hash(category) % 100
+        category_score = self._category_code(category)
         vector.append(category_score / 100)
         
         # Competition level
@@ -148,54 +385,66 @@ class PricePredictor:
         vector.append(competition / 10)
         
         # Seasonality (day of week, time of year)
-        from datetime import datetime
         now = datetime.now()
         vector.append(now.weekday() / 7)  # Day of week
         vector.append(now.month / 12)  # Month
         
         return vector
     
+    def _create_feature_matrix(self, base_prices, features):
+        """
+        Feature matrix for a batch; same columns as _create_feature_vector
+        
+        Args:
+            base_prices: Array of base prices
+            features: ProductBatch or list of feature dicts, one per product
+        """
+        batch = ProductBatch.of(features)
+        now = datetime.now()
+        matrix = np.empty((len(base_prices), self.NUM_FEATURES))
+        
+        matrix[:, 0] = base_prices / 10000
+        matrix[:, 1] = batch.column('stock', 50) / 100
+        matrix[:, 2] = batch.column('demand', 50) / 100
+        matrix[:, 3] = batch.map_categories(self._category_code, 'Unknown') / 100
+        matrix[:, 4] = batch.column('competition', 5) / 10
+        matrix[:, 5] = now.weekday() / 7
+        matrix[:, 6] = now.month / 12
+        
+        return matrix
+    
+    @staticmethod
+    def _category_code(category):
+        """Deterministic 0-99 bucket for a category (hash() is salted per process)"""
+        return zlib.crc32(str(category).encode('utf-8')) % 100
+    
     def _rule_based_pricing(self, base_price, features):
         """
         Rule-based pricing algorithm (fallback when ML model not available)
         
-        Pricing rules:
+        Pricing rules (see models/pricing_rules.py, overridable through
+        PRICING_RULES_FILE):
         - Low stock: increase price (scarcity premium)
         - High demand: increase price
         - High competition: decrease price
-        - Off-season: decrease price
+        - Premium/budget categories: small markup/markdown
         """
-        price = base_price
-        
-        # Stock-based adjustment
-        stock = features.get('stock', 50)
-        if stock < 10:
-            price *= 1.1  # 10% increase for low stock
-        elif stock > 100:
-            price *= 0.95  # 5% decrease for high stock
-        
-        # Demand-based adjustment
-        demand = features.get('demand', 50)
-        if demand > 80:
-            price *= 1.05  # 5% increase for high demand
-        elif demand < 20:
-            price *= 0.9  # 10% decrease for low demand
-        
-        # Competition-based adjustment
-        competition = features.get('competition', 5)
-        if competition > 10:
-            price *= 0.93  # 7% decrease for high competition
-        elif competition < 3:
-            price *= 1.03  # 3% increase for low competition
-        
-        # Category-based adjustment
-        category = features.get('category', '').lower()
-        premium_categories = ['electronics', 'wearables']
-        budget_categories = ['accessories', 'cables']
-        
-        if category in premium_categories:
-            price *= 1.02
-        elif category in budget_categories:
-            price *= 0.98
-        
-        return price
+        return float(self.pricing_rules.apply([base_price], [features])[0])
+    
+    def _rule_based_pricing_batch(self, base_prices, features):
+        """Rule-based pricing for a batch of products in one pass per rule"""
+        return self.pricing_rules.apply(base_prices, features)
+
+def fit_price_model(model, X, y):
+    """
+    Scale features and fit an unfitted estimator
+    
+    Module-level so worker processes can run it.
+    
+    Returns:
+        (fitted model, fitted scaler, training R^2)
+    """
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    model.fit(X_scaled, y)
+    return model, scaler, model.score(X_scaled, y)
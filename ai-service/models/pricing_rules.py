@@ -0,0 +1,118 @@
+import numpy as np
+import json
+import os
+
+# Rules are applied in order; within a rule the first matching band wins,
+# exactly like an if/elif chain. Prices a band does not match are
+# multiplied by 1.0.
+DEFAULT_PRICING_RULES = [
+    {
+        # Low stock: scarcity premium, high stock: clearance
+        'feature': 'stock',
+        'default': 50,
+        'bands': [
+            {'below': 10, 'multiplier': 1.1},
+            {'above': 100, 'multiplier': 0.95}
+        ]
+    },
+    {
+        'feature': 'demand',
+        'default': 50,
+        'bands': [
+            {'above': 80, 'multiplier': 1.05},
+            {'below': 20, 'multiplier': 0.9}
+        ]
+    },
+    {
+        'feature': 'competition',
+        'default': 5,
+        'bands': [
+            {'above': 10, 'multiplier': 0.93},
+            {'below': 3, 'multiplier': 1.03}
+        ]
+    },
+    {
+        'feature': 'category',
+        'default': '',
+        'bands': [
+            {'in': ['electronics', 'wearables'], 'multiplier': 1.02},
+            {'in': ['accessories', 'cables'], 'multiplier': 0.98}
+        ]
+    }
+]
+
+class PricingRuleEngine:
+    """
+    Table-driven rule-based pricing over whole batches
+
+    Each rule reads one feature column and maps it to a multiplier through
+    an ordered list of bands ('below' / 'above' thresholds for numeric
+    features, 'in' lists for categorical ones, matched case-insensitively).
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else DEFAULT_PRICING_RULES
+
+    @classmethod
+    def from_config(cls, path=None):
+        """
+        Load rules from a JSON file
+
+        Args:
+            path: Rules file; defaults to $PRICING_RULES_FILE. The built-in
+                table is used when neither is set.
+        """
+        path = path or os.getenv('PRICING_RULES_FILE')
+        if not path:
+            return cls()
+
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def apply(self, base_prices, features):
+        """
+        Price a batch of products
+
+        Args:
+            base_prices: Array of base prices
+            features: List of feature dicts, one per product
+
+        Returns:
+            Array of adjusted prices
+        """
+        prices = np.array(base_prices, dtype=float)
+
+        for rule in self.rules:
+            multipliers = self._multipliers(rule, features)
+            prices *= multipliers
+
+        return prices
+
+    def _multipliers(self, rule, features):
+        """Multiplier per product for one rule (first matching band wins)"""
+        name = rule['feature']
+        default = rule.get('default')
+        multipliers = np.ones(len(features))
+        matched = np.zeros(len(features), dtype=bool)
+
+        categorical = any('in' in band for band in rule['bands'])
+        if categorical:
+            values = np.array([str(f.get(name, default)).lower() for f in features], dtype=object)
+        else:
+            values = np.array([f.get(name, default) for f in features], dtype=float)
+
+        for band in rule['bands']:
+            if 'in' in band:
+                hits = np.isin(values, [value.lower() for value in band['in']])
+            else:
+                hits = np.ones(len(features), dtype=bool)
+                if 'below' in band:
+                    hits &= values < band['below']
+                if 'above' in band:
+                    hits &= values > band['above']
+
+            hits &= ~matched
+            multipliers[hits] = band['multiplier']
+            matched |= hits
+
+        return multipliers
@@ -1,69 +1,168 @@
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from sklearn.preprocessing import StandardScaler
+import fcntl
 import joblib
+import json
+import logging
 import os
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+
+from models.catalog_store import CatalogStore
+from models.popularity_index import PopularityIndex
+from utils.artifact_store import ArtifactStore
+from utils.data_processor import DataProcessor
+from utils.metrics import record_fallback, stage
+from utils.product_batch import ProductBatch
+
+logger = logging.getLogger(__name__)
 
 class RecommenderModel:
+    NUM_CONTENT_FEATURES = 4
+    NUM_NEIGHBOURS = 50
+    SIMILARITY_BLOCK_SIZE = 2048
+    COMPACTION_THRESHOLD = 100000
+    POPULARITY_HALF_LIFE_DAYS = 30
+    DELTA_LOG = 'deltas.log'
+    
     def __init__(self):
         self.user_item_matrix = None
+        self.item_similarity = None
+        self.user_ids = []
+        self.user_index = {}
+        self.item_ids = []
+        self.item_index = {}
+        self.deltas = {}
         self.product_features_matrix = None
         self.scaler = StandardScaler()
         self.model_path = 'trained_models'
         
+        # Incremental state kept next to the base matrices: the base ratings
+        # by item, squared item norms of the merged ratings, pending deltas
+        # by user and by item, and the neighbour lists patched by ingests
+        self.item_user_matrix = None
+        self.item_norms = np.zeros(0)
+        self._user_deltas = {}
+        self._item_deltas = {}
+        self.patched_neighbours = {}
+        
+        # Readers only ever see a published (item_index, num_items,
+        # item_similarity, patched_neighbours) tuple; writers build new
+        # neighbour lists under the lock and swap them in
+        self._serving = ({}, 0, None, {})
+        self._write_lock = threading.RLock()
+        self._artifact_lock_held = False
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+        
         # Create model directory if it doesn't exist
         os.makedirs(self.model_path, exist_ok=True)
         
+        # Versioned artifacts; deltas ingested on top of a version are
+        # appended to its change log
+        self.version = None
+        self.delta_version = None
+        self._log_end = 0
+        self._legacy_deltas = False
+        self.artifacts = ArtifactStore(os.path.join(self.model_path, 'recommender'), log=self.DELTA_LOG)
+        
+        # Time-decayed popularity for cold-start users
+        self.popularity = PopularityIndex(
+            half_life_days=self.POPULARITY_HALF_LIFE_DAYS,
+            model_path=self.model_path
+        )
+        self.popularity.load_model()
+        
         # Try to load existing model
         self.load_model()
+        
+        # Resident catalog for similar-product lookups
+        self.catalog = CatalogStore(
+            encoder=self._feature_matrix,
+            num_features=self.NUM_CONTENT_FEATURES,
+            model_path=self.model_path
+        )
     
-    def get_recommendations(self, user_id, product_ids, user_history, limit=10):
+    def get_recommendations(self, user_id, product_ids, user_history, limit=10,
+                            diversity=0, seed=None, category=None):
         """
-        Generate personalized product recommendations using collaborative filtering
+        Generate personalized product recommendations using item-item collaborative filtering
+        
+        Each candidate is scored by its precomputed similarity to the products
+        the user rated, weighted by how much the user liked them (rating - 3).
+        Output is deterministic; ties keep the order of product_ids.
         
         Args:
             user_id: User identifier
             product_ids: List of all available product IDs
             user_history: List of user's past interactions [{productId, rating}, ...]
             limit: Number of recommendations to return
+            diversity: Amount of random jitter added to scores (0 disables it)
+            seed: Optional seed for the jitter
+            category: Restrict cold-start results to one category
         
         Returns:
             List of recommended product IDs
         """
         if not user_history or len(user_history) == 0:
             # Cold start: return popular/trending products
-            return self._get_popular_products(product_ids, limit)
+            record_fallback('recommender', 'cold_start')
+            return self._get_popular_products(product_ids, limit, category)
         
-        # Create user preference vector
-        user_vector = self._create_user_vector(user_history, product_ids)
-        
-        # Calculate similarity with all products
         if len(product_ids) == 0:
             return []
         
-        # Simple collaborative filtering using cosine similarity
-        recommendations = []
         user_rated_products = {item['productId'] for item in user_history}
+        candidates = [prod_id for prod_id in product_ids if prod_id not in user_rated_products]
+        if not candidates:
+            return []
         
-        # Score products based on user's rating patterns
-        product_scores = {}
-        for prod_id in product_ids:
-            if prod_id not in user_rated_products:
-                # Calculate score based on similar products user liked
-                score = self._calculate_product_score(prod_id, user_history)
-                product_scores[prod_id] = score
+        # Sum the neighbour lists of the rated items, then pick out the candidates
+        item_index, num_items, item_similarity, patched_neighbours = self._serving
+        with stage('score'):
+            scores = np.zeros(len(candidates))
+            item_scores = self._score_items(
+                user_history, item_index, num_items, item_similarity, patched_neighbours
+            )
+            if item_scores is not None:
+                candidate_rows = np.array([item_index.get(prod_id, -1) for prod_id in candidates])
+                known = (candidate_rows >= 0) & (candidate_rows < len(item_scores))
+                scores[known] = item_scores[candidate_rows[known]]
+            
+            if diversity:
+                rng = np.random.default_rng(seed)
+                scores += rng.random(len(scores)) * diversity
+        if item_scores is None:
+            # No trained similarity: every candidate scores 0 (input order)
+            record_fallback('recommender', 'untrained')
         
-        # Sort by score and return top N
-        sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
-        recommendations = [prod_id for prod_id, score in sorted_products[:limit]]
+        with stage('topk'):
+            top_indices = DataProcessor.top_k_indices(scores, limit)
+        return [candidates[idx] for idx in top_indices]
+    
+    def get_similar_products(self, product_id, limit=5):
+        """
+        Find similar products in the resident catalog store
         
-        return recommendations
+        Args:
+            product_id: Target product ID (must have been loaded into the catalog)
+            limit: Number of similar products to return
+        
+        Returns:
+            List of similar product IDs
+        """
+        return self.catalog.similar(product_id, limit)
     
-    def get_similar_products(self, product_id, product_features, all_products, limit=5):
+    def get_similar_products_from_list(self, product_id, product_features, all_products, limit=5):
         """
         Find similar products based on content features (category, tags, price)
         
+        Legacy path for callers that send the candidate list with every
+        request instead of loading it into the catalog store.
+        
         Args:
             product_id: Target product ID
             product_features: Features of target product {category, tags, price}
@@ -76,122 +175,917 @@ class RecommenderModel:
         if not all_products or len(all_products) == 0:
             return []
         
-        # Create feature vectors
-        target_vector = self._create_feature_vector(product_features)
-        
-        similarities = []
-        for product in all_products:
-            if product.get('_id') == product_id:
-                continue
+        # Create feature vectors (one columnar batch for the whole catalog)
+        with stage('encode'):
+            target_vector = self._create_feature_vector(product_features)
             
-            prod_vector = self._create_feature_vector(product)
-            similarity = self._cosine_similarity(target_vector, prod_vector)
-            similarities.append((product.get('_id'), similarity))
+            batch = ProductBatch.from_products(all_products)
+            candidates = np.flatnonzero([candidate_id != product_id for candidate_id in batch.ids])
+            feature_matrix = self._feature_matrix(batch)[candidates]
+        
+        if not len(candidates):
+            return []
+        
+        with stage('score'):
+            similarities = self._cosine_similarities(target_vector, feature_matrix)
         
-        # Sort by similarity and return top N
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return [prod_id for prod_id, sim in similarities[:limit]]
+        # Partial selection of the top N instead of sorting every candidate
+        with stage('topk'):
+            top_indices = DataProcessor.top_k_indices(similarities, limit)
+        return [batch.ids[candidates[idx]] for idx in top_indices]
     
-    def train(self, interactions):
+    def train(self, interactions, pool=None, progress=None):
         """
         Train the recommendation model with user-product interactions
         
+        The interaction stream is read once into a sparse CSR matrix, so
+        memory grows with the number of interactions rather than users x
+        products. Repeated (user, product) pairs are averaged.
+        
         Args:
-            interactions: List of {userId, productId, rating}
+            interactions: Iterable of {userId, productId, rating}
+            pool: Optional WorkerPool for the item similarity computation
+            progress: Optional callable receiving (fraction, message)
         
         Returns:
             Training metrics
         """
-        if not interactions or len(interactions) == 0:
+        if progress:
+            progress(0.0, 'Building interaction matrix')
+        popularity = PopularityIndex(
+            half_life_days=self.POPULARITY_HALF_LIFE_DAYS,
+            model_path=self.model_path
+        )
+        user_ids, item_ids, user_item_matrix, num_interactions = \
+            self._build_interaction_matrix(interactions, popularity)
+        
+        if num_interactions == 0:
             return {'error': 'No training data provided'}
         
-        # Convert to DataFrame
-        df = pd.DataFrame(interactions)
+        # Precompute top-N item neighbours from the interaction matrix
+        if progress:
+            progress(0.3, 'Computing item similarity')
+        item_similarity = self._run(pool, compute_item_similarity, user_item_matrix)
+        item_user_matrix = user_item_matrix.T.tocsr()
         
-        # Create user-item matrix
-        user_item_matrix = df.pivot_table(
-            index='userId',
-            columns='productId',
-            values='rating',
-            fill_value=0
-        )
+        if progress:
+            progress(0.9, 'Publishing and saving model')
+        with self._write_lock, self._artifact_lock():
+            self.user_ids = user_ids
+            self.user_index = {user: idx for idx, user in enumerate(user_ids)}
+            self.item_ids = item_ids
+            self.item_index = {prod_id: idx for idx, prod_id in enumerate(item_ids)}
+            self._set_base(user_item_matrix, item_similarity, item_user_matrix)
+            self.popularity = popularity
+            
+            # Save model
+            self.save_model()
+            self.popularity.save_model()
         
-        self.user_item_matrix = user_item_matrix
+        return {
+            'num_users': len(user_ids),
+            'num_products': len(item_ids),
+            'num_interactions': num_interactions,
+            'num_similarities': int(self.item_similarity.nnz)
+        }
+    
+    def ingest(self, interactions, update_popularity=True, persist=True):
+        """
+        Incrementally add interactions to the trained model
         
-        # Save model
-        self.save_model()
+        New ratings are kept as deltas on top of the base matrix (the latest
+        rating for a user/product pair wins) and appended to the delta log
+        of the current version. Neighbour lists of the touched products are
+        recomputed from the ratings of the users who rated them and patched
+        into the lists of their neighbours; the patched lists are then
+        swapped in, so concurrent readers are never blocked. Deltas are
+        merged into the base matrix once COMPACTION_THRESHOLD is reached.
+        
+        Args:
+            interactions: Iterable of {userId, productId, rating, timestamp?}
+            update_popularity: Also count the interactions in the popularity index
+            persist: Log deltas and compact when due (off when replaying
+                deltas that are already on disk)
+        
+        Returns:
+            Ingest metrics
+        """
+        with self._write_lock:
+            if not persist:
+                return self._ingest(interactions, update_popularity, persist)
+            
+            # Every server process appends to the same delta log: catch up
+            # with it under the file lock, so other workers' deltas are
+            # applied before ours and every process ends in the same state
+            with self._artifact_lock():
+                self._catch_up()
+                return self._ingest(interactions, update_popularity, persist)
+    
+    def _ingest(self, interactions, update_popularity, persist):
+        """ingest() with the locks held"""
+        num_users, num_items = len(self.user_ids), len(self.item_ids)
+        users, items, ratings = [], [], []
+        
+        for interaction in interactions or []:
+            users.append(interaction['userId'])
+            items.append(interaction['productId'])
+            ratings.append(interaction.get('rating', 0))
+            if update_popularity:
+                self.popularity.add(interaction['productId'], self._interaction_time(interaction))
+        
+        if not users:
+            return {'error': 'No training data provided'}
+        
+        touched_items = self._apply_deltas(users, items, ratings)
+        if persist:
+            self._log_deltas(users, items, ratings)
+            if update_popularity:
+                self.popularity.save_model()
+        self._refresh_neighbours(touched_items)
+        
+        compacted = persist and len(self.deltas) >= self.COMPACTION_THRESHOLD
+        if compacted:
+            self.compact()
         
         return {
-            'num_users': len(user_item_matrix),
-            'num_products': len(user_item_matrix.columns),
-            'num_interactions': len(interactions)
+            'num_interactions': len(users),
+            'num_new_users': len(self.user_ids) - num_users,
+            'num_new_products': len(self.item_ids) - num_items,
+            'num_updated_products': len(touched_items),
+            'pending_deltas': len(self.deltas),
+            'compacted': compacted
         }
     
+    def compact(self, recompute=False, pool=None):
+        """
+        Merge pending deltas into the base matrix and save the model
+        
+        Args:
+            recompute: Also rebuild every neighbour list from scratch, dropping
+                drift from incremental patches
+            pool: Optional WorkerPool for the recompute
+        
+        Returns:
+            Compaction metrics
+        """
+        with self._write_lock, self._artifact_lock():
+            # Include deltas ingested by other server processes
+            self._catch_up()
+            merged = len(self.deltas)
+            if self.user_item_matrix is None and not merged:
+                return {'error': 'Model is not trained'}
+            
+            user_item_matrix = self._current_matrix()
+            if recompute:
+                item_similarity = self._run(pool, compute_item_similarity, user_item_matrix)
+            else:
+                item_similarity = self._materialized_similarity()
+            self._set_base(user_item_matrix, item_similarity)
+            self.save_model()
+            
+            return {
+                'merged_deltas': merged,
+                'num_users': len(self.user_ids),
+                'num_products': len(self.item_ids),
+                'recomputed': recompute
+            }
+    
     def save_model(self):
-        """Save trained model to disk"""
-        if self.user_item_matrix is not None:
-            model_file = os.path.join(self.model_path, 'user_item_matrix.pkl')
-            joblib.dump(self.user_item_matrix, model_file)
+        """
+        Save trained model to disk as a new artifact version
+        
+        Sparse matrices are written as flat .npy arrays (data, indices,
+        indptr) so they can be memory-mapped on load. The version directory
+        is complete before the manifest points at it, so other processes
+        never load a half-written model. Pending deltas start the delta log
+        of the new version.
+        """
+        if self.user_item_matrix is None and not self.deltas:
+            return
+        
+        if self.user_item_matrix is None:
+            # Deltas ingested into an untrained model: an empty base
+            user_item_matrix = item_user_matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        else:
+            user_item_matrix, item_user_matrix = self.user_item_matrix, self.item_user_matrix
+        num_users, num_items = user_item_matrix.shape
+        item_similarity = self._resize_csr(self.item_similarity, (num_items, num_items))
+        meta = {
+            'format': 1,
+            'num_users': num_users,
+            'num_items': num_items
+        }
+        
+        def write(model_dir):
+            np.save(os.path.join(model_dir, 'user_ids.npy'), np.array(self.user_ids[:num_users]))
+            np.save(os.path.join(model_dir, 'item_ids.npy'), np.array(self.item_ids[:num_items]))
+            self._save_csr(model_dir, 'interactions', user_item_matrix)
+            self._save_csr(model_dir, 'item_users', item_user_matrix)
+            self._save_csr(model_dir, 'similarity', item_similarity)
+            with open(os.path.join(model_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+        
+        self.version = self.artifacts.publish(write, meta)['version']
+        self._log_end = 0
+        if self.deltas:
+            self._log_end = self.artifacts.append_log(self.version, [self._delta_record()], 0)
+        self.delta_version = str(self._log_end) if self._log_end else None
+        self._legacy_deltas = False
+        self.artifacts.remove_side_file('deltas.npz')
+        self.artifacts.mark_seen()
     
     def load_model(self):
-        """Load trained model from disk"""
+        """Load the current model version from disk (memory-mapped) and replay its delta log"""
+        # Record the on-disk state first, so a publish racing this load is
+        # still picked up by the next reload_if_changed()
+        self.artifacts.mark_seen()
+        manifest = self.artifacts.manifest()
+        if manifest is not None:
+            version = manifest['version']
+            model_dir = self.artifacts.version_path(version)
+        else:
+            # Unversioned layout from older releases
+            version = None
+            model_dir = os.path.join(self.model_path, 'recommender')
+        
+        meta_file = os.path.join(model_dir, 'meta.json')
+        if not os.path.exists(meta_file):
+            self._load_legacy_model()
+            return
+        
+        with open(meta_file) as f:
+            meta = json.load(f)
+        
+        num_users, num_items = meta['num_users'], meta['num_items']
+        self.user_ids = np.load(os.path.join(model_dir, 'user_ids.npy')).tolist()
+        self.user_index = {user: idx for idx, user in enumerate(self.user_ids)}
+        self.item_ids = np.load(os.path.join(model_dir, 'item_ids.npy')).tolist()
+        self.item_index = {prod_id: idx for idx, prod_id in enumerate(self.item_ids)}
+        user_item_matrix = self._load_csr(model_dir, 'interactions', (num_users, num_items))
+        item_similarity = self._load_csr(model_dir, 'similarity', (num_items, num_items))
+        item_user_matrix = None
+        if os.path.exists(os.path.join(model_dir, 'item_users_indptr.npy')):
+            item_user_matrix = self._load_csr(model_dir, 'item_users', (num_items, num_users))
+        self.version = version
+        self.delta_version = None
+        self._log_end = 0
+        self._legacy_deltas = False
+        self._set_base(user_item_matrix, item_similarity, item_user_matrix)
+        
+        # Replay deltas ingested on top of this version since the last compaction
+        self._replay_legacy_deltas(version)
+        if version is not None:
+            self._replay_log()
+    
+    def _replay_log(self):
+        """
+        Apply the deltas appended to the current version's log since the last replay
+        
+        Returns:
+            True if there were new deltas
+        """
+        records, end = self.artifacts.read_log(self.version, self._log_end)
+        if not records:
+            return False
+        
+        users, items, ratings = [], [], []
+        for record_users, record_items, record_ratings in records:
+            users.extend(record_users)
+            items.extend(record_items)
+            ratings.extend(record_ratings)
+        self._refresh_neighbours(self._apply_deltas(users, items, ratings))
+        self._log_end = end
+        self.delta_version = str(end)
+        return True
+    
+    def _replay_legacy_deltas(self, version):
+        """Apply a deltas.npz saved by older releases, if it was ingested on top of `version`"""
+        delta_file = os.path.join(self.artifacts.root, 'deltas.npz')
+        if not os.path.exists(delta_file):
+            return
+        
+        deltas = np.load(delta_file)
+        base_version = str(deltas['base_version']) or None if 'base_version' in deltas else None
+        if base_version != version:
+            return
+        touched_items = self._apply_deltas(
+            deltas['users'].tolist(), deltas['items'].tolist(), deltas['ratings'].tolist()
+        )
+        self._refresh_neighbours(touched_items)
+        # Moved into the delta log by the next ingest
+        self._legacy_deltas = True
+        self.delta_version = str(deltas['delta_version']) if 'delta_version' in deltas else 'legacy'
+    
+    def cache_version(self):
+        """
+        Tag of everything recommendation and similarity results depend on
+
+        Changes with every trained version, ingest and catalog or index
+        update, and is the same in every process serving the same state,
+        so cached responses keyed on it are never served across a change.
+        """
+        return f'{self.version}:{self.delta_version}:{self.catalog.cache_version()}'
+    
+    def reload_if_changed(self):
+        """
+        Pick up a model version or deltas saved by another process
+        
+        Cheap to call on every request: the artifact store only stat()s the
+        manifest and delta log once per check interval, and the reload runs
+        on a background thread. A new version is loaded in full; new deltas
+        are applied on their own. Readers keep using the published neighbour
+        lists until the new ones are swapped in.
+        
+        Returns:
+            True if a background reload was started
+        """
+        if not self.artifacts.changed():
+            return False
+        
+        with self._refresher_lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return False
+            self._refresher = threading.Thread(target=self._refresh, name='recommender-reload', daemon=True)
+            self._refresher.start()
+        return True
+    
+    def _refresh(self):
+        """Background half of reload_if_changed()"""
+        try:
+            with self._write_lock:
+                self._catch_up()
+        except Exception:
+            # Requests keep being served from the previous state
+            logger.exception('Recommender reload failed')
+    
+    def _load_legacy_model(self):
+        """Convert a pickled pandas user_item_matrix from older versions"""
         model_file = os.path.join(self.model_path, 'user_item_matrix.pkl')
-        if os.path.exists(model_file):
-            self.user_item_matrix = joblib.load(model_file)
+        if not os.path.exists(model_file):
+            return
+        
+        legacy = joblib.load(model_file)
+        self.user_ids = list(legacy.index)
+        self.user_index = {user: idx for idx, user in enumerate(self.user_ids)}
+        self.item_ids = list(legacy.columns)
+        self.item_index = {prod_id: idx for idx, prod_id in enumerate(self.item_ids)}
+        user_item_matrix = sparse.csr_matrix(legacy.values, dtype=np.float32)
+        self._set_base(user_item_matrix, self._compute_item_similarity(user_item_matrix))
+        self.save_model()
+    
+    def _build_interaction_matrix(self, interactions, popularity=None):
+        """
+        Build a users x products CSR rating matrix straight from an interaction stream
+        
+        User and product IDs are mapped to integer rows/columns in order of
+        first appearance. Interactions are also counted into `popularity`
+        when given.
+        
+        Returns:
+            (user_ids, item_ids, matrix, num_interactions)
+        """
+        user_index = {}
+        item_index = {}
+        rows = array('q')
+        cols = array('q')
+        ratings = array('d')
+        
+        for interaction in interactions or []:
+            rows.append(user_index.setdefault(interaction['userId'], len(user_index)))
+            cols.append(item_index.setdefault(interaction['productId'], len(item_index)))
+            ratings.append(interaction.get('rating', 0))
+            if popularity is not None:
+                popularity.add(interaction['productId'], self._interaction_time(interaction))
+        
+        num_users, num_items = len(user_index), len(item_index)
+        rows = np.frombuffer(rows, dtype=np.int64)
+        cols = np.frombuffer(cols, dtype=np.int64)
+        ratings = np.frombuffer(ratings, dtype=np.float64)
+        
+        # Average repeated (user, product) pairs, like pivot_table did
+        keys, inverse = np.unique(rows * max(num_items, 1) + cols, return_inverse=True)
+        totals = np.bincount(inverse, weights=ratings)
+        counts = np.bincount(inverse)
+        
+        matrix = sparse.csr_matrix(
+            ((totals / counts).astype(np.float32), (keys // max(num_items, 1), keys % max(num_items, 1))),
+            shape=(num_users, num_items)
+        )
+        matrix.eliminate_zeros()
+        
+        return list(user_index), list(item_index), matrix, len(ratings)
     
-    def _get_popular_products(self, product_ids, limit):
-        """Get popular products for cold start"""
-        # Return random sample for now (in production, use actual popularity metrics)
-        import random
-        return random.sample(product_ids, min(limit, len(product_ids)))
+    @staticmethod
+    def _save_csr(model_dir, name, matrix):
+        """Write a CSR matrix as three flat .npy arrays"""
+        np.save(os.path.join(model_dir, f'{name}_data.npy'), matrix.data)
+        np.save(os.path.join(model_dir, f'{name}_indices.npy'), matrix.indices)
+        np.save(os.path.join(model_dir, f'{name}_indptr.npy'), matrix.indptr)
     
-    def _create_user_vector(self, user_history, all_product_ids):
-        """Create user preference vector"""
-        vector = np.zeros(len(all_product_ids))
-        product_id_to_idx = {pid: idx for idx, pid in enumerate(all_product_ids)}
+    @staticmethod
+    def _load_csr(model_dir, name, shape):
+        """Memory-map a CSR matrix written by _save_csr"""
+        arrays = [
+            np.load(os.path.join(model_dir, f'{name}_{part}.npy'), mmap_mode='r')
+            for part in ('data', 'indices', 'indptr')
+        ]
+        return sparse.csr_matrix(tuple(arrays), shape=shape, copy=False)
+    
+    @classmethod
+    def _compute_item_similarity(cls, interactions):
+        """
+        Cosine similarity between item columns, keeping the top-N neighbours per item
         
-        for item in user_history:
-            prod_id = item.get('productId')
-            rating = item.get('rating', 0)
-            if prod_id in product_id_to_idx:
-                vector[product_id_to_idx[prod_id]] = rating
+        Args:
+            interactions: Sparse users x items rating matrix
+        
+        Returns:
+            Sparse items x items CSR matrix; row i holds item i's neighbours
+        """
+        num_items = interactions.shape[1]
+        item_user = cls._normalized_item_user(interactions)
         
-        return vector
+        rows, cols, values = [], [], []
+        # Blocks of items bound the size of the intermediate similarity product
+        for start in range(0, num_items, cls.SIMILARITY_BLOCK_SIZE):
+            block_items = np.arange(start, min(start + cls.SIMILARITY_BLOCK_SIZE, num_items))
+            block = (item_user[block_items] @ item_user.T).tocsr()
+            block.eliminate_zeros()
+            
+            for offset, item in enumerate(block_items):
+                neighbours, sims = cls._top_neighbours(block, offset, item)
+                rows.append(np.full(len(neighbours), item))
+                cols.append(neighbours)
+                values.append(sims)
+        
+        return cls._csr_from_parts(rows, cols, values, (num_items, num_items))
+    
+    def _refresh_neighbours(self, items):
+        """
+        Recompute the neighbour lists of some items and patch their neighbours' lists
+        
+        Similarities come from the merged ratings of the users who rated the
+        items, a block of SIMILARITY_BLOCK_SIZE items at a time, so the cost
+        follows those users' ratings rather than the whole matrix. The
+        patched lists are kept on top of the base similarity matrix and
+        swapped in together.
+        
+        Args:
+            items: Sorted array of item columns whose ratings changed
+        """
+        if not len(items):
+            return
+        
+        norms = np.sqrt(np.maximum(self.item_norms[:len(self.item_ids)], 0))
+        inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms != 0)
+        
+        # Replaying many deltas reaches most users anyway: merge and scale
+        # the whole matrix once instead of gathering raters per block
+        scaled_ratings = None
+        if len(items) > self.SIMILARITY_BLOCK_SIZE:
+            scaled_ratings = self._current_matrix() @ sparse.diags(inverse_norms)
+        
+        changed = set(items.tolist())
+        patched = {}
+        for start in range(0, len(items), self.SIMILARITY_BLOCK_SIZE):
+            block_items = items[start:start + self.SIMILARITY_BLOCK_SIZE]
+            block = self._similarity_block(block_items, inverse_norms, scaled_ratings)
+            
+            for offset, item in enumerate(block_items.tolist()):
+                begin, end = block.indptr[offset], block.indptr[offset + 1]
+                all_neighbours = dict(zip(block.indices[begin:end].tolist(), block.data[begin:end].tolist()))
+                all_neighbours.pop(item, None)
+                
+                neighbours, sims = self._top_neighbours(block, offset, item)
+                patched[item] = dict(zip(neighbours.tolist(), sims.tolist()))
+                
+                # Similarity is symmetric: refresh this item's entry in other lists
+                previous, _ = self._neighbour_row(item, self.item_similarity, self.patched_neighbours)
+                for other in set(all_neighbours) | set(previous.tolist()):
+                    if other in changed:
+                        continue
+                    sim = all_neighbours.get(other, 0)
+                    if other not in patched:
+                        other_neighbours, other_sims = self._neighbour_row(
+                            other, self.item_similarity, self.patched_neighbours
+                        )
+                        if not self._patches_neighbours(other_neighbours, other_sims, item, sim):
+                            continue
+                        patched[other] = dict(zip(other_neighbours.tolist(), other_sims.tolist()))
+                    self._patch_neighbour(patched[other], item, sim)
+        
+        patched_neighbours = dict(self.patched_neighbours)
+        for item, neighbours in patched.items():
+            patched_neighbours[item] = (
+                np.fromiter(neighbours.keys(), dtype=np.int64, count=len(neighbours)),
+                np.fromiter(neighbours.values(), dtype=np.float32, count=len(neighbours))
+            )
+        self.patched_neighbours = patched_neighbours
+        self._publish()
+    
+    def _similarity_block(self, items, inverse_norms, scaled_ratings=None):
+        """
+        Cosine similarity of some items to every item
+        
+        Args:
+            items: Item columns
+            inverse_norms: 1 / norm of every item column (0 for unrated items)
+            scaled_ratings: Merged users x items matrix already scaled by
+                inverse_norms; by default only the rows of the users who
+                rated one of the items are merged
+        
+        Returns:
+            len(items) x num_items CSR matrix
+        """
+        if scaled_ratings is None:
+            scaled_ratings = self._merged_rows(self._item_raters(items)) @ sparse.diags(inverse_norms)
+        block = (scaled_ratings[:, items].T @ scaled_ratings).tocsr()
+        block.eliminate_zeros()
+        return block
     
-    def _calculate_product_score(self, product_id, user_history):
-        """Calculate recommendation score for a product"""
-        # Simple scoring: higher if user liked similar products
-        score = 0
+    def _item_raters(self, items):
+        """Sorted rows of the users who rated any of some items, in the base matrix or since"""
+        parts = []
+        if self.item_user_matrix is not None:
+            parts.append(self.item_user_matrix[items[items < self.item_user_matrix.shape[0]]].indices)
+        for item in items.tolist():
+            raters = self._item_deltas.get(item)
+            if raters:
+                parts.append(np.fromiter(raters, dtype=np.int64, count=len(raters)))
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+    
+    def _merged_rows(self, users):
+        """Sorted users' rows of the base matrix with their pending deltas applied"""
+        shape = (len(users), len(self.item_ids))
+        base = self.user_item_matrix
+        if base is None:
+            rows = sparse.csr_matrix(shape, dtype=np.float32)
+        else:
+            # Users are sorted, so the ones in the base matrix come first
+            rows = base[users[users < base.shape[0]]]
+            indptr = np.concatenate([rows.indptr, np.full(len(users) - rows.shape[0], rows.indptr[-1])])
+            rows = sparse.csr_matrix((rows.data, rows.indices, indptr), shape=shape)
+        
+        positions, columns, ratings = [], [], []
+        for position, user in enumerate(users.tolist()):
+            deltas = self._user_deltas.get(user)
+            if deltas:
+                positions.extend([position] * len(deltas))
+                columns.extend(deltas)
+                ratings.extend(deltas.values())
+        if not positions:
+            return rows
+        return self._override(rows, positions, columns, np.array(ratings, dtype=np.float32))
+    
+    def _patch_neighbour(self, neighbours, item, sim):
+        """Update one entry of a top-N neighbour dict in place"""
+        if sim <= 0:
+            neighbours.pop(item, None)
+        elif item in neighbours or len(neighbours) < self.NUM_NEIGHBOURS:
+            neighbours[item] = sim
+        else:
+            weakest = min(neighbours, key=neighbours.get)
+            if sim > neighbours[weakest]:
+                del neighbours[weakest]
+                neighbours[item] = sim
+    
+    @classmethod
+    def _patches_neighbours(cls, neighbours, sims, item, sim):
+        """False if _patch_neighbour() would leave a neighbour list unchanged"""
+        if item in neighbours:
+            return True
+        return sim > 0 and (len(neighbours) < cls.NUM_NEIGHBOURS or sim > sims.min())
+    
+    @classmethod
+    def _top_neighbours(cls, block, offset, item):
+        """Top-N neighbours (excluding the item itself) from one row of a similarity block"""
+        begin, end = block.indptr[offset], block.indptr[offset + 1]
+        neighbours = block.indices[begin:end]
+        sims = block.data[begin:end]
+        
+        # An item is not its own neighbour
+        not_self = neighbours != item
+        neighbours, sims = neighbours[not_self], sims[not_self]
+        if len(sims) > cls.NUM_NEIGHBOURS:
+            keep = np.argpartition(-sims, cls.NUM_NEIGHBOURS - 1)[:cls.NUM_NEIGHBOURS]
+            neighbours, sims = neighbours[keep], sims[keep]
+        return neighbours, sims
+    
+    @staticmethod
+    def _normalized_item_user(interactions):
+        """Items x users matrix with every item row scaled to unit length"""
+        norms = np.sqrt(np.asarray(interactions.multiply(interactions).sum(axis=0)).ravel())
+        inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms != 0)
+        return (interactions @ sparse.diags(inverse_norms)).T.tocsr()
+    
+    @staticmethod
+    def _csr_from_parts(rows, cols, values, shape):
+        if not rows:
+            return sparse.csr_matrix(shape, dtype=np.float32)
+        
+        return sparse.csr_matrix(
+            (np.concatenate(values).astype(np.float32), (np.concatenate(rows), np.concatenate(cols))),
+            shape=shape
+        )
+    
+    def _current_matrix(self):
+        """Base matrix with pending deltas applied (latest rating wins)"""
+        shape = (len(self.user_ids), len(self.item_ids))
+        if self.user_item_matrix is None:
+            base = sparse.csr_matrix(shape, dtype=np.float32)
+        else:
+            base = self._resize_csr(self.user_item_matrix, shape)
+        
+        if not self.deltas:
+            return base
+        
+        positions = np.array(list(self.deltas.keys()), dtype=np.int64)
+        ratings = np.fromiter(self.deltas.values(), dtype=np.float32, count=len(self.deltas))
+        return self._override(base, positions[:, 0], positions[:, 1], ratings)
+    
+    @staticmethod
+    def _override(matrix, rows, cols, ratings):
+        """CSR matrix with some entries replaced by new ratings"""
+        coords = (rows, cols)
+        overridden = sparse.csr_matrix((np.ones(len(ratings), dtype=np.float32), coords), shape=matrix.shape)
+        delta = sparse.csr_matrix((ratings, coords), shape=matrix.shape)
+        
+        merged = (matrix - matrix.multiply(overridden) + delta).tocsr()
+        merged.eliminate_zeros()
+        merged.sort_indices()
+        return merged.astype(np.float32)
+    
+    def _materialized_similarity(self):
+        """Base similarity matrix with the patched neighbour lists written in"""
+        num_items = len(self.item_ids)
+        similarity = self._resize_csr(self.item_similarity, (num_items, num_items))
+        if not self.patched_neighbours:
+            return similarity
+        
+        # Copy untouched rows and append the patched ones
+        coo = similarity.tocoo()
+        keep = ~np.isin(coo.row, np.fromiter(self.patched_neighbours, dtype=np.int64))
+        rows, cols, values = [coo.row[keep]], [coo.col[keep]], [coo.data[keep]]
+        for item, (neighbours, sims) in self.patched_neighbours.items():
+            rows.append(np.full(len(neighbours), item))
+            cols.append(neighbours)
+            values.append(sims)
+        return self._csr_from_parts(rows, cols, values, (num_items, num_items))
+    
+    @staticmethod
+    def _resize_csr(matrix, shape):
+        """Grow a CSR matrix with empty rows/columns (no data is copied)"""
+        if matrix is None:
+            return sparse.csr_matrix(shape, dtype=np.float32)
+        if matrix.shape == shape:
+            return matrix
+        
+        extra_rows = shape[0] - matrix.shape[0]
+        indptr = np.concatenate([matrix.indptr, np.full(extra_rows, matrix.indptr[-1])])
+        return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape, copy=False)
+    
+    @staticmethod
+    def _interaction_time(interaction):
+        """Timestamp of an interaction, if the caller sent one"""
+        return interaction.get('timestamp', interaction.get('createdAt'))
+    
+    @staticmethod
+    def _intern(key, keys, index):
+        """Integer ID for a user/product, appending unseen ones"""
+        idx = index.get(key)
+        if idx is None:
+            idx = len(keys)
+            keys.append(key)
+            index[key] = idx
+        return idx
+    
+    @staticmethod
+    def _run(pool, fn, *args):
+        """Run fn in the worker pool when one is given, inline otherwise"""
+        return pool.run(fn, *args) if pool is not None else fn(*args)
+    
+    def _publish(self):
+        """Make the current item index and neighbour lists visible to readers"""
+        self._serving = (self.item_index, len(self.item_ids), self.item_similarity, self.patched_neighbours)
+    
+    def _set_base(self, user_item_matrix, item_similarity, item_user_matrix=None):
+        """
+        Make matrices the new base, dropping pending deltas and patched lists (lock held)
+        
+        Args:
+            user_item_matrix: Users x items CSR ratings (sorted indices)
+            item_similarity: Items x items CSR neighbour lists
+            item_user_matrix: Transpose of user_item_matrix, if already at hand
+        """
+        if item_user_matrix is None:
+            item_user_matrix = user_item_matrix.T.tocsr()
+        self.user_item_matrix = user_item_matrix
+        self.item_user_matrix = item_user_matrix
+        self.item_similarity = item_similarity
+        self.item_norms = np.bincount(
+            user_item_matrix.indices,
+            weights=np.square(user_item_matrix.data, dtype=np.float64),
+            minlength=user_item_matrix.shape[1]
+        )
+        self.deltas = {}
+        self._user_deltas = {}
+        self._item_deltas = {}
+        self.patched_neighbours = {}
+        self._publish()
+    
+    def _apply_deltas(self, users, items, ratings):
+        """
+        Record ratings as pending deltas and update the item norms (lock held)
+        
+        Args:
+            users: User IDs
+            items: Product IDs
+            ratings: Ratings, parallel to users and items
+        
+        Returns:
+            Sorted array of the touched item columns
+        """
+        touched_items = set()
+        for user_id, item_id, rating in zip(users, items, ratings):
+            user = self._intern(user_id, self.user_ids, self.user_index)
+            item = self._intern(item_id, self.item_ids, self.item_index)
+            previous = self.deltas.get((user, item))
+            if previous is None:
+                previous = self._base_rating(user, item)
+            if item >= len(self.item_norms):
+                self.item_norms = np.concatenate([self.item_norms, np.zeros(max(len(self.item_norms), 1024))])
+            # Norms follow the float32 ratings the matrices hold
+            self.item_norms[item] += float(np.float32(rating)) ** 2 - float(np.float32(previous)) ** 2
+            
+            self.deltas[(user, item)] = rating
+            self._user_deltas.setdefault(user, {})[item] = rating
+            self._item_deltas.setdefault(item, {})[user] = rating
+            touched_items.add(item)
+        return np.array(sorted(touched_items), dtype=np.int64)
+    
+    def _base_rating(self, user, item):
+        """Rating of a user/product pair in the base matrix (0 if unrated)"""
+        base = self.user_item_matrix
+        if base is None or user >= base.shape[0] or item >= base.shape[1]:
+            return 0.0
+        start, stop = base.indptr[user], base.indptr[user + 1]
+        position = start + np.searchsorted(base.indices[start:stop], item)
+        if position < stop and base.indices[position] == item:
+            return float(base.data[position])
+        return 0.0
+    
+    @contextmanager
+    def _artifact_lock(self):
+        """
+        Exclusive lock over model and delta writes, shared by every process
+
+        Reentrant within this process; taken with _write_lock held.
+        """
+        if self._artifact_lock_held:
+            yield
+            return
+        
+        os.makedirs(self.artifacts.root, exist_ok=True)
+        with open(os.path.join(self.artifacts.root, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._artifact_lock_held = True
+            try:
+                yield
+            finally:
+                self._artifact_lock_held = False
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _catch_up(self):
+        """
+        Load the model version or apply the deltas other processes saved since this one did
+        
+        Returns:
+            True if anything changed
+        """
+        self.artifacts.mark_seen()
+        manifest = self.artifacts.manifest()
+        version = manifest['version'] if manifest is not None else None
+        if version != self.version:
+            self.load_model()
+        elif version is None or not self._replay_log():
+            return False
+        self.popularity.load_model()
+        return True
+    
+    def _log_deltas(self, users, items, ratings):
+        """Append ingested ratings to the delta log of the current version (locks held)"""
+        if self.version is None:
+            # The log belongs to a version: publish one, which logs every pending delta
+            self.save_model()
+            return
+        
+        records = [(users, items, ratings)]
+        if self._legacy_deltas:
+            # Move the deltas replayed from an older release's deltas.npz into the log
+            records = [self._delta_record()]
+            self._legacy_deltas = False
+            self.artifacts.remove_side_file('deltas.npz')
+        self._log_end = self.artifacts.append_log(self.version, records, self._log_end)
+        self.delta_version = str(self._log_end)
+        self.artifacts.mark_seen()
+    
+    def _delta_record(self):
+        """Delta log record holding every pending delta"""
+        positions = list(self.deltas)
+        return (
+            [self.user_ids[user] for user, _ in positions],
+            [self.item_ids[item] for _, item in positions],
+            list(self.deltas.values())
+        )
+    
+    @staticmethod
+    def _neighbour_row(item, item_similarity, patched_neighbours):
+        """(neighbours, similarities) of an item: its patched list, else its base matrix row"""
+        patched = patched_neighbours.get(item)
+        if patched is not None:
+            return patched
+        if item_similarity is None or item >= item_similarity.shape[0]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        start, stop = item_similarity.indptr[item], item_similarity.indptr[item + 1]
+        return item_similarity.indices[start:stop], item_similarity.data[start:stop]
+    
+    def _score_items(self, user_history, item_index, num_items, item_similarity, patched_neighbours):
+        """
+        Score every trained item for a user from the neighbour lists of the rated items
+        
+        Returns:
+            Dense array of item scores, or None if nothing in the history is known
+        """
+        if item_similarity is None and not patched_neighbours:
+            return None
+        
+        # The index may already hold items ingested after these lists were published
+        weights = {}
         for item in user_history:
-            rating = item.get('rating', 0)
-            if rating >= 4:  # User liked this product
-                score += rating * 0.2  # Boost score
+            row = item_index.get(item.get('productId'))
+            if row is not None and row < num_items:
+                weights[row] = weights.get(row, 0) + item.get('rating', 3) - 3
+        
+        if not weights:
+            return None
+        
+        neighbours, values = [], []
+        for row in sorted(weights):
+            row_neighbours, sims = self._neighbour_row(row, item_similarity, patched_neighbours)
+            neighbours.append(row_neighbours)
+            values.append(sims.astype(np.float64) * weights[row])
+        return np.bincount(np.concatenate(neighbours), weights=np.concatenate(values), minlength=num_items)
+    
+    def _get_popular_products(self, product_ids, limit, category=None):
+        """
+        Get popular products for cold start
+        
+        Without a candidate list the answer comes straight from the
+        popularity index; with one, the candidates are ranked by popularity.
+        """
+        if product_ids:
+            return self.popularity.rank(product_ids, limit)
         
-        # Add randomness for diversity
-        score += np.random.random() * 0.5
-        return score
+        return self.popularity.top(limit, category=category, category_of=self.catalog.category_of)
     
     def _create_feature_vector(self, product):
         """Create feature vector from product attributes"""
-        vector = []
+        return self._feature_matrix([product])[0]
+    
+    def _feature_matrix(self, products):
+        """
+        Raw feature values per product: category, price, tags, stock
         
-        # Category encoding (simple hash)
-        category = product.get('category', 'Unknown')
-        vector.append(hash(category) % 100)
+        Args:
+            products: ProductBatch or list of product dicts
+        
+        Returns:
+            (n, NUM_CONTENT_FEATURES) array
+        """
+        batch = ProductBatch.of(products)
+        matrix = np.empty((len(batch), self.NUM_CONTENT_FEATURES))
         
-        # Price normalization
-        price = product.get('basePrice', product.get('price', 0))
-        vector.append(price / 10000)  # Normalize
+        # Category encoding (stable hash, so persisted rows stay comparable)
+        matrix[:, 0] = batch.map_categories(self._category_code, 'Unknown')
+        
+        # Price normalization (basePrice, else price)
+        base_price = batch.column('basePrice')
+        matrix[:, 1] = np.where(np.isnan(base_price), batch.column('price', 0), base_price) / 10000
         
         # Tags count
-        tags = product.get('tags', [])
-        vector.append(len(tags))
+        matrix[:, 2] = batch.tag_counts
         
         # Stock level
-        stock = product.get('stock', 0)
-        vector.append(stock / 100)  # Normalize
+        matrix[:, 3] = batch.column('stock', 0) / 100
         
-        return np.array(vector)
+        return matrix
+    
+    @staticmethod
+    def _category_code(category):
+        """Deterministic 0-99 bucket for a category name"""
+        return zlib.crc32(str(category).encode('utf-8')) % 100
     
     def _cosine_similarity(self, vec1, vec2):
         """Calculate cosine similarity between two vectors"""
@@ -203,3 +1097,20 @@ class RecommenderModel:
             return 0
         
         return dot_product / (norm1 * norm2)
+    
+    def _cosine_similarities(self, vector, matrix):
+        """Cosine similarity between a vector and every row of a matrix"""
+        target_norm = np.linalg.norm(vector)
+        row_norms = np.linalg.norm(matrix, axis=1)
+        
+        similarities = np.zeros(len(matrix))
+        if target_norm == 0:
+            return similarities
+        
+        valid = row_norms != 0
+        similarities[valid] = (matrix[valid] @ vector) / (row_norms[valid] * target_norm)
+        return similarities
+
+def compute_item_similarity(interactions):
+    """Top-N item neighbour matrix; module-level so worker processes can run it"""
+    return RecommenderModel._compute_item_similarity(interactions)
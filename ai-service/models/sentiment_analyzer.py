@@ -1,22 +1,89 @@
 import numpy as np
 from collections import Counter
+from fractions import Fraction
 import re
 
+from models.theme_matcher import ThemeMatcher
+from utils.metrics import stage
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# Words whose frequency feeds the insights
+INSIGHT_KEYWORDS = ('quality', 'price', 'worth')
+
+class SentimentAggregate:
+    """
+    Running totals over one product's reviews
+    
+    Holds everything analyze_reviews needs (sentiment counts, score and
+    rating sums, keyword and theme counts), so reviews can be folded in or
+    retracted one at a time and the full response rebuilt in O(1). Stored
+    aggregates keep their sums as exact fractions so retracting a review
+    restores the previous state exactly instead of accumulating float
+    drift; one-off aggregates (exact=False) use floats, which are much
+    cheaper per review.
+    """
+    
+    # Aggregates pickled before the flag existed were exact
+    exact = True
+    
+    def __init__(self, exact=True):
+        self.exact = exact
+        self.total = 0
+        self.score_sum = Fraction(0) if exact else 0.0
+        self.rating_sum = Fraction(0) if exact else 0.0
+        self.sentiment_counts = Counter()
+        self.keyword_counts = Counter()
+        self.positive_theme_counts = Counter()
+        self.negative_theme_counts = Counter()
+    
+    def add(self, analysis, sign=1):
+        """
+        Fold one review analysis in (sign=1) or retract it (sign=-1)
+        
+        Args:
+            analysis: Result of SentimentAnalyzer.analyze_review
+        """
+        number = Fraction if self.exact else float
+        self.total += sign
+        self.score_sum += sign * number(analysis['score'])
+        self.rating_sum += sign * number(analysis['rating'])
+        self.sentiment_counts[analysis['sentiment']] += sign
+        for keyword, count in analysis['keywords'].items():
+            self.keyword_counts[keyword] += sign * count
+        
+        themes = self.positive_theme_counts if analysis['rating'] >= 4 else self.negative_theme_counts
+        for theme in analysis['themes']:
+            themes[theme] += sign
+    
+    def merge(self, other):
+        """Add another aggregate's totals to this one"""
+        self.total += other.total
+        self.score_sum += other.score_sum
+        self.rating_sum += other.rating_sum
+        self.sentiment_counts.update(other.sentiment_counts)
+        self.keyword_counts.update(other.keyword_counts)
+        self.positive_theme_counts.update(other.positive_theme_counts)
+        self.negative_theme_counts.update(other.negative_theme_counts)
+
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, theme_matcher=None):
         # Simple keyword-based sentiment analysis
         # In production, use BERT or other transformer models
-        self.positive_words = set([
+        self.positive_words = frozenset([
             'love', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
             'perfect', 'best', 'good', 'nice', 'awesome', 'recommend', 'happy',
             'satisfied', 'quality', 'worth', 'impressed', 'pleased'
         ])
         
-        self.negative_words = set([
+        self.negative_words = frozenset([
             'bad', 'terrible', 'awful', 'poor', 'worst', 'hate', 'disappointed',
             'waste', 'broken', 'defective', 'useless', 'horrible', 'unhappy',
             'issue', 'problem', 'returned', 'refund'
         ])
+        
+        # Theme dictionary compiled into one matcher ($THEME_DICTIONARY_FILE)
+        self.theme_matcher = theme_matcher or ThemeMatcher.from_config()
     
     def analyze_reviews(self, reviews):
         """
@@ -29,6 +96,68 @@ class SentimentAnalyzer:
             Sentiment analysis results with scores and insights
         """
         if not reviews or len(reviews) == 0:
+            return self.summarize(SentimentAggregate(exact=False))
+        
+        # Single pass: each review is lowercased and tokenized once, and
+        # keyword and theme counts are accumulated as we go. Nothing is
+        # retracted here, so float sums are enough.
+        aggregate = SentimentAggregate(exact=False)
+        sentiment_scores = []
+        ratings = []
+        
+        with stage('score'):
+            for review in reviews:
+                analysis = self.analyze_review(review)
+                aggregate.add(analysis)
+                sentiment_scores.append(analysis['score'])
+                ratings.append(analysis['rating'])
+        
+        return self.summarize(
+            aggregate,
+            avg_score=np.mean(sentiment_scores),
+            avg_rating=np.mean(ratings)
+        )
+    
+    def analyze_review(self, review):
+        """
+        Analyze a single review
+        
+        Args:
+            review: {text, rating}
+        
+        Returns:
+            Dictionary with sentiment, score, rating, insight keyword counts
+            and themes (themes only for ratings >= 4 or <= 2)
+        """
+        text = review.get('text', '').lower()
+        rating = review.get('rating', 3)
+        words = TOKEN_PATTERN.findall(text)
+        
+        # Analyze text sentiment
+        sentiment, score = self._score_words(words, rating)
+        
+        # Themes from clearly positive or negative reviews
+        themes = self._extract_themes(text) if rating >= 4 or rating <= 2 else []
+        
+        return {
+            'sentiment': sentiment,
+            'score': score,
+            'rating': rating,
+            'keywords': {keyword: words.count(keyword) for keyword in INSIGHT_KEYWORDS},
+            'themes': themes
+        }
+    
+    def summarize(self, aggregate, avg_score=None, avg_rating=None):
+        """
+        Build the analyze_reviews response from aggregated totals
+        
+        Args:
+            aggregate: SentimentAggregate
+            avg_score: Mean sentiment score (default: score_sum / total)
+            avg_rating: Mean rating (default: rating_sum / total)
+        """
+        total = aggregate.total
+        if total <= 0:
             return {
                 'overall_sentiment': 'neutral',
                 'sentiment_score': 0,
@@ -39,33 +168,18 @@ class SentimentAnalyzer:
                 'insights': []
             }
         
-        sentiments = []
-        sentiment_scores = []
-        all_words = []
-        
-        for review in reviews:
-            text = review.get('text', '').lower()
-            rating = review.get('rating', 3)
-            
-            # Analyze text sentiment
-            sentiment, score = self._analyze_text(text, rating)
-            sentiments.append(sentiment)
-            sentiment_scores.append(score)
-            
-            # Extract words for keyword analysis
-            words = re.findall(r'\b\w+\b', text)
-            all_words.extend(words)
+        sentiment_counts = aggregate.sentiment_counts
         
         # Calculate statistics
-        sentiment_counts = Counter(sentiments)
-        total = len(sentiments)
-        
         positive_pct = (sentiment_counts.get('positive', 0) / total) * 100
         negative_pct = (sentiment_counts.get('negative', 0) / total) * 100
         neutral_pct = (sentiment_counts.get('neutral', 0) / total) * 100
         
         # Overall sentiment
-        avg_score = np.mean(sentiment_scores)
+        if avg_score is None:
+            avg_score = float(aggregate.score_sum / total)
+        if avg_rating is None:
+            avg_rating = float(aggregate.rating_sum / total)
         if avg_score > 0.2:
             overall = 'positive'
         elif avg_score < -0.2:
@@ -75,15 +189,15 @@ class SentimentAnalyzer:
         
         # Extract insights
         insights = self._generate_insights(
-            all_words,
+            aggregate.keyword_counts,
             positive_pct,
             negative_pct,
             avg_score
         )
         
         # Find common positive and negative themes
-        positive_themes = self._extract_themes(reviews, 'positive')
-        negative_themes = self._extract_themes(reviews, 'negative')
+        positive_themes = self._top_themes(aggregate.positive_theme_counts)
+        negative_themes = self._top_themes(aggregate.negative_theme_counts)
         
         return {
             'overall_sentiment': overall,
@@ -92,7 +206,7 @@ class SentimentAnalyzer:
             'negative_percentage': round(negative_pct, 1),
             'neutral_percentage': round(neutral_pct, 1),
             'total_reviews': total,
-            'average_rating': round(np.mean([r.get('rating', 3) for r in reviews]), 2),
+            'average_rating': round(avg_rating, 2),
             'insights': insights,
             'positive_themes': positive_themes[:3],
             'negative_themes': negative_themes[:3]
@@ -100,7 +214,11 @@ class SentimentAnalyzer:
     
     def _analyze_text(self, text, rating):
         """Analyze sentiment of a single text"""
-        words = set(re.findall(r'\b\w+\b', text.lower()))
+        return self._score_words(TOKEN_PATTERN.findall(text.lower()), rating)
+    
+    def _score_words(self, words, rating):
+        """Sentiment of an already tokenized (lowercase) text"""
+        words = set(words)
         
         # Count positive and negative words
         pos_count = len(words & self.positive_words)
@@ -123,10 +241,9 @@ class SentimentAnalyzer:
         
         return sentiment, score
     
-    def _generate_insights(self, words, pos_pct, neg_pct, avg_score):
-        """Generate insights from review analysis"""
+    def _generate_insights(self, word_freq, pos_pct, neg_pct, avg_score):
+        """Generate insights from review analysis (word_freq: Counter of words)"""
         insights = []
-        word_freq = Counter(words)
         
         # Overall sentiment insight
         if avg_score > 0.5:
@@ -141,13 +258,13 @@ class SentimentAnalyzer:
             })
         
         # Specific aspect insights
-        if 'quality' in word_freq and word_freq['quality'] > 2:
+        if word_freq['quality'] > 2:
             insights.append({
                 'type': 'info',
                 'message': 'Quality is frequently mentioned in reviews'
             })
         
-        if 'price' in word_freq or 'worth' in word_freq:
+        if word_freq['price'] > 0 or word_freq['worth'] > 0:
             insights.append({
                 'type': 'info',
                 'message': 'Price/value is a common discussion point'
@@ -167,37 +284,12 @@ class SentimentAnalyzer:
         
         return insights
     
-    def _extract_themes(self, reviews, sentiment_type):
-        """Extract common themes from positive or negative reviews"""
-        themes = []
-        
-        for review in reviews:
-            text = review.get('text', '').lower()
-            rating = review.get('rating', 3)
-            
-            # Filter by sentiment
-            is_positive = rating >= 4
-            is_negative = rating <= 2
-            
-            if sentiment_type == 'positive' and not is_positive:
-                continue
-            if sentiment_type == 'negative' and not is_negative:
-                continue
-            
-            # Extract key phrases (simplified)
-            if 'quality' in text:
-                themes.append('quality')
-            if 'price' in text or 'value' in text:
-                themes.append('value')
-            if 'delivery' in text or 'shipping' in text:
-                themes.append('delivery')
-            if 'customer service' in text or 'support' in text:
-                themes.append('customer_service')
-            if 'easy' in text or 'simple' in text:
-                themes.append('ease_of_use')
-            if 'durable' in text or 'sturdy' in text:
-                themes.append('durability')
-        
-        # Return most common themes
-        theme_counts = Counter(themes)
-        return [theme for theme, count in theme_counts.most_common(5)]
+    def _extract_themes(self, text):
+        """Themes mentioned in a lowercase review text, in dictionary order"""
+        return self.theme_matcher.match(text)
+    
+    @staticmethod
+    def _top_themes(theme_counts):
+        """Up to five most common themes with a positive count"""
+        present = Counter({theme: count for theme, count in theme_counts.items() if count > 0})
+        return [theme for theme, count in present.most_common(5)]
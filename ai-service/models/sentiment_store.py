@@ -0,0 +1,248 @@
+import fcntl
+import hashlib
+import joblib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from models.sentiment_analyzer import SentimentAggregate
+from utils.artifact_store import ArtifactStore
+
+class SentimentStore:
+    """
+    Per-product running sentiment aggregates
+
+    New reviews are analyzed once and folded into their product's
+    aggregate; deleted reviews are analyzed again and retracted. A summary
+    is then built from the stored totals without touching the other
+    reviews.
+
+    Each product's aggregate is its own file in the current version of an
+    ArtifactStore (trained_models/sentiment/), replaced atomically (write,
+    then rename), so an update rewrites one product instead of the whole
+    store. Updates from every server process are serialized by an
+    exclusive file lock and re-read the product's file under it, so
+    workers fold into the same totals instead of overwriting each other.
+    Reads cache aggregates per process and reload a product whose file
+    changed. replace_all publishes a complete new version, which other
+    processes pick up from the manifest.
+    """
+
+    LOCK_FILE = '.lock'
+    # Single-file store written before aggregates were kept per product
+    LEGACY_FILE = 'sentiment_aggregates.pkl'
+
+    def __init__(self, analyzer, model_path='trained_models'):
+        """
+        Args:
+            analyzer: SentimentAnalyzer used for single reviews and summaries
+            model_path: Directory used to persist the aggregates
+        """
+        self.analyzer = analyzer
+        self.model_path = model_path
+        self.artifacts = ArtifactStore(os.path.join(model_path, 'sentiment'))
+        self.version = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.artifacts.root, exist_ok=True)
+        self.load_model()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            if self.version is None:
+                return 0
+            return sum(
+                1 for name in os.listdir(self.artifacts.version_path(self.version))
+                if name.endswith('.pkl') and not name.startswith('.')
+            )
+
+    def add_reviews(self, product_id, reviews, replace=False):
+        """
+        Fold reviews into a product's aggregate
+
+        Args:
+            product_id: Product the reviews belong to
+            reviews: List of review dicts {text, rating}
+            replace: Start from an empty aggregate (full recompute)
+
+        Returns:
+            Updated summary for the product
+        """
+        analyses = [self.analyzer.analyze_review(review) for review in reviews]
+
+        with self._exclusive() as version:
+            aggregate = None if replace else self._read(version, product_id)
+            if aggregate is None:
+                aggregate = SentimentAggregate()
+            for analysis in analyses:
+                aggregate.add(analysis)
+            self._write(version, product_id, aggregate)
+
+        return self.analyzer.summarize(aggregate)
+
+    def remove_reviews(self, product_id, reviews):
+        """
+        Retract deleted reviews from a product's aggregate
+
+        The reviews must be passed exactly as they were added, since their
+        contribution is recomputed from the text and rating.
+
+        Returns:
+            Updated summary for the product
+        """
+        analyses = [self.analyzer.analyze_review(review) for review in reviews]
+
+        with self._exclusive() as version:
+            aggregate = self._read(version, product_id)
+            if aggregate is None:
+                return self.analyzer.summarize(SentimentAggregate())
+
+            for analysis in analyses:
+                aggregate.add(analysis, sign=-1)
+            if aggregate.total <= 0:
+                self._delete(version, product_id)
+                aggregate = SentimentAggregate()
+            else:
+                self._write(version, product_id, aggregate)
+
+        return self.analyzer.summarize(aggregate)
+
+    def replace_all(self, aggregates):
+        """
+        Publish a complete set of aggregates as a new version (bulk re-analysis)
+
+        Server processes switch to it on their next read or update.
+
+        Args:
+            aggregates: Dict of product ID -> SentimentAggregate
+        """
+        with self._file_lock():
+            manifest = self._publish(aggregates, {'products': len(aggregates)})
+        with self._lock:
+            self._use_version(manifest['version'])
+
+    def summary(self, product_id):
+        """analyze_reviews response for a product, built from its aggregate"""
+        with self._lock:
+            self._refresh()
+            aggregate = self._cached(product_id)
+        return self.analyzer.summarize(aggregate or SentimentAggregate())
+
+    def save_model(self):
+        """Nothing to do: every change is written when it is made"""
+
+    def load_model(self):
+        """Load the published version, converting a legacy single-file store once"""
+        legacy_file = os.path.join(self.model_path, self.LEGACY_FILE)
+        if self._published_version() is None and os.path.exists(legacy_file):
+            with self._file_lock():
+                if self._published_version() is None:
+                    legacy = joblib.load(legacy_file)
+                    self._publish(legacy, {'products': len(legacy), 'migratedFrom': self.LEGACY_FILE})
+
+        with self._lock:
+            self._use_version(self._published_version())
+
+    def _publish(self, aggregates, meta):
+        """Write one file per non-empty aggregate into a new version"""
+        def write(directory):
+            for product_id, aggregate in aggregates.items():
+                if aggregate.total > 0:
+                    joblib.dump(
+                        {'productId': product_id, 'aggregate': aggregate},
+                        self._product_file(directory, product_id)
+                    )
+
+        return self.artifacts.publish(write, meta=meta)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process using this store"""
+        with open(os.path.join(self.artifacts.root, self.LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _exclusive(self):
+        """Lock for a read-modify-write; yields the current version (created if none)"""
+        with self._lock, self._file_lock():
+            version = self._published_version()
+            if version is None:
+                version = self.artifacts.publish(lambda directory: None)['version']
+            if version != self.version:
+                self._use_version(version)
+            yield version
+
+    def _published_version(self):
+        manifest = self.artifacts.manifest()
+        return manifest['version'] if manifest else None
+
+    def _refresh(self):
+        """Switch to a version published by another process (throttled check)"""
+        if self.artifacts.changed():
+            self._use_version(self._published_version())
+
+    def _use_version(self, version):
+        self.version = version
+        self._cache.clear()
+        self.artifacts.mark_seen()
+
+    @staticmethod
+    def _product_file(directory, product_id):
+        # Product IDs are hashed: they may contain characters unsafe in file names
+        digest = hashlib.sha1(str(product_id).encode('utf-8')).hexdigest()
+        return os.path.join(directory, f'{digest}.pkl')
+
+    def _path(self, version, product_id):
+        return self._product_file(self.artifacts.version_path(version), product_id)
+
+    def _read(self, version, product_id):
+        """A product's aggregate straight from disk, or None"""
+        try:
+            return joblib.load(self._path(version, product_id))['aggregate']
+        except FileNotFoundError:
+            return None
+
+    def _write(self, version, product_id, aggregate):
+        path = self._path(version, product_id)
+        tmp_path = f'{path}.{os.getpid()}.{time.time_ns()}.tmp'
+        joblib.dump({'productId': product_id, 'aggregate': aggregate}, tmp_path)
+        os.replace(tmp_path, path)
+        self._cache.pop(product_id, None)
+
+    def _delete(self, version, product_id):
+        try:
+            os.remove(self._path(version, product_id))
+        except FileNotFoundError:
+            pass
+        self._cache.pop(product_id, None)
+
+    def _cached(self, product_id):
+        """A product's aggregate, reloaded when its file changed since it was cached"""
+        if self.version is None:
+            return None
+
+        path = self._path(self.version, product_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(product_id, None)
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        cached = self._cache.get(product_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            aggregate = joblib.load(path)['aggregate']
+        except FileNotFoundError:
+            return None
+        self._cache[product_id] = (signature, aggregate)
+        return aggregate
@@ -0,0 +1,86 @@
+"""
+Recall-vs-brute-force report for the catalog nearest-neighbour index
+
+Builds the IVF index over either the persisted catalog store or a seeded
+synthetic catalog and prints recall@k and query latency for each
+nlist/nprobe combination, so index settings can be picked with numbers.
+
+Usage:
+    python scripts/ann_recall_report.py --synthetic 200000 --nlist 64 256 1024
+    python scripts/ann_recall_report.py --json
+
+Run from the ai-service directory so the stored catalog in trained_models/
+is picked up.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.ann_index import IVFIndex
+from models.recommender import RecommenderModel
+
+def synthetic_catalog(size, seed):
+    """Seeded catalog with a realistic spread of categories, prices and tags"""
+    rng = np.random.default_rng(seed)
+    categories = [f'category-{i}' for i in range(40)]
+    category_idx = rng.integers(0, len(categories), size)
+    prices = np.round(rng.lognormal(4.5, 1.0, size), 2)
+    tag_counts = rng.integers(0, 8, size)
+    stock = rng.integers(0, 500, size)
+
+    return [
+        {
+            '_id': f'p{i}',
+            'category': categories[category_idx[i]],
+            'basePrice': float(prices[i]),
+            'tags': ['tag'] * int(tag_counts[i]),
+            'stock': int(stock[i])
+        }
+        for i in range(size)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Use a synthetic catalog of this size instead of the stored one')
+    parser.add_argument('--nlist', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    catalog = RecommenderModel().catalog
+    if args.synthetic:
+        catalog.upsert(synthetic_catalog(args.synthetic, args.seed), replace=True)
+
+    vectors = catalog.normalized[:catalog.size]
+    if len(vectors) < 2:
+        sys.exit('Catalog is empty; load products or pass --synthetic N')
+
+    results = []
+    for nlist in args.nlist:
+        index = IVFIndex(nlist=nlist, seed=args.seed)
+        build = index.build(vectors)
+        for row in index.recall_report(vectors, k=args.k, nprobe_values=args.nprobe,
+                                       num_queries=args.queries):
+            results.append({'nlist': build['nlist'], 'build_seconds': build['build_seconds'], **row})
+
+    if args.json:
+        print(json.dumps({'catalog_size': len(vectors), 'k': args.k, 'results': results}, indent=2))
+        return
+
+    print(f'catalog size: {len(vectors)}  k: {args.k}  queries: {args.queries}')
+    print(f"{'nlist':>6} {'nprobe':>6} {'recall':>7} {'index ms':>9} {'brute ms':>9} {'speedup':>8}")
+    for row in results:
+        print(f"{row['nlist']:>6} {row['nprobe']:>6} {row['recall']:>7.4f} "
+              f"{row['index_ms']:>9.3f} {row['brute_force_ms']:>9.3f} {row['speedup'] or 0:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Per-worker memory report (RSS / PSS / private) for the AI service models
+
+Either inspects running processes (e.g. gunicorn workers) or starts N
+simulated workers that load the models from a model directory, once with
+private copies (PRICE_MODEL_MMAP=0, the default) and once with the
+memory-mapped shared artifacts (PRICE_MODEL_MMAP=1), and prints both side by side. PSS splits
+shared pages between the processes mapping them, so its sum is the real
+footprint of the worker set.
+
+Usage:
+    python scripts/memory_report.py --gunicorn
+    python scripts/memory_report.py --pids 1234 1235
+    python scripts/memory_report.py --simulate 4 --synthetic 200000
+
+--synthetic trains throwaway models in a temporary directory; without it
+the models in ./trained_models are used (run from the ai-service
+directory). Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def memory_of(pid):
+    """RSS, PSS and private memory of a process in MiB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {
+        'pid': pid,
+        'rss_mib': round(fields.get('Rss', 0) / 1024, 1),
+        'pss_mib': round(fields.get('Pss', 0) / 1024, 1),
+        'private_mib': round(private / 1024, 1)
+    }
+
+def gunicorn_workers():
+    """PIDs of gunicorn worker processes (children of a gunicorn master)"""
+    commands = {}
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/cmdline', 'rb') as f:
+                commands[int(name)] = f.read().replace(b'\0', b' ').decode(errors='replace')
+            with open(f'/proc/{name}/stat') as f:
+                parents[int(name)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    gunicorn = {pid for pid, command in commands.items() if 'gunicorn' in command}
+    return sorted(pid for pid in gunicorn if parents.get(pid) in gunicorn)
+
+def train_synthetic(model_dir, size, seed=42):
+    """Train throwaway recommender and price models into model_dir"""
+    import numpy as np
+
+    os.chdir(model_dir)
+    from models.price_predictor import PricePredictor
+    from models.recommender import RecommenderModel
+
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, max(size // 20, 1), size)
+    items = rng.zipf(1.3, size) % max(size // 50, 1)
+    RecommenderModel().train(
+        {'userId': f'u{user}', 'productId': f'p{item}', 'rating': int(rating)}
+        for user, item, rating in zip(users, items, rng.integers(1, 6, size))
+    )
+
+    num_prices = min(size, 50000)
+    base_prices = rng.lognormal(4.5, 1.0, num_prices)
+    PricePredictor().train([
+        {
+            'basePrice': float(base_price),
+            'features': {'stock': int(stock), 'demand': int(demand), 'category': f'c{category}'},
+            'actualPrice': float(base_price * rng.uniform(0.8, 1.2))
+        }
+        for base_price, stock, demand, category in zip(
+            base_prices, rng.integers(0, 300, num_prices),
+            rng.integers(0, 100, num_prices), rng.integers(0, 20, num_prices)
+        )
+    ])
+
+def _worker(model_dir, shared, ready, done):
+    """Load the models like a server worker, touch them, then wait"""
+    os.environ['PRICE_MODEL_MMAP'] = '1' if shared else '0'
+    os.chdir(model_dir)
+    from models.price_predictor import PricePredictor
+    from models.recommender import RecommenderModel
+
+    predictor = PricePredictor()
+    recommender = RecommenderModel()
+    predictor.predict_optimal_prices([{'basePrice': 100.0, 'features': {'stock': 10}}] * 1000)
+    if recommender.item_ids:
+        history = [{'productId': item, 'rating': 5} for item in recommender.item_ids[:20]]
+        recommender.get_recommendations('report-user', [], history, limit=10)
+
+    ready.put(os.getpid())
+    done.wait()
+
+def simulate(model_dir, workers, shared):
+    """Memory of `workers` processes that loaded the models"""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    done = context.Event()
+    processes = [
+        context.Process(target=_worker, args=(model_dir, shared, ready, done))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    pids = [ready.get() for _ in processes]
+    report = [memory_of(pid) for pid in pids]
+    done.set()
+    for process in processes:
+        process.join()
+    return report
+
+def print_table(title, report):
+    print(title)
+    print(f"{'pid':>8} {'rss MiB':>9} {'pss MiB':>9} {'private MiB':>12}")
+    for row in report:
+        print(f"{row['pid']:>8} {row['rss_mib']:>9} {row['pss_mib']:>9} {row['private_mib']:>12}")
+    print(f"{'total':>8} {sum(r['rss_mib'] for r in report):>9.1f} "
+          f"{sum(r['pss_mib'] for r in report):>9.1f} {sum(r['private_mib'] for r in report):>12.1f}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pids', type=int, nargs='+', help='Report these processes')
+    parser.add_argument('--gunicorn', action='store_true', help='Report running gunicorn workers')
+    parser.add_argument('--simulate', type=int, default=0,
+                        help='Start this many simulated workers, private vs shared models')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Train synthetic models with this many interactions first')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of tables')
+    args = parser.parse_args()
+
+    results = {}
+    if args.pids or args.gunicorn:
+        pids = args.pids or gunicorn_workers()
+        if not pids:
+            sys.exit('No processes to report')
+        results['processes'] = [memory_of(pid) for pid in pids]
+
+    if args.simulate:
+        model_dir = os.getcwd()
+        if args.synthetic:
+            model_dir = tempfile.mkdtemp(prefix='memory-report-')
+            context = multiprocessing.get_context('spawn')
+            trainer = context.Process(target=train_synthetic, args=(model_dir, args.synthetic))
+            trainer.start()
+            trainer.join()
+        results['private_models'] = simulate(model_dir, args.simulate, shared=False)
+        results['shared_models'] = simulate(model_dir, args.simulate, shared=True)
+
+    if not results:
+        parser.error('pass --pids, --gunicorn or --simulate N')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    titles = {
+        'processes': 'Processes',
+        'private_models': 'Private model copies (PRICE_MODEL_MMAP=0)',
+        'shared_models': 'Memory-mapped shared models (PRICE_MODEL_MMAP=1)'
+    }
+    for key, report in results.items():
+        print_table(titles[key], report)
+
+if __name__ == '__main__':
+    main()
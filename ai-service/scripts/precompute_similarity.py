@@ -0,0 +1,122 @@
+"""
+Precompute product similarity across CPU cores and write it to disk
+
+Scores every pair of products with ParallelSimilarity: upper-triangle
+tiles run in a process pool that memory-maps the encoded catalog, and the
+result is written to --output as a memory-mapped (n, n) matrix or, with
+--top-k, as per-product neighbour lists.
+
+--scaling runs the same computation once per worker count and prints wall
+time, speedup and parallel efficiency against the first count, and checks
+that every run wrote identical results.
+
+Usage:
+    python scripts/precompute_similarity.py --products products.ndjson --top-k 20 --output similarity/
+    python scripts/precompute_similarity.py --synthetic 50000 --top-k 20 --scaling 1 2 4 8
+
+--products takes a JSON array or newline-delimited JSON of products
+({_id, category, tags, basePrice}).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_processor import DataProcessor
+from utils.parallel_similarity import ParallelSimilarity
+
+def load_products(path):
+    with open(path, 'rb') as f:
+        if f.read(64).lstrip()[:1] == b'[':
+            f.seek(0)
+            return json.load(f)
+        f.seek(0)
+        return list(DataProcessor.iter_ndjson(f))
+
+def same_result(first_dir, other_dir):
+    first = ParallelSimilarity.load(first_dir)
+    other = ParallelSimilarity.load(other_dir)
+    names = ('similarity',) if first['meta']['mode'] == 'dense' else ('neighbors', 'scores')
+    return all(np.array_equal(first[name], other[name]) for name in names)
+
+def scaling_report(products, args):
+    """Run once per worker count in scratch directories"""
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='similarity-scaling-', dir=args.scratch) as scratch:
+        for workers in args.scaling:
+            output_dir = os.path.join(scratch, f'workers-{workers}')
+            meta = ParallelSimilarity(workers, args.tile_size).compute(
+                products, output_dir, top_k=args.top_k, dtype=args.dtype
+            )
+            rows.append({
+                'workers': workers,
+                'seconds': meta['seconds'],
+                'identical': same_result(os.path.join(scratch, f'workers-{args.scaling[0]}'), output_dir)
+            })
+
+    # Efficiency is relative to the first run, so 1.0 means linear scaling from it
+    base = rows[0]
+    pairs = len(products) * (len(products) - 1) // 2
+    for row in rows:
+        seconds = max(row['seconds'], 1e-9)
+        row['speedup'] = round(base['seconds'] / seconds, 2)
+        row['efficiency'] = round(row['speedup'] * max(base['workers'], 1) / max(row['workers'], 1), 2)
+        row['pairsPerSecond'] = round(pairs / seconds)
+    return {'n': len(products), 'topK': meta['topK'], 'tileSize': meta['tileSize'],
+            'cpus': os.cpu_count(), 'runs': rows}
+
+def print_scaling(report):
+    print(f"{report['n']} products, top_k {report['topK']}, tile {report['tileSize']}, "
+          f"{report['cpus']} CPUs")
+    print(f"{'workers':>7} {'seconds':>9} {'speedup':>8} {'efficiency':>10} {'pairs/s':>13}  identical")
+    for row in report['runs']:
+        print(f"{row['workers']:>7} {row['seconds']:>9.3f} {row['speedup']:>8} {row['efficiency']:>10} "
+              f"{row['pairsPerSecond']:>13}  {row['identical']}")
+    if max(row['workers'] for row in report['runs']) > report['cpus']:
+        print('\nNote: more workers than CPUs; speedup beyond the CPU count is not expected')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--products', help='JSON or NDJSON file of products')
+    source.add_argument('--synthetic', type=int, help='Use a seeded synthetic catalog of this size')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--top-k', type=int, help='Write k neighbours per product instead of the full matrix')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--tile-size', type=int, help='Products per tile side')
+    parser.add_argument('--dtype', default='float64', choices=['float64', 'float32'])
+    parser.add_argument('--output', help='Output directory')
+    parser.add_argument('--scaling', type=int, nargs='+', help='Report scaling over these worker counts')
+    parser.add_argument('--scratch', help='Directory for the --scaling outputs (default: system temp)')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    if not args.scaling and not args.output:
+        parser.error('--output is required unless --scaling is given')
+
+    if args.products:
+        products = load_products(args.products)
+    else:
+        from benchmarks import synthetic
+        products = synthetic.catalog(args.synthetic, args.seed)
+
+    if args.scaling:
+        report = scaling_report(products, args)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_scaling(report)
+        return
+
+    meta = ParallelSimilarity(args.workers, args.tile_size).compute(
+        products, args.output, top_k=args.top_k, dtype=args.dtype
+    )
+    print(json.dumps(meta, indent=2))
+
+if __name__ == '__main__':
+    main()
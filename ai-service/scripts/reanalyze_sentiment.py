@@ -0,0 +1,148 @@
+"""
+Bulk re-analysis of stored reviews across all CPU cores
+
+Reads reviews as newline-delimited JSON ({"productId", "text", "rating"}),
+shards them into chunks scored by a pool of worker processes and merges
+the per-product aggregates as chunks complete. Progress and throughput go
+to stderr. Use it after changing the lexicon in SentimentAnalyzer.
+
+Usage:
+    python scripts/reanalyze_sentiment.py reviews.ndjson --save
+    mongoexport ... | python scripts/reanalyze_sentiment.py - --output summaries.ndjson
+
+--save publishes the results as a new version of trained_models/sentiment/
+(run from the ai-service directory); --output writes one summary per
+product. Running servers switch to the new version within
+MODEL_CHECK_INTERVAL seconds, and their own updates go to it as soon as it
+is published, so the service need not be stopped. Reviews added through
+the service after the export was taken are not in the new version: export
+after writes have stopped, or replay them afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.sentiment_analyzer import SentimentAggregate, SentimentAnalyzer
+from models.sentiment_store import SentimentStore
+from utils.data_processor import DataProcessor
+
+_analyzer = None
+
+def _init_worker():
+    global _analyzer
+    _analyzer = SentimentAnalyzer()
+
+def analyze_chunk(first_line, lines):
+    """
+    Score one chunk of raw NDJSON lines
+
+    Returns:
+        (number of reviews, dict of product ID -> SentimentAggregate)
+    """
+    aggregates = {}
+    count = 0
+    for record in DataProcessor.iter_ndjson(lines, start=first_line):
+        product_id = record.get('productId')
+        if product_id is None:
+            continue
+
+        aggregate = aggregates.get(product_id)
+        if aggregate is None:
+            aggregate = aggregates[product_id] = SentimentAggregate()
+        aggregate.add(_analyzer.analyze_review(record))
+        count += 1
+
+    return count, aggregates
+
+def reanalyze(stream, workers=None, chunk_size=20000, progress=None):
+    """
+    Re-score every review in an NDJSON stream
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    regardless of input size.
+
+    Args:
+        stream: Iterable of NDJSON lines
+        workers: Worker processes (default: all cores)
+        chunk_size: Lines per chunk
+        progress: Callable receiving (reviews done, elapsed seconds)
+
+    Returns:
+        Dict of product ID -> SentimentAggregate
+    """
+    workers = workers or os.cpu_count() or 1
+    merged = {}
+    done = 0
+    start = time.perf_counter()
+
+    def collect(futures):
+        nonlocal done
+        for future in futures:
+            count, aggregates = future.result()
+            for product_id, aggregate in aggregates.items():
+                if product_id in merged:
+                    merged[product_id].merge(aggregate)
+                else:
+                    merged[product_id] = aggregate
+            done += count
+        if progress:
+            progress(done, time.perf_counter() - start)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = set()
+        first_line = 1
+        for lines in DataProcessor.batched(stream, chunk_size):
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(analyze_chunk, first_line, lines))
+            first_line += len(lines)
+
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+    return merged
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help="NDJSON reviews file, or '-' for stdin")
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Reviews per work unit')
+    parser.add_argument('--save', action='store_true',
+                        help='Replace the stored per-product aggregates with the results')
+    parser.add_argument('--output', help='Write one {"productId", "sentiment"} line per product')
+    args = parser.parse_args()
+
+    def report(done, elapsed):
+        rate = done / elapsed if elapsed else 0
+        print(f'\r{done} reviews  {elapsed:.1f}s  {rate:,.0f} reviews/s', end='', file=sys.stderr)
+
+    if args.input == '-':
+        aggregates = reanalyze(sys.stdin.buffer, args.workers, args.chunk_size, report)
+    else:
+        with open(args.input, 'rb') as f:
+            aggregates = reanalyze(f, args.workers, args.chunk_size, report)
+    print(f'\n{len(aggregates)} products', file=sys.stderr)
+
+    analyzer = SentimentAnalyzer()
+    if args.output:
+        with open(args.output, 'w') as out:
+            for product_id, aggregate in aggregates.items():
+                out.write(json.dumps({
+                    'productId': product_id,
+                    'sentiment': analyzer.summarize(aggregate)
+                }) + '\n')
+
+    if args.save:
+        store = SentimentStore(analyzer)
+        store.replace_all(aggregates)
+        print(f'Published sentiment version {store.version}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Startup timing for the AI service
+
+Measures how long `import app` takes, how long a freshly started server
+needs before /health (and, with warm-up, /ready) answers, and the latency
+of the first and second request to each model endpoint. The first request
+to a model includes loading it unless AI_WARMUP preloaded it.
+
+Usage:
+    python scripts/startup_timing.py
+    python scripts/startup_timing.py --warmup all --json
+
+Run from the ai-service directory; the server is started with the models
+in ./trained_models.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUESTS = (
+    ('recommendations', '/api/recommendations', {
+        'userId': 'timing-user',
+        'productIds': ['p1', 'p2', 'p3'],
+        'userHistory': [{'productId': 'p1', 'rating': 5}]
+    }),
+    ('predict-price', '/api/predict-price', {
+        'productId': 'p1',
+        'basePrice': 100,
+        'features': {'category': 'electronics', 'stock': 10, 'demand': 50},
+        'historicalData': []
+    }),
+    ('analyze-sentiment', '/api/analyze-sentiment', {
+        'reviews': [{'text': 'Great quality, worth the price', 'rating': 5}]
+    })
+)
+
+def import_seconds(repeats):
+    """Median wall time of `import app` in a fresh interpreter"""
+    code = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=SERVICE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def call(url, body=None, timeout=60):
+    """(status, seconds) of one request; status None if nothing answered"""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError):
+        status = None
+    return status, time.perf_counter() - start
+
+def wait_for(url, started, deadline=120):
+    """Seconds from `started` until url answers 200"""
+    while time.perf_counter() - started < deadline:
+        status, _ = call(url, timeout=5)
+        if status == 200:
+            return time.perf_counter() - started
+        time.sleep(0.02)
+    raise TimeoutError(f'{url} did not become available')
+
+def server_timings(warmup):
+    """Start app.py and time /health, /ready and the first requests"""
+    port = free_port()
+    env = dict(os.environ, AI_SERVICE_PORT=str(port), AI_WARMUP=warmup or '', FLASK_ENV='production')
+    base = f'http://127.0.0.1:{port}'
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=SERVICE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        result = {'health_seconds': wait_for(f'{base}/health', started)}
+        if warmup:
+            result['ready_seconds'] = wait_for(f'{base}/ready', started)
+
+        result['requests'] = {}
+        for name, path, body in REQUESTS:
+            first_status, first = call(base + path, body)
+            _, second = call(base + path, body)
+            result['requests'][name] = {'status': first_status, 'first_seconds': first, 'second_seconds': second}
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--warmup', default='', help='AI_WARMUP value for the server (e.g. "all")')
+    parser.add_argument('--repeats', type=int, default=5, help='Import measurements to take the median of')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    results = {
+        'import_seconds': import_seconds(args.repeats),
+        'warmup': args.warmup or None,
+        **server_timings(args.warmup)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"import app:            {results['import_seconds'] * 1000:8.1f} ms")
+    print(f"start to /health:      {results['health_seconds'] * 1000:8.1f} ms")
+    if 'ready_seconds' in results:
+        print(f"start to /ready:       {results['ready_seconds'] * 1000:8.1f} ms")
+    print()
+    print(f"{'endpoint':<20} {'status':>6} {'first ms':>10} {'second ms':>10}")
+    for name, timing in results['requests'].items():
+        print(f"{name:<20} {str(timing['status']):>6} "
+              f"{timing['first_seconds'] * 1000:>10.1f} {timing['second_seconds'] * 1000:>10.1f}")
+
+if __name__ == '__main__':
+    main()
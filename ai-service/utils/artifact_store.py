@@ -0,0 +1,231 @@
+import json
+import os
+import pickle
+import shutil
+import struct
+import time
+
+class ArtifactStore:
+    """
+    Versioned model artifacts with atomic publish
+
+    Layout under `root`:
+
+        MANIFEST.json          {"version": ..., "createdAt": ..., "meta": {...}}
+        versions/<version>/    files of one complete model version
+        versions/<version>/<log>
+                               optional append-only log of changes made
+                               on top of that version (see append_log)
+        <side files>           small files replaced atomically (e.g. deltas)
+
+    A new version is written into a temporary directory, renamed into
+    versions/ and only then made current by atomically replacing the
+    manifest, so readers never see a half-written model. Other processes
+    notice a new version with a throttled stat() of the manifest (and of
+    the watched side files) instead of reloading per request. The last
+    `keep` versions stay on disk so readers still holding an older one
+    (e.g. memory-mapped arrays) are not cut off.
+
+    A change log lets writers record small changes without publishing a
+    whole version: readers that already hold the version apply only the
+    records appended since they last read it. Publishing a new version
+    starts a new, empty log.
+    """
+
+    MANIFEST = 'MANIFEST.json'
+    # Change log records are framed by their length (little-endian uint64)
+    FRAME = struct.Struct('<Q')
+
+    def __init__(self, root, keep=3, watch=(), check_interval=None, log=None):
+        """
+        Args:
+            root: Directory holding the manifest and versions
+            keep: Number of versions retained on disk
+            watch: Side file names whose changes also count as a new state
+            check_interval: Minimum seconds between stat() checks
+                (default: $MODEL_CHECK_INTERVAL or 2)
+            log: File name of the change log kept in each version; appends
+                to the current version's log also count as a new state
+        """
+        if check_interval is None:
+            check_interval = float(os.getenv('MODEL_CHECK_INTERVAL', 2))
+
+        self.root = root
+        self.keep = keep
+        self.watch = tuple(watch)
+        self.check_interval = check_interval
+        self.log = log
+        self._seen = None
+        self._seen_version = None
+        self._next_check = 0.0
+
+    def manifest(self):
+        """Current manifest, or None if nothing was published yet"""
+        try:
+            with open(os.path.join(self.root, self.MANIFEST)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def version_path(self, version):
+        return os.path.join(self.root, 'versions', version)
+
+    def publish(self, write, meta=None):
+        """
+        Write and publish a new version
+
+        Args:
+            write: Callable receiving the directory to write the files into
+            meta: JSON-serializable metadata stored in the manifest
+
+        Returns:
+            The new manifest
+        """
+        versions_dir = os.path.join(self.root, 'versions')
+        os.makedirs(versions_dir, exist_ok=True)
+
+        version = f'{time.time_ns()}-{os.getpid()}'
+        tmp_dir = os.path.join(versions_dir, f'.tmp-{version}')
+        os.makedirs(tmp_dir)
+        try:
+            write(tmp_dir)
+            os.rename(tmp_dir, self.version_path(version))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        manifest = {'version': version, 'createdAt': time.time(), 'meta': meta or {}}
+        self.write_side_file(self.MANIFEST, lambda path: self._dump_json(manifest, path))
+        self.mark_seen()
+        self._prune(version)
+        return manifest
+
+    def write_side_file(self, name, write):
+        """
+        Atomically replace a file next to the manifest
+
+        Args:
+            name: File name under root
+            write: Callable receiving the temporary path to write to
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, name)
+        base, ext = os.path.splitext(name)
+        tmp_path = os.path.join(self.root, f'.{base}.{os.getpid()}.{time.time_ns()}.tmp{ext}')
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def append_log(self, version, records, end):
+        """
+        Append records to a version's change log
+
+        Callers serialize appends with their own lock and pass the end of
+        the last complete record they read (see read_log), so a record torn
+        by a writer that crashed mid-append is cut off, not built upon.
+
+        Args:
+            version: Version the records apply to
+            records: Picklable records
+            end: Offset the log is known to end at
+
+        Returns:
+            The new end offset
+        """
+        frames = b''.join(
+            self.FRAME.pack(len(data)) + data
+            for data in (pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL) for record in records)
+        )
+        with open(self._log_path(version), 'ab') as f:
+            if f.tell() != end:
+                f.truncate(end)
+            f.write(frames)
+        return end + len(frames)
+
+    def read_log(self, version, offset=0):
+        """
+        Complete records of a version's change log from an offset on
+
+        A record still being appended is left for the next read.
+
+        Returns:
+            (records, end offset of the last one)
+        """
+        try:
+            with open(self._log_path(version), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+
+        records = []
+        position = 0
+        while position + self.FRAME.size <= len(data):
+            (length,) = self.FRAME.unpack_from(data, position)
+            start = position + self.FRAME.size
+            if start + length > len(data):
+                break
+            records.append(pickle.loads(data[start:start + length]))
+            position = start + length
+        return records, offset + position
+
+    def remove_side_file(self, name):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def changed(self):
+        """
+        True when the manifest, a watched file or the change log of the
+        version current at mark_seen() changed since then
+
+        Checks at most once per check_interval; in between it returns False.
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        return self._signature(self._seen_version) != self._seen
+
+    def mark_seen(self):
+        """Record the current on-disk state as loaded"""
+        # Stat the manifest before reading the version it names: a publish
+        # in between then still shows up as a changed manifest
+        files = self._signature(None)
+        if self.log is None:
+            self._seen = files
+            return
+        manifest = self.manifest()
+        self._seen_version = manifest['version'] if manifest else None
+        self._seen = files + self._signature(self._seen_version)[len(files):]
+
+    def _signature(self, version):
+        paths = [os.path.join(self.root, name) for name in (self.MANIFEST,) + self.watch]
+        if version is not None and self.log is not None:
+            paths.append(self._log_path(version))
+
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_ino, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _log_path(self, version):
+        return os.path.join(self.version_path(version), self.log)
+
+    def _prune(self, current):
+        versions_dir = os.path.join(self.root, 'versions')
+        versions = sorted(
+            name for name in os.listdir(versions_dir)
+            if not name.startswith('.') and name != current
+        )
+        for name in versions[:max(len(versions) - (self.keep - 1), 0)]:
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def _dump_json(data, path):
+        with open(path, 'w') as f:
+            json.dump(data, f)
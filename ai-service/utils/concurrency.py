@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+
+from flask import jsonify
+
+# Concurrent requests allowed per endpoint group in one server process;
+# groups not listed here are unlimited
+DEFAULT_CONCURRENCY_LIMITS = {
+    'train': 1,
+    'batch': 4
+}
+
+class ConcurrencyLimiter:
+    """
+    Per-endpoint-group limits on concurrent requests
+
+    A request over its group's limit is rejected immediately with 503
+    instead of queueing behind the running ones, so a burst of training or
+    bulk calls cannot occupy every worker thread and stall the read
+    endpoints.
+    """
+
+    def __init__(self, limits=None):
+        """
+        Args:
+            limits: Dict of group -> max concurrent requests. Defaults to
+                DEFAULT_CONCURRENCY_LIMITS overridden by
+                $ENDPOINT_CONCURRENCY ("train=1,batch=4").
+        """
+        if limits is None:
+            limits = dict(DEFAULT_CONCURRENCY_LIMITS)
+            limits.update(self.parse(os.getenv('ENDPOINT_CONCURRENCY', '')))
+
+        self.limits = {group: limit for group, limit in limits.items() if limit > 0}
+        self._slots = {group: threading.BoundedSemaphore(limit) for group, limit in self.limits.items()}
+        self._active = {group: 0 for group in self.limits}
+        self._rejected = {group: 0 for group in self.limits}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse(spec):
+        """Parse "group=limit,group=limit" into a dict"""
+        limits = {}
+        for item in spec.split(','):
+            if '=' in item:
+                group, limit = item.split('=', 1)
+                limits[group.strip()] = int(limit)
+        return limits
+
+    def limit(self, group):
+        """Decorator bounding concurrent calls of an endpoint to its group's limit"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                slots = self._slots.get(group)
+                if slots is None:
+                    return view(*args, **kwargs)
+
+                if not slots.acquire(blocking=False):
+                    with self._lock:
+                        self._rejected[group] += 1
+                    response = jsonify({
+                        'success': False,
+                        'error': f'Too many concurrent {group} requests, retry later'
+                    })
+                    response.headers['Retry-After'] = '1'
+                    return response, 503
+
+                with self._lock:
+                    self._active[group] += 1
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self._active[group] -= 1
+                    slots.release()
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Limit, in-flight and rejected requests per group"""
+        with self._lock:
+            return {
+                group: {
+                    'limit': limit,
+                    'active': self._active[group],
+                    'rejected': self._rejected[group]
+                }
+                for group, limit in self.limits.items()
+            }
+
+class WorkerPool:
+    """
+    Bounded process pool for CPU-heavy work
+
+    Pure-Python and NumPy work that holds the GIL (similarity computation,
+    model fitting) runs in separate processes, so it cannot starve the
+    request threads of the server process. At most `max_workers` tasks run
+    and `max_pending` wait; further submissions block up to `timeout`
+    seconds and then fail. With max_workers=0 tasks run inline.
+
+    The executor is created on first use, after the server has forked its
+    workers, and uses the spawn start method so children never inherit
+    the parent's threads and locks.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        if max_workers is None:
+            max_workers = int(os.getenv('CPU_POOL_WORKERS', 1))
+        if max_pending is None:
+            max_pending = int(os.getenv('CPU_POOL_MAX_PENDING', 4))
+        if timeout is None:
+            timeout = float(os.getenv('CPU_POOL_TIMEOUT', 30))
+
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max(max_workers + max_pending, 1))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    def run(self, fn, *args):
+        """
+        Run fn(*args) in the pool and wait for its result
+
+        fn and its arguments must be picklable (module-level functions or
+        bound methods of picklable objects).
+        """
+        if not self.enabled:
+            return fn(*args)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError('CPU worker pool is busy, retry later')
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
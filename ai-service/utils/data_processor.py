@@ -1,5 +1,7 @@
+import json
 import numpy as np
-import pandas as pd
+
+from utils.product_batch import ProductBatch
 
 class DataProcessor:
     """Utility class for data processing and feature engineering"""
@@ -19,7 +21,7 @@ class DataProcessor:
             'power': 4,
             'peripherals': 5
         }
-        return category_map.get(category.lower(), 0)
+        return category_map.get((category or '').lower(), 0)
     
     @staticmethod
     def extract_features(product):
@@ -35,9 +37,59 @@ class DataProcessor:
         }
         return features
     
+    @staticmethod
+    def extract_features_batch(products):
+        """
+        extract_features for many products at once
+        
+        Args:
+            products: ProductBatch or list of product dicts
+        
+        Returns:
+            Dict of feature name -> array with one value per product
+        """
+        batch = ProductBatch.of(products)
+        return {
+            'price': DataProcessor.normalize_price(batch.column('basePrice', 0)),
+            'stock': batch.column('stock', 0) / 100,
+            'category': batch.map_categories(DataProcessor.encode_category, 'Unknown', dtype=np.int64),
+            'tags_count': batch.tag_counts,
+            'has_image': batch.has_image.astype(np.int64),
+            'rating': batch.column('ratingAverage', 0) / 5,
+            'review_count': np.minimum(batch.column('ratingCount', 0) / 100, 1)
+        }
+    
+    @staticmethod
+    def top_k_indices(scores, k):
+        """
+        Indices of the k highest scores, best first
+        
+        Uses partial selection (argpartition) so only the candidates that can
+        make the cut get sorted. Ties keep their input order, matching a
+        stable full sort in descending order.
+        """
+        scores = np.asarray(scores)
+        n = len(scores)
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        
+        if k < n:
+            # Everything scoring at least the k-th best value is a candidate
+            kth_best = scores[np.argpartition(-scores, k - 1)[:k]].min()
+            candidates = np.flatnonzero(scores >= kth_best)
+        else:
+            candidates = np.arange(n)
+        
+        order = np.argsort(-scores[candidates], kind='stable')
+        return candidates[order[:k]]
+    
     @staticmethod
     def prepare_training_data(interactions):
         """Prepare interaction data for training"""
+        # pandas is only needed here; keep it off the service's import path
+        import pandas as pd
+
         df = pd.DataFrame(interactions)
         
         # Remove duplicates
@@ -50,18 +102,197 @@ class DataProcessor:
         return df
     
     @staticmethod
-    def calculate_similarity_matrix(products):
-        """Calculate product similarity matrix"""
+    def iter_ndjson(stream, start=1):
+        """
+        Lazily parse newline-delimited JSON records from a binary or text stream
+        
+        Blank lines are skipped; a malformed line raises ValueError with its
+        line number (counted from `start`, for streams split into chunks).
+        """
+        for line_number, line in enumerate(stream, start=start):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f'Invalid JSON on line {line_number}')
+    
+    @staticmethod
+    def batched(records, batch_size):
+        """Group an iterable into lists of at most batch_size records"""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    # calculate_similarity_matrix: target size of one block's temporaries
+    # (small blocks stay in cache and are faster) and largest dense copy of
+    # the tag matrix used for the overlap product
+    SIMILARITY_BLOCK_BYTES = 8 * 1024 * 1024
+    SIMILARITY_DENSE_TAGS_BYTES = 64 * 1024 * 1024
+    
+    @staticmethod
+    def calculate_similarity_matrix(products, top_k=None, block_size=None):
+        """
+        Calculate product similarity matrix
+        
+        Gives product_similarity for every pair (0 on the diagonal), computed
+        on encoded arrays instead of per pair: category IDs are compared by
+        broadcasting, tag overlaps come from a sparse product of the
+        multi-hot tag matrix with itself (Jaccard = overlap / (|a| + |b| -
+        overlap)) and price ratios are computed on whole rows. Rows are
+        processed in blocks, so temporaries stay bounded however large the
+        catalog is.
+        
+        Args:
+            products: ProductBatch or list of products {category, tags, basePrice}
+            top_k: Keep only the top_k most similar other products of each
+                row and return a sparse matrix; zero scores are not stored.
+                Ties keep the lower column index, like top_k_indices.
+            block_size: Rows per block (default: SIMILARITY_BLOCK_BYTES worth)
+        
+        Returns:
+            Dense (n, n) array, or a scipy.sparse CSR matrix when top_k is set
+        """
+        from scipy import sparse
+        
         n = len(products)
-        similarity_matrix = np.zeros((n, n))
+        categories, tags, tag_counts, prices = DataProcessor._encode_similarity_features(products)
+        if block_size is None:
+            # Four (block, n) float64 arrays are alive per block
+            block_size = max(1, DataProcessor.SIMILARITY_BLOCK_BYTES // (32 * max(n, 1)))
+        
+        keep = min(top_k, n - 1) if top_k is not None else None
+        if keep is None:
+            similarity_matrix = np.zeros((n, n))
+        else:
+            rows, cols, values = [], [], []
+        
+        tags_t = DataProcessor._transposed_tags(tags)
+        for start in range(0, n, block_size):
+            end = min(start + block_size, n)
+            block = DataProcessor._similarity_block(
+                categories, tags, tags_t, tag_counts, prices, slice(start, end)
+            )
+            local = np.arange(end - start)
+            
+            if keep is None:
+                block[local, start + local] = 0
+                similarity_matrix[start:end] = block
+            elif keep > 0:
+                block[local, start + local] = -np.inf
+                block_rows, block_cols = DataProcessor._top_k_per_row(block, keep)
+                scores = block[block_rows, block_cols]
+                nonzero = scores > 0
+                rows.append(block_rows[nonzero] + start)
+                cols.append(block_cols[nonzero])
+                values.append(scores[nonzero])
+        
+        if keep is None:
+            return similarity_matrix
+        if not rows:
+            return sparse.csr_matrix((n, n))
+        return sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n)
+        )
+    
+    @staticmethod
+    def _encode_similarity_features(products):
+        """
+        Category IDs, multi-hot tag matrix, tag counts and prices of products
+        
+        Tag counts are floats and non-positive prices are NaN, as
+        _similarity_block expects.
+        """
+        batch = ProductBatch.of(products)
+        
+        # A missing category compares equal to None, like dict.get() does
+        categories = batch.category_codes.copy()
+        missing = categories < 0
+        if missing.any():
+            categories[missing] = batch.categories.index(None) if None in batch.categories else len(batch.categories)
+        
+        tags = batch.tag_matrix()
+        prices = batch.column('basePrice', 0)
+        prices = np.where(prices > 0, prices, np.nan)
+        return categories, tags, np.diff(tags.indptr).astype(float), prices
+    
+    @staticmethod
+    def _transposed_tags(tags):
+        """
+        Right-hand operand of the tag overlap product for the columns in `tags`
+        
+        Dense unless the vocabulary is very large: sparse x dense is several
+        times faster than sparse x sparse.
+        """
+        if tags.shape[0] * tags.shape[1] * 8 <= DataProcessor.SIMILARITY_DENSE_TAGS_BYTES:
+            return tags.T.toarray()
+        return tags.T.tocsr()
+    
+    @staticmethod
+    def _similarity_block(categories, tags, tags_t, tag_counts, prices, rows, cols=slice(None)):
+        """
+        Scores of the products in `rows` against those in `cols` (diagonal not cleared)
         
-        for i in range(n):
-            for j in range(i+1, n):
-                sim = DataProcessor.product_similarity(products[i], products[j])
-                similarity_matrix[i][j] = sim
-                similarity_matrix[j][i] = sim
+        tags_t is _transposed_tags(tags[cols]). Works in place on a few
+        (rows, cols) arrays. Pairs where a rule does not apply get an exact 0
+        for that rule, so the sums match product_similarity.
+        """
+        # Category match
+        scores = np.equal(categories[rows, None], categories[None, cols]) * 0.4
+        
+        # Tag overlap (Jaccard). With an empty tag set the overlap is 0 and
+        # the union is clamped to >= 1, which yields the 0 of the "both
+        # products have tags" rule without a mask.
+        overlap = tags[rows] @ tags_t
+        if not isinstance(overlap, np.ndarray):
+            overlap = overlap.toarray()
+        union = np.add.outer(tag_counts[rows], tag_counts[cols])
+        union -= overlap
+        np.maximum(union, 1, out=union)
+        np.divide(overlap, union, out=overlap)
+        overlap *= 0.3
+        scores += overlap
+        
+        # Price similarity; non-positive prices are NaN here and their terms
+        # are zeroed at the end
+        row_prices = prices[rows]
+        col_prices = prices[cols]
+        price_term = np.subtract.outer(row_prices, col_prices)
+        np.abs(price_term, out=price_term)
+        np.divide(price_term, np.maximum.outer(row_prices, col_prices), out=price_term)
+        np.subtract(1, price_term, out=price_term)
+        price_term *= 0.3
+        np.nan_to_num(price_term, copy=False, nan=0.0)
+        scores += price_term
+        return scores
+    
+    @staticmethod
+    def _top_k_per_row(scores, k):
+        """
+        (rows, cols) of the k highest scores of every row, ties to the lower column
         
-        return similarity_matrix
+        Row-wise version of top_k_indices: everything above the k-th best
+        value is kept, then the first of the entries equal to it.
+        """
+        n = scores.shape[1]
+        kth_best = np.partition(scores, n - k, axis=1)[:, n - k, None]
+        above = scores > kth_best
+        tied = scores == kth_best
+        needed = k - above.sum(axis=1, keepdims=True)
+        keep = above | tied
+        # Only rows with more ties than free places need the running count
+        crowded = np.flatnonzero(tied.sum(axis=1, keepdims=True) > needed)
+        if len(crowded):
+            keep[crowded] = above[crowded] | (
+                tied[crowded] & (np.cumsum(tied[crowded], axis=1) <= needed[crowded])
+            )
+        return np.nonzero(keep)
     
     @staticmethod
     def product_similarity(prod1, prod2):
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Background training jobs with status polling
+
+    Jobs run one at a time on a background thread. A job's ID is derived
+    from its kind and the hash of its raw payload, and its record is kept
+    as a JSON file under `job_dir`, so:
+
+    - resubmitting the same payload (a client retry after a proxy timeout)
+      returns the existing job instead of starting the work again, even
+      when the retry reaches another server process;
+    - status can be polled from any server process.
+
+    Failed jobs, and jobs whose server process died before finishing, can
+    be resubmitted; finished records older than `retention_seconds` are
+    removed.
+
+    Each attempt at a job is claimed by creating `<id>.<attempt>.claim`
+    exclusively (O_EXCL) before it is queued, so when the same submit
+    reaches several server processes at once only one of them runs it.
+    """
+
+    ACTIVE = ('queued', 'running')
+    # Seconds a process that lost a claim waits for the winner's record
+    CLAIM_WAIT = 1.0
+
+    def __init__(self, job_dir=os.path.join('trained_models', 'jobs'), retention_seconds=7 * 86400):
+        self.job_dir = job_dir
+        self.retention_seconds = retention_seconds
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    @staticmethod
+    def job_id(kind, payload):
+        """Deterministic job ID for a job kind and raw payload bytes"""
+        digest = hashlib.sha256(kind.encode('utf-8') + b'\0' + payload).hexdigest()
+        return f'{kind}-{digest[:24]}'
+
+    def submit(self, kind, payload, task):
+        """
+        Queue a job unless the same payload is already queued, running or done
+
+        Args:
+            kind: Job type (e.g. 'train-recommendations')
+            payload: Raw request body, used for deduplication
+            task: Callable run on the worker thread with a progress callback
+                (fraction, message); its return value becomes the job result.
+                A result dict containing 'error' marks the job failed.
+
+        Returns:
+            (job record, True if a new job was queued)
+        """
+        job_id = self.job_id(kind, payload)
+
+        with self._lock:
+            self._purge_expired()
+            existing = self.get(job_id)
+            if existing is not None and existing['status'] != 'failed' and not self._orphaned(existing):
+                return existing, False
+
+            attempt = existing.get('attempt', 1) + 1 if existing is not None else 1
+            if not self._claim(job_id, attempt):
+                # Another server process claimed this attempt first
+                job = self._claimed_record(job_id, attempt)
+                return job or {'id': job_id, 'kind': kind, 'attempt': attempt, 'status': 'queued'}, False
+
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'attempt': attempt,
+                'status': 'queued',
+                'progress': 0.0,
+                'message': None,
+                'result': None,
+                'error': None,
+                'submittedAt': time.time(),
+                'startedAt': None,
+                'finishedAt': None,
+                'pid': os.getpid()
+            }
+            self._write(job)
+            self._queue.put((job, task))
+            self._ensure_worker()
+
+        # The worker thread updates its own dict; callers get a snapshot
+        return dict(job), True
+
+    def get(self, job_id):
+        """Job record, or None if unknown"""
+        if not re.fullmatch(r'[\w-]+', job_id):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list(self, limit=50):
+        """Most recently submitted jobs first"""
+        jobs = []
+        for name in os.listdir(self.job_dir):
+            if name.endswith('.json'):
+                job = self.get(name[:-len('.json')])
+                if job is not None:
+                    jobs.append(job)
+        jobs.sort(key=lambda job: job['submittedAt'], reverse=True)
+        return jobs[:limit]
+
+    def _ensure_worker(self):
+        # Started lazily so it lives in the server process that handles requests
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='training-jobs', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            job, task = self._queue.get()
+            job.update(status='running', startedAt=time.time())
+            self._write(job)
+
+            def report(fraction, message=None):
+                job.update(progress=round(float(fraction), 3), message=message)
+                self._write(job)
+
+            try:
+                result = task(report)
+                if isinstance(result, dict) and 'error' in result:
+                    job.update(status='failed', error=result['error'])
+                else:
+                    job.update(status='succeeded', progress=1.0, message=None, result=result)
+            except Exception as e:
+                logger.exception('Job %s failed', job['id'])
+                job.update(status='failed', error=str(e))
+
+            job['finishedAt'] = time.time()
+            self._write(job)
+            self._queue.task_done()
+
+    def _claim(self, job_id, attempt):
+        """Create the claim file of a job attempt; False if it already exists"""
+        try:
+            with open(self._claim_path(job_id, attempt), 'x') as f:
+                f.write(str(os.getpid()))
+        except FileExistsError:
+            return False
+        return True
+
+    def _claimed_record(self, job_id, attempt):
+        """Record of an attempt claimed by another process, once it is written"""
+        deadline = time.monotonic() + self.CLAIM_WAIT
+        while True:
+            job = self.get(job_id)
+            if (job is not None and job.get('attempt', 1) >= attempt) or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.01)
+
+    def _orphaned(self, job):
+        """True for a queued/running job whose server process has exited"""
+        if job['status'] not in self.ACTIVE:
+            return False
+        try:
+            os.kill(job['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, KeyError, TypeError):
+            pass
+        return False
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.retention_seconds
+        for job in self.list(limit=None):
+            if job['status'] not in self.ACTIVE and (job['finishedAt'] or 0) < cutoff:
+                paths = [self._path(job['id'])] + [
+                    self._claim_path(job['id'], attempt) for attempt in range(1, job.get('attempt', 1) + 1)
+                ]
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f'{job_id}.json')
+
+    def _claim_path(self, job_id, attempt):
+        return os.path.join(self.job_dir, f'{job_id}.{attempt}.claim')
+
+    def _write(self, job):
+        """Write the record to a temp file and rename it over the old one"""
+        path = self._path(job['id'])
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
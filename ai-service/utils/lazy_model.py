@@ -0,0 +1,64 @@
+import threading
+import time
+
+class LazyModel:
+    """
+    Proxy that constructs a model on first use
+
+    The factory (which should do its own heavy imports) runs once, on the
+    first attribute access or get(); concurrent first callers wait for the
+    same construction. Attribute access is forwarded to the model, so the
+    proxy can stand in for it. A failed construction is recorded and
+    retried on the next access.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self.error = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        """The model, constructing it if needed"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                start = time.perf_counter()
+                try:
+                    self._instance = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.error = None
+                self.load_seconds = round(time.perf_counter() - start, 3)
+            return self._instance
+
+    def reset(self):
+        """Drop the model so the next access constructs it again"""
+        with self._lock:
+            self._instance = None
+            self.load_seconds = None
+            self.error = None
+
+    def status(self):
+        """Load state for readiness reporting"""
+        return {
+            'loaded': self.loaded,
+            'loadSeconds': self.load_seconds,
+            'error': self.error
+        }
+
+    def __getattr__(self, attr):
+        # Only called for attributes the proxy itself does not have
+        if attr.startswith('__') or attr in ('_instance', '_lock', 'factory'):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
@@ -0,0 +1,209 @@
+import bisect
+import contextvars
+import threading
+import time
+
+# Latency buckets in seconds, payload buckets in bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, '')) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+class Histogram:
+    """Bucketed distribution with labels (cumulative buckets on render)"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(str(labels.get(name, '')) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), key + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+class GaugeCallback:
+    """
+    Values read only when the registry is rendered
+
+    The callback returns a list of (labels dict, value) pairs, so gauges
+    of model state cost nothing between scrapes.
+    """
+
+    def __init__(self, name, help, callback, type='gauge'):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.type = type
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for labels, value in self.callback():
+            if value is None:
+                continue
+            names = tuple(labels)
+            lines.append(f'{self.name}{_labels(names, tuple(str(labels[n]) for n in names))} {_number(value)}')
+        return lines
+
+class MetricsRegistry:
+    """Named metrics rendered in the Prometheus text exposition format"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(name, lambda: Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name, help, callback, type='gauge'):
+        """Register (or replace) a metric computed at render time"""
+        with self._lock:
+            self._metrics[name] = GaugeCallback(name, help, callback, type)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, name, create):
+        # Idempotent, so modules can declare the metrics they record
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = create()
+            return self._metrics[name]
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+# Process-wide registry; the models record into it, app.py serves it
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'ai_stage_duration_seconds', 'Time spent in one stage of a request',
+    ('endpoint', 'stage')
+)
+FALLBACKS = REGISTRY.counter(
+    'ai_fallbacks_total', 'Requests answered by a fallback path instead of the primary model',
+    ('component', 'reason')
+)
+
+# Endpoint of the request being handled on this thread (None outside requests)
+current_endpoint = contextvars.ContextVar('current_endpoint', default=None)
+
+def stage(name):
+    """
+    Time a stage of the current request (parse, encode, score, topk, serialize)
+
+    Outside a request (scripts, pool workers) nothing is recorded.
+    """
+    endpoint = current_endpoint.get()
+    if endpoint is None:
+        return _NOOP
+    return _Timer(STAGE_SECONDS, {'endpoint': endpoint, 'stage': name})
+
+def record_fallback(component, reason):
+    """Count a request served by a fallback path"""
+    FALLBACKS.inc(component=component, reason=reason)
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
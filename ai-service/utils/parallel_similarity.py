@@ -0,0 +1,293 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.data_processor import DataProcessor
+from utils.product_batch import ProductBatch
+
+# Memory-mapped inputs and outputs of the current worker process, set by _init_worker
+_state = {}
+
+class ParallelSimilarity:
+    """
+    All-pairs product similarity computed in tiles across processes
+
+    The offline counterpart of DataProcessor.calculate_similarity_matrix for
+    catalogs whose n x n scores take too long on one core. Products are
+    encoded once and written as .npy files that every worker memory-maps,
+    so only tile coordinates are sent to the workers. Only the tiles (I, J)
+    with I <= J of the upper triangle are scored; each one gives both the
+    (I, J) and the (J, I) scores.
+
+    Results are written to output_dir as they are computed:
+
+    - dense: similarity.npy, the (n, n) matrix, written in place by the
+      workers through a memory map (0 on the diagonal);
+    - top_k: neighbors.npy and scores.npy, (n, k) arrays holding the k
+      most similar other products of each row, best first (ties to the
+      lower index, -1 / 0 padding where fewer have a positive score).
+      Every tile is merged into the running top-k of both its row blocks.
+      Tiles run in rounds in which no two tiles share a row block (round-
+      robin pairing), so workers update rows without locks.
+
+    plus product_ids.json (row order) and similarity_meta.json. Scores
+    equal calculate_similarity_matrix's; top_k keeps the same neighbours.
+    """
+
+    INPUTS = ('categories', 'tag_indptr', 'tag_indices', 'tag_counts', 'prices')
+    # About 32 MiB of temporaries per tile; smaller tiles spend more time
+    # per pair on task overhead and on the top-k merge
+    TILE_SIZE = 1024
+    META_FILE = 'similarity_meta.json'
+
+    def __init__(self, workers=None, tile_size=None):
+        """
+        Args:
+            workers: Worker processes (default: CPU count); 1 or less runs inline
+            tile_size: Products per tile side (default TILE_SIZE)
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self.workers = workers
+        self.tile_size = tile_size or self.TILE_SIZE
+
+    def compute(self, products, output_dir, top_k=None, dtype=np.float64):
+        """
+        Score every pair of products and write the result to output_dir
+
+        Args:
+            products: ProductBatch or list of products {_id, category, tags, basePrice}
+            output_dir: Directory for the output files (created if missing)
+            top_k: Write the k nearest neighbours of each product instead of
+                the dense matrix
+            dtype: Score dtype on disk (float32 halves the file size)
+
+        Returns:
+            The metadata written to similarity_meta.json
+        """
+        started = time.perf_counter()
+        batch = ProductBatch.of(products)
+        n = len(batch)
+        os.makedirs(output_dir, exist_ok=True)
+
+        categories, tags, tag_counts, prices = DataProcessor._encode_similarity_features(batch)
+        input_dir = os.path.join(output_dir, 'inputs')
+        os.makedirs(input_dir, exist_ok=True)
+        inputs = {
+            'categories': categories,
+            'tag_indptr': tags.indptr,
+            'tag_indices': tags.indices,
+            'tag_counts': tag_counts,
+            'prices': prices
+        }
+        for name in self.INPUTS:
+            np.save(os.path.join(input_dir, f'{name}.npy'), inputs[name])
+
+        k = max(min(top_k, n - 1), 0) if top_k is not None else None
+        self._create_outputs(output_dir, n, k, dtype)
+        with open(os.path.join(output_dir, 'product_ids.json'), 'w') as f:
+            json.dump(batch.ids, f)
+
+        num_blocks = -(-n // self.tile_size)
+        rounds = self.rounds(num_blocks)
+        if k is None:
+            # Dense tiles write disjoint cells, so they need no rounds
+            rounds = [[tile for tiles in rounds for tile in tiles]]
+        task = _dense_tile if k is None else _top_k_tile
+        init_args = (input_dir, output_dir, n, tags.shape[1], k, self.tile_size)
+
+        try:
+            if self.workers <= 1:
+                _init_worker(*init_args)
+                try:
+                    for tiles in rounds:
+                        for tile in tiles:
+                            task(tile)
+                finally:
+                    _state.clear()
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=init_args
+                ) as executor:
+                    for tiles in rounds:
+                        chunksize = max(1, len(tiles) // (self.workers * 4))
+                        for _ in executor.map(task, tiles, chunksize=chunksize):
+                            pass
+        finally:
+            shutil.rmtree(input_dir, ignore_errors=True)
+
+        if k is not None:
+            self._finish_top_k(output_dir)
+
+        meta = {
+            'n': n,
+            'mode': 'dense' if k is None else 'top_k',
+            'topK': k,
+            'dtype': np.dtype(dtype).name,
+            'tileSize': self.tile_size,
+            'tiles': sum(len(tiles) for tiles in rounds),
+            'rounds': len(rounds),
+            'workers': self.workers,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        with open(os.path.join(output_dir, self.META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    @staticmethod
+    def load(output_dir, mmap_mode='r'):
+        """
+        Open the result of compute()
+
+        Returns:
+            Dict with meta, productIds and either similarity or
+            neighbors/scores (memory-mapped unless mmap_mode is None)
+        """
+        with open(os.path.join(output_dir, ParallelSimilarity.META_FILE)) as f:
+            meta = json.load(f)
+        with open(os.path.join(output_dir, 'product_ids.json')) as f:
+            product_ids = json.load(f)
+
+        names = ('similarity',) if meta['mode'] == 'dense' else ('neighbors', 'scores')
+        result = {'meta': meta, 'productIds': product_ids}
+        for name in names:
+            result[name] = np.load(os.path.join(output_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+        return result
+
+    @staticmethod
+    def rounds(num_blocks):
+        """
+        Tiles (I, J), I <= J, grouped in rounds whose tiles share no row block
+
+        The first round holds the diagonal tiles; the others pair up the
+        blocks with the circle method of a round-robin tournament, so every
+        off-diagonal tile appears exactly once.
+        """
+        rounds = [[(i, i) for i in range(num_blocks)]]
+        slots = list(range(num_blocks)) + ([None] if num_blocks % 2 else [])
+        for _ in range(len(slots) - 1):
+            pairs = zip(slots[:len(slots) // 2], reversed(slots[len(slots) // 2:]))
+            rounds.append([(min(a, b), max(a, b)) for a, b in pairs if a is not None and b is not None])
+            slots = [slots[0], slots[-1]] + slots[1:-1]
+        return [tiles for tiles in rounds if tiles]
+
+    @staticmethod
+    def _create_outputs(output_dir, n, k, dtype):
+        open_memmap = np.lib.format.open_memmap
+        if k is None:
+            # A new file reads as zeros, so no tile has to clear the diagonal
+            open_memmap(os.path.join(output_dir, 'similarity.npy'), mode='w+', dtype=dtype, shape=(n, n)).flush()
+            return
+
+        neighbors = open_memmap(os.path.join(output_dir, 'neighbors.npy'), mode='w+', dtype=np.int64, shape=(n, k))
+        scores = open_memmap(os.path.join(output_dir, 'scores.npy'), mode='w+', dtype=dtype, shape=(n, k))
+        neighbors[:] = -1
+        scores[:] = -np.inf
+        neighbors.flush()
+        scores.flush()
+
+    @staticmethod
+    def _finish_top_k(output_dir, chunk_rows=65536):
+        """Replace the entries that are not positive scores with -1 / 0 padding"""
+        neighbors = np.load(os.path.join(output_dir, 'neighbors.npy'), mmap_mode='r+')
+        scores = np.load(os.path.join(output_dir, 'scores.npy'), mmap_mode='r+')
+        for start in range(0, len(scores), chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            empty = ~(scores[rows] > 0)
+            neighbors[rows][empty] = -1
+            scores[rows][empty] = 0
+        neighbors.flush()
+        scores.flush()
+
+def _init_worker(input_dir, output_dir, n, num_tags, top_k, tile_size):
+    """Memory-map the encoded products and the output files"""
+    from scipy import sparse
+
+    inputs = {
+        name: np.load(os.path.join(input_dir, f'{name}.npy'), mmap_mode='r')
+        for name in ParallelSimilarity.INPUTS
+    }
+    tag_indices = inputs['tag_indices']
+    _state.update(
+        n=n,
+        tile_size=tile_size,
+        categories=inputs['categories'],
+        tags=sparse.csr_matrix(
+            (np.ones(len(tag_indices)), tag_indices, inputs['tag_indptr']), shape=(n, num_tags)
+        ),
+        tag_counts=inputs['tag_counts'],
+        prices=inputs['prices']
+    )
+    if top_k is None:
+        _state['similarity'] = np.load(os.path.join(output_dir, 'similarity.npy'), mmap_mode='r+')
+    else:
+        _state['neighbors'] = np.load(os.path.join(output_dir, 'neighbors.npy'), mmap_mode='r+')
+        _state['scores'] = np.load(os.path.join(output_dir, 'scores.npy'), mmap_mode='r+')
+
+def _tile_scores(i, j):
+    tile_size = _state['tile_size']
+    rows = slice(i * tile_size, min((i + 1) * tile_size, _state['n']))
+    cols = slice(j * tile_size, min((j + 1) * tile_size, _state['n']))
+    tags = _state['tags']
+    scores = DataProcessor._similarity_block(
+        _state['categories'], tags, DataProcessor._transposed_tags(tags[cols]),
+        _state['tag_counts'], _state['prices'], rows, cols
+    )
+    return rows, cols, scores
+
+def _dense_tile(tile):
+    i, j = tile
+    rows, cols, scores = _tile_scores(i, j)
+    similarity = _state['similarity']
+    if i == j:
+        np.fill_diagonal(scores, 0)
+        similarity[rows, cols] = scores
+    else:
+        similarity[rows, cols] = scores
+        similarity[cols, rows] = scores.T
+
+def _top_k_tile(tile):
+    i, j = tile
+    rows, cols, scores = _tile_scores(i, j)
+    if i == j:
+        np.fill_diagonal(scores, -np.inf)
+        _merge_top_k(rows, cols.start, scores)
+    else:
+        _merge_top_k(rows, cols.start, scores)
+        _merge_top_k(cols, rows.start, np.ascontiguousarray(scores.T))
+
+def _merge_top_k(rows, col_offset, scores):
+    """
+    Merge one tile's scores into the running top-k of its rows
+
+    The tile's own top-k per row is taken first; the k best of that and
+    the stored list, by score and then lower index, are written back.
+    """
+    neighbors = _state['neighbors']
+    best = _state['scores']
+    k = neighbors.shape[1]
+    if k == 0:
+        return
+
+    if scores.shape[1] > k:
+        _, tile_cols = DataProcessor._top_k_per_row(scores, k)
+        tile_cols = tile_cols.reshape(-1, k)
+        tile_scores = np.take_along_axis(scores, tile_cols, axis=1)
+    else:
+        tile_cols = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        tile_scores = scores
+
+    candidates = np.concatenate([neighbors[rows], tile_cols + col_offset], axis=1)
+    candidate_scores = np.concatenate([best[rows], tile_scores], axis=1)
+    order = np.lexsort((candidates, -candidate_scores))[:, :k]
+    neighbors[rows] = np.take_along_axis(candidates, order, axis=1)
+    best[rows] = np.take_along_axis(candidate_scores, order, axis=1)
@@ -0,0 +1,156 @@
+from functools import cached_property
+from itertools import chain
+
+import numpy as np
+
+# Stands in for an absent 'category' key while interning
+_MISSING = object()
+
+class ProductBatch:
+    """
+    Columnar batch of products (struct of arrays)
+
+    Built once from product dicts, then handed to the feature encoders
+    (DataProcessor.extract_features_batch and the similarity matrix,
+    RecommenderModel._feature_matrix, PricePredictor._create_feature_matrix),
+    which work on whole columns instead of calling dict.get() per product
+    and field:
+
+    - numeric fields are float64 arrays, NaN where a product has no value
+      (`column(name, default)` fills them in);
+    - categories are interned: `category_codes` indexes `categories`, and
+      -1 marks products without a 'category' key. `map_categories`
+      encodes each distinct category once;
+    - tags form a CSR index: product i's tags are
+      `tags[tag_indices[tag_indptr[i]:tag_indptr[i + 1]]]`, in input order
+      with duplicates kept.
+
+    Every column is built on first access and then cached, so an encoder
+    pays only for the fields it reads (tag_counts does not intern tags).
+    """
+
+    NUMERIC_FIELDS = ('basePrice', 'price', 'stock', 'demand', 'competition', 'ratingAverage', 'ratingCount')
+
+    def __init__(self, products):
+        """
+        Args:
+            products: List of product dicts ({_id, category, tags, images,
+                and any of NUMERIC_FIELDS}). Missing or None numeric fields
+                become NaN, a missing 'category' key becomes code -1 (None
+                is a category of its own) and missing or None tags become
+                no tags.
+        """
+        self.products = products if isinstance(products, list) else list(products)
+        self._columns = {}
+
+    @classmethod
+    def from_products(cls, products):
+        """Batch over product dicts; columns are encoded when first used"""
+        return cls(products)
+
+    @cached_property
+    def ids(self):
+        return [product.get('_id') for product in self.products]
+
+    @property
+    def columns(self):
+        """Dict of every numeric field's float64 array"""
+        return {name: self._column(name) for name in self.NUMERIC_FIELDS}
+
+    def _column(self, name):
+        values = self._columns.get(name)
+        if values is None:
+            values = np.array([product.get(name) for product in self.products], dtype=float)
+            self._columns[name] = values
+        return values
+
+    @cached_property
+    def _category_index(self):
+        values = [product.get('category', _MISSING) for product in self.products]
+        return self._intern(values, len(values))
+
+    @property
+    def categories(self):
+        return self._category_index[0]
+
+    @property
+    def category_codes(self):
+        return self._category_index[1]
+
+    @cached_property
+    def _tag_lists(self):
+        return [product.get('tags') or () for product in self.products]
+
+    @cached_property
+    def tag_indptr(self):
+        n = len(self.products)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, self._tag_lists), dtype=np.int64, count=n), out=indptr[1:])
+        return indptr
+
+    @cached_property
+    def _tag_index(self):
+        return self._intern(list(chain.from_iterable(self._tag_lists)), int(self.tag_indptr[-1]))
+
+    @property
+    def tags(self):
+        return self._tag_index[0]
+
+    @property
+    def tag_indices(self):
+        return self._tag_index[1]
+
+    @cached_property
+    def has_image(self):
+        return np.fromiter(
+            (bool(product.get('images')) for product in self.products), dtype=bool, count=len(self.products)
+        )
+
+    @staticmethod
+    def _intern(values, count):
+        """Distinct values in first-seen order and each value's index (-1 for _MISSING)"""
+        distinct = [value for value in dict.fromkeys(values) if value is not _MISSING]
+        index = dict(zip(distinct, range(len(distinct))))
+        index[_MISSING] = -1
+        return distinct, np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=count)
+
+    @classmethod
+    def of(cls, products):
+        """The batch itself, or a batch built from a list of product dicts"""
+        return products if isinstance(products, cls) else cls.from_products(products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def column(self, name, default=np.nan):
+        """Values of a numeric field with missing values replaced by default"""
+        values = self._column(name)
+        return np.where(np.isnan(values), default, values)
+
+    def map_categories(self, encode, default=None, dtype=float):
+        """
+        encode(category) for every product, calling encode once per distinct category
+
+        Products without a category get encode(default).
+        """
+        # The default goes last, where code -1 indexes
+        table = np.array([encode(category) for category in self.categories] + [encode(default)], dtype=dtype)
+        return table[self.category_codes]
+
+    @property
+    def tag_counts(self):
+        """Number of tags per product (duplicates counted)"""
+        return np.diff(self.tag_indptr)
+
+    def tag_matrix(self):
+        """(n, len(tags)) multi-hot scipy.sparse CSR matrix, duplicates collapsed to 1"""
+        from scipy import sparse
+
+        # Copies: collapsing duplicates sorts the index arrays in place
+        matrix = sparse.csr_matrix(
+            (np.ones(len(self.tag_indices)), self.tag_indices.copy(), self.tag_indptr.copy()),
+            shape=(len(self), len(self.tags))
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
@@ -0,0 +1,145 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler for slow requests
+
+    While a sampled request runs, a background thread records the stack of
+    the thread serving it every `interval` seconds. Requests that end up
+    slower than `threshold` seconds have their stacks written in the
+    folded format (one "frame;frame;...;leaf count" line per stack) that
+    flamegraph.pl, speedscope and inferno read directly. Faster requests
+    are discarded, so the cost outside slow requests is one sampler wake-up
+    per interval while a sampled request is in flight.
+    """
+
+    def __init__(self, threshold, interval=0.005, sample_rate=1.0,
+                 output_dir=os.path.join('trained_models', 'profiles'), keep=100):
+        """
+        Args:
+            threshold: Requests at least this many seconds long are dumped
+            interval: Seconds between stack samples
+            sample_rate: Fraction of requests profiled
+            output_dir: Directory for the .folded files
+            keep: Number of most recent dumps kept
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.keep = keep
+        self.dumps = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Profiler configured by PROFILE_SLOW_REQUESTS_MS, or None when unset
+
+        Also reads PROFILE_SAMPLE_INTERVAL_MS (default 5),
+        PROFILE_SAMPLE_RATE (default 1.0) and PROFILE_DIR.
+        """
+        threshold_ms = os.getenv('PROFILE_SLOW_REQUESTS_MS', '').strip()
+        if not threshold_ms:
+            return None
+        return cls(
+            threshold=float(threshold_ms) / 1000,
+            interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000,
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 1.0)),
+            output_dir=os.getenv('PROFILE_DIR', os.path.join('trained_models', 'profiles'))
+        )
+
+    def start(self):
+        """
+        Start sampling the calling thread
+
+        Returns:
+            Token for stop(), or None if this request is not sampled
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._sampler.start()
+            self._wake.set()
+        return thread_id
+
+    def stop(self, token, endpoint, duration):
+        """
+        Stop sampling and dump the stacks if the request was slow
+
+        Returns:
+            Path of the written profile, or None
+        """
+        if token is None:
+            return None
+        with self._lock:
+            stacks = self._active.pop(token, None)
+        if not stacks or duration < self.threshold:
+            return None
+        return self._dump(stacks, endpoint, duration)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    # Cleared under the lock so a concurrent start() is not missed
+                    self._wake.clear()
+                    continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in active:
+                    frame = frames.get(thread_id)
+                    stacks = self._active.get(thread_id)
+                    if frame is not None and stacks is not None and thread_id != own_id:
+                        stacks[self._fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _fold(frame):
+        """Stack of a frame, root first, as 'func (file:line);...'"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = '/'.join(code.co_filename.replace('\\', '/').split('/')[-2:])
+            names.append(f'{code.co_name} ({filename}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _dump(self, stacks, endpoint, duration):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f'{int(time.time() * 1000)}-{os.getpid()}-{endpoint}-{int(duration * 1000)}ms.folded'
+        path = os.path.join(self.output_dir, name)
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        self.dumps += 1
+        self._prune()
+        return path
+
+    def _prune(self):
+        dumps = sorted(
+            (entry for entry in os.scandir(self.output_dir) if entry.name.endswith('.folded')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in dumps[:max(len(dumps) - self.keep, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class LocalCacheBackend:
+    """
+    In-process LRU cache with per-entry expiry, bounded by entries and bytes
+
+    Values are stored as serialized bytes, so the size bound is exact and
+    the backend is interchangeable with RedisCacheBackend.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            'backend': 'local',
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+class RedisCacheBackend:
+    """
+    Cache shared by all server processes, kept in Redis
+
+    Memory bounds and eviction are Redis's own (configure maxmemory and an
+    LRU maxmemory-policy); entries expire after their TTL. Requires the
+    optional `redis` package.
+    """
+
+    def __init__(self, url, prefix='pricepulse:cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RESPONSE_CACHE_BACKEND=redis requires the redis package (pip install redis)')
+
+        self.url = url
+        self.prefix = prefix
+        self.errors = 0
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        try:
+            return self._client.get(self.prefix + key)
+        except Exception:
+            # An unreachable cache must not fail the request
+            self.errors += 1
+            logger.warning('Response cache read failed', exc_info=True)
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            self._client.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+        except Exception:
+            self.errors += 1
+            logger.warning('Response cache write failed', exc_info=True)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        return {
+            'backend': 'redis',
+            'errors': self.errors
+        }
+
+class ResponseCache:
+    """
+    Cache of endpoint results keyed on the request and the model state
+
+    The key is a hash of the endpoint name, the canonical JSON of the
+    parameters that determine the result and a version tag of the state it
+    was computed from (see RecommenderModel.cache_version). Retraining,
+    ingest or a catalog update changes the tag, so stale entries are never
+    hit again and age out of the LRU. The TTL bounds staleness of inputs
+    the tag does not cover.
+
+    Building a key serializes and hashes the parameters, so requests with
+    more than `max_key_items` list items in them are not cached (see
+    fits_key): for those the key costs about as much as the result.
+    """
+
+    def __init__(self, backend=None, ttl=300, enabled=True, max_key_items=1000):
+        """
+        Args:
+            backend: LocalCacheBackend (default) or RedisCacheBackend
+            ttl: Seconds an entry is served
+            enabled: False computes every request (counters stay at zero)
+            max_key_items: Largest number of list items a cached request's
+                parameters may hold
+        """
+        self.backend = backend if backend is not None else LocalCacheBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.max_key_items = max_key_items
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Configure from RESPONSE_CACHE_BACKEND (local, redis or off),
+        RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES,
+        RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_KEY_ITEMS and REDIS_URL
+        """
+        backend_name = os.getenv('RESPONSE_CACHE_BACKEND', 'local').strip().lower()
+        ttl = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+        max_key_items = int(os.getenv('RESPONSE_CACHE_MAX_KEY_ITEMS', 1000))
+
+        if backend_name == 'off':
+            return cls(ttl=ttl, enabled=False, max_key_items=max_key_items)
+        if backend_name == 'redis':
+            backend = RedisCacheBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        elif backend_name == 'local':
+            backend = LocalCacheBackend(
+                max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+                max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+            )
+        else:
+            raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {backend_name}')
+        return cls(backend, ttl=ttl, max_key_items=max_key_items)
+
+    @staticmethod
+    def key(endpoint, params, version):
+        """Stable key for an endpoint, its parameters and a state version"""
+        canonical = json.dumps([endpoint, params, version], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def fits_key(self, *sequences):
+        """True if the sequences together are small enough to be part of a key"""
+        return sum(len(sequence) for sequence in sequences if sequence) <= self.max_key_items
+
+    def get_or_compute(self, endpoint, params, version, compute):
+        """
+        Cached result for the parameters, computing and storing it on a miss
+
+        Args:
+            endpoint: Namespace of the result (e.g. 'recommendations')
+            params: JSON-serializable parameters the result depends on
+            version: Tag of the model state the result depends on
+            compute: Callable producing the JSON-serializable result
+
+        Returns:
+            (result, True if it came from the cache)
+        """
+        if not self.enabled:
+            return compute(), False
+
+        key = self.key(endpoint, params, version)
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return json.loads(cached), True
+
+        with self._lock:
+            self.misses += 1
+        result = compute()
+        self.backend.set(key, json.dumps(result, separators=(',', ':')).encode('utf-8'), self.ttl)
+        return result, False
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Hit/miss counters plus the backend's size and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'ttl': self.ttl,
+            'max_key_items': self.max_key_items,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            **self.backend.stats()
+        }